@@ -8,24 +8,83 @@ import urllib.request
 from bs4 import BeautifulSoup
 import time
 import re
+import getopt
+import hashlib
+import json
+import textwrap
+from concurrent.futures import ProcessPoolExecutor
 
 sys.path.append("..")
 import utils
 
+# Rows of self.drop_data, at module level so they can be pickled for worker processes:
+Drop = namedtuple("Drop", ["npc", "min", "max", "chance"])
+Npc = namedtuple("Npc", ["id", "name", "level", "agro"])
+
 
 class PageBuilder:
-    def __init__(self):
-        self.site_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "site")
+    def __init__(self, jobs=1, cache=True, incremental=True, minify=True, site_path=None):
+        self.jobs = jobs  # Number of worker processes used when rendering pages
+        self.minify = minify  # If enabled, whitespace is stripped from every page written
+        # If enabled, only pages whose inputs changed since the last build are rendered:
+        self.incremental = incremental
+        # If enabled, parsed server data is cached per file and only changed files are re-parsed:
+        self.cache = utils.ParseCache() if cache else None
+        # Directory the site is written to, by default site/ next to this script:
+        if site_path is None:
+            site_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "site")
+        self.site_path = site_path
         self.npc_path = "npc"
         self.item_path = "item"
         self.recipe_path = "recipe"
         self.img_path = "img"
         self.loc_path = "loc"
         self.css_path = "css"
+        self.search_path = "search"
+        self.js_path = "js"
         self.map_path = f"{self.img_path}/etc/world_map_interlude_big.png"
         img = cv2.imread(f"{self.site_path}/{self.map_path}")  # Read map image file
         self.map_size = (img.shape[1], img.shape[0])
+        # Tiles of the map image, shown by the loc pages instead of the whole image:
+        self.tile_path = f"{self.img_path}/tiles"
+        self.map_tiles = utils.TilePyramid(
+            self.map_size, os.path.join(self.site_path, self.tile_path)
+        )
+        # Thumbnails of the map with each NPC's spawn points, shown on the NPC pages:
+        self.thumb_path = f"{self.img_path}/spawns"
+        self.thumb_width = 160
+        # Spawn density heatmaps, for each combination of NPC type, level band, and aggro:
+        self.heatmap_path = f"{self.img_path}/heatmaps"
+        self.heatmap_types = ["Monster", "RaidBoss"]
+        self.heatmap_levels = [(level, level + 9) for level in range(1, 81, 10)] + [(81, 99)]
+        # Hunting grounds ranked for each band of player levels, from monsters up to
+        # hunting_margin levels below or above the band:
+        self.hunting_path = "hunting"
+        self.hunting_types = ["Monster"]
+        self.hunting_levels = [(level, level + 4) for level in range(1, 86, 5)]
+        self.hunting_margin = 2
+        # Spawn points on the loc pages are merged into clusters of cluster_size screen
+        # pixels, precomputed for each zoom level of the map in cluster_zooms:
+        self.cluster_size = 48
+        self.cluster_zooms = range(-2, 4)
         self.set_world_info()
+        # Pages are re-rendered whenever this script (where their templates live) or the
+        # utils modules rendering them change, or when minify is toggled:
+        version = hashlib.sha1(repr(self.minify).encode())
+        renderers = [
+            utils.Template,
+            utils.minify_html,
+            utils.round_chance,
+            utils.DropTable,
+            utils.grid_clusters,
+        ]
+        sources = [sys.modules[renderer.__module__].__file__ for renderer in renderers]
+        for fname in [os.path.realpath(__file__)] + sources:
+            with open(fname, "rb") as f:
+                version.update(f.read())
+        self.version = version.hexdigest()
+        self.manifest_path = os.path.join(self.site_path, ".build_manifest.json")
+        self.output = None  # If set to a dict, pages are stored in it instead of written
 
         if not os.path.exists(self.site_path):
             os.makedirs(self.site_path)
@@ -41,8 +100,16 @@ class PageBuilder:
         self.item_data = utils.ItemParser().parse()
         self.npc_data = utils.NpcSqlParser(item_data=self.item_data).parse()
         self.drop_data = self.create_drop_data()
-        self.spawn_data = utils.SpawnParser().parse()
-        self.skill_data, self.skill_order = utils.SkillParser().parse()
+        self.spawn_data = utils.SpawnParser(cache=self.cache).parse()
+        # Grid index of the spawns, for radius, box, and nearest spawn queries:
+        self.spawn_index = utils.SpawnIndex(self.spawn_data, self.world_bounds)
+        # Rendered drop tables, shared by every NPC with the same drop and spoil lists:
+        self.drop_tables = {}
+        self.skill_data, self.skill_order = utils.SkillParser(cache=self.cache).parse()
+        self.recipe_data = utils.RecipeParser(item_data=self.item_data).parse()
+        self.recipe_results = {}  # Maps the id of each craftable item to its recipe id
+        for recipe_id, recipe in self.recipe_data.items():
+            self.recipe_results[recipe.result.id] = recipe_id
 
         self.css = """
         <head>
@@ -93,6 +160,508 @@ class PageBuilder:
             </div>
         """
 
+    def build(self):
+        """Creates the pages of the site
+        Each page's inputs are fingerprinted, and in incremental mode only pages whose
+        fingerprint differs from the last build's manifest (or whose file is missing)
+        are rendered. Pages of NPCs, items, or recipes that no longer exist are deleted
+
+        With self.jobs > 1, the NPC, item, loc, and recipe pages are split into shards
+        which are rendered by a pool of worker processes, with shards of each family
+        interleaved so the families are rendered at the same time. Each worker receives
+        a copy of this PageBuilder once, when it starts, and only ids are sent per shard
+
+        """
+        pages = self.page_fingerprints()
+        manifest = utils.SiteManifest(self.manifest_path, self.version)
+        if self.incremental:
+            dirty, removed = manifest.changes(pages, self.site_path)
+        else:
+            dirty, removed = set(pages), [page for page in manifest.pages if page not in pages]
+        print(f"{len(dirty)} of {len(pages)} pages out of date, {len(removed)} removed")
+
+        manifest.remove(removed, self.site_path)
+
+        families = {"npc": [], "item": [], "loc": [], "recipe": []}
+        for family, ids in self.page_ids().items():
+            path = getattr(self, f"{family}_path")
+            families[family] = [id for id in ids if f"{path}/{id}.html" in dirty]
+
+        self.create_map_tiles()
+        self.create_spawn_thumbnails()
+        self.create_heatmap_page()
+        self.create_hunting_page()
+        self.render(families)
+        # Only record the new fingerprints once every page has been written:
+        manifest.save(pages)
+
+    def create_map_tiles(self):
+        """Cuts the map image into tiles, only rewriting tiles showing a changed region"""
+        img = cv2.imread(f"{self.site_path}/{self.map_path}", cv2.IMREAD_UNCHANGED)
+        n_tiles, n_written = self.map_tiles.build(img)
+        print(f"Creating map tiles ({n_written} of {n_tiles} changed)")
+
+    def create_spawn_thumbnails(self):
+        """Stamps the spawn points of every NPC onto a thumbnail of the map
+        Only thumbnails whose spawn points (or the map) changed are rewritten
+        """
+        img = cv2.imread(f"{self.site_path}/{self.map_path}")
+        thumbnails = utils.MapThumbnails(
+            os.path.join(self.site_path, self.thumb_path), img, self.thumb_width
+        )
+        rows = self.spawn_data.rows
+        x_map, y_map = self.spawn2map(rows["x"], rows["y"])
+        # spawn2map measures y from the bottom of the map, as the loc pages do:
+        n_thumbnails, n_written = thumbnails.build(rows["npc_id"], x_map, self.map_size[1] - y_map)
+        print(f"Creating spawn thumbnails ({n_written} of {n_thumbnails} changed)")
+
+    def heatmap_filters(self):
+        """Selects the spawn points shown by each heatmap
+
+        Returns
+        -------
+        dict
+            Dict mapping heatmap key ("<type>_<levels>_<aggro>", e.g.
+            "monster_41-50_aggressive") to a boolean array selecting rows of
+            self.spawn_data.rows. Any part of the key can also be "all" (or "any" aggro)
+
+        """
+        # Stats of the NPC of each spawn point, repeated over the NPC's rows:
+        npc_ids = list(self.spawn_data.keys())
+        lengths = [end - start for start, end in self.spawn_data.index.values()]
+        stats = [self.npc_data[id]["stats"] if id in self.npc_data else None for id in npc_ids]
+        known = np.repeat([s is not None for s in stats], lengths)
+        types = np.repeat([npc_type(s) if s else "" for s in stats], lengths)
+        levels = np.repeat([int(s["level"]) if s else 0 for s in stats], lengths)
+        aggressive = np.repeat([s is not None and s["agro"] == "Yes" for s in stats], lengths)
+
+        type_masks = {"all": known}
+        for heatmap_type in self.heatmap_types:
+            type_masks[heatmap_type.lower()] = types == heatmap_type
+        level_masks = {"all": known}
+        for low, high in self.heatmap_levels:
+            level_masks[f"{low}-{high}"] = (levels >= low) & (levels <= high)
+        aggro_masks = {"any": known, "aggressive": aggressive, "passive": known & ~aggressive}
+
+        filters = {}
+        for type_key, type_mask in type_masks.items():
+            for level_key, level_mask in level_masks.items():
+                for aggro_key, aggro_mask in aggro_masks.items():
+                    key = f"{type_key}_{level_key}_{aggro_key}"
+                    filters[key] = type_mask & level_mask & aggro_mask
+        return filters
+
+    def create_heatmap_page(self):
+        """Creates the spawn density heatmap page, and the heatmap overlays it shows
+        Rather than drawing spawn points, the page shows one precomputed overlay at a
+        time, picked by NPC type, level band, and aggro. Overlays whose spawn points
+        didn't change since the last build aren't rendered again
+        """
+        heatmaps = utils.SpawnHeatmaps(
+            self.spawn_data, self.world_bounds, os.path.join(self.site_path, self.heatmap_path)
+        )
+        overlays = heatmaps.build(self.heatmap_filters())
+        print(f"Creating heatmap page ({heatmaps.written} of {len(overlays)} overlays changed)")
+
+        # The overlays cover whole grid cells, from the top left corner of the map:
+        world_width = self.WORLD_X_MAX - self.WORLD_X_MIN
+        world_height = self.WORLD_Y_MAX - self.WORLD_Y_MIN
+        data = {
+            "path": f"../{self.heatmap_path}",
+            "width": heatmaps.grid.nx * heatmaps.grid.cell_size / world_width * self.map_size[0],
+            "height": heatmaps.grid.ny * heatmaps.grid.cell_size / world_height * self.map_size[1],
+            "overlays": {key: [n, heatmap_hash[:8]] for key, (n, heatmap_hash) in overlays.items()},
+        }
+        data = json.dumps(data, separators=(",", ":"))
+
+        script_url = self.write_asset(
+            self.js_path,
+            "heatmap.js",
+            """
+            // Heatmap overlays by key, as [number of spawn points, version]:
+            var heatmaps = JSON.parse(document.getElementById("heatmapData").textContent);
+            var overlayBounds = [[-heatmaps.height, 0], [0, heatmaps.width]];
+            var overlay = null;
+            var filters = ["heatmapType", "heatmapLevel", "heatmapAggro"];
+
+            function showHeatmap() {
+              var key = filters.map(function (id) { return document.getElementById(id).value; }).join("_");
+              var heatmap = heatmaps.overlays[key];
+              var url = heatmaps.path + "/" + key + ".png?v=" + heatmap[1];
+              if (overlay === null) {
+                overlay = L.imageOverlay(url, overlayBounds, {interactive: false}).addTo(map);
+              } else {
+                overlay.setUrl(url);
+              }
+              document.getElementById("heatmapCount").textContent = heatmap[0] + " spawns";
+            }
+
+            filters.forEach(function (id) {
+              document.getElementById(id).addEventListener("change", showHeatmap);
+            });
+            showHeatmap();
+            """,
+        )
+        css, map_scripts, map = self.world_map_assets()
+
+        types = [("all", "All types")] + [(t.lower(), t) for t in self.heatmap_types]
+        levels = [("all", "All levels")] + [
+            (f"{low}-{high}", f"Level {low}-{high}") for low, high in self.heatmap_levels
+        ]
+        aggro = [("any", "Aggressive and passive"), ("aggressive", "Aggressive"), ("passive", "Passive")]
+        html = f"""
+        <html>
+        <title>Spawn Heatmap</title>
+        {css}
+        {self.search}
+        <br><br><br><br>
+        <script type="application/json" id="heatmapData">{data}</script>
+        <div align='center'>
+            <h2>Spawn density</h2>
+            <select id="heatmapType">{format_options(types)}</select>
+            <select id="heatmapLevel">{format_options(levels)}</select>
+            <select id="heatmapAggro">{format_options(aggro)}</select>
+            <span id="heatmapCount"></span>
+        </div>
+        <br>
+        {map}
+        {map_scripts}
+        <script src="../{script_url}"></script>
+        </html>
+        """
+        self.write_page(self.loc_path, "heatmap.html", html)
+
+    def create_hunting_page(self):
+        """Creates the hunting grounds page, and the ranking of grounds for each level band
+        The best cells of a grid over the world are ranked for each band of player levels
+        by utils.HuntingGrounds, and written as one JSON file per band, which the page
+        fetches for the level entered (e.g. hunting.html?level=52)
+        """
+        start = time.time()
+        npc_stats = {
+            id: data["stats"]
+            for id, data in self.npc_data.items()
+            if npc_type(data["stats"]) in self.hunting_types
+        }
+        grounds = utils.HuntingGrounds(self.spawn_data, self.world_bounds, npc_stats)
+        margin = self.hunting_margin
+        ranking = grounds.rank([(low - margin, high + margin) for low, high in self.hunting_levels])
+
+        path = os.path.join(self.site_path, self.hunting_path)
+        bands = []
+        for (low, high), spots in zip(self.hunting_levels, ranking):
+            for spot in spots:
+                spot.update({key: round(value, 2) for key, value in spot.items() if key != "npcs"})
+                spot["npcs"] = [
+                    [id, self.npc_data[id]["name"], int(self.npc_data[id]["stats"]["level"]), n]
+                    for id, n in spot["npcs"]
+                ]
+            raw = json.dumps(spots, separators=(",", ":")).encode("utf8")
+            utils.write_atomic(path, f"{low}-{high}.json", raw)
+            bands.append([low, high, hashlib.sha1(raw).hexdigest()[:8]])
+        # Remove the rankings of level bands that no longer exist:
+        fnames = {f"{low}-{high}.json" for low, high in self.hunting_levels}
+        for fname in os.listdir(path):
+            if fname.endswith(".json") and fname not in fnames:
+                os.remove(os.path.join(path, fname))
+        elapsed = time.time() - start
+        print(f"Creating hunting grounds page ({len(bands)} level bands, {elapsed:.2f}s)")
+
+        script_url = self.write_asset(
+            self.js_path,
+            "hunting.js",
+            """
+            // Level bands, as [min level, max level, version of the band's ranking]:
+            var hunting = JSON.parse(document.getElementById("huntingData").textContent);
+            var levelInput = document.getElementById("huntingLevel");
+
+            function cell(row, content) {
+              var td = document.createElement("td");
+              if (typeof content === "string") {
+                td.textContent = content;
+              } else {
+                td.appendChild(content);
+              }
+              row.appendChild(td);
+              return td;
+            }
+
+            function link(href, text) {
+              var a = document.createElement("a");
+              a.href = href;
+              a.textContent = text;
+              return a;
+            }
+
+            function showSpots() {
+              var level = parseInt(levelInput.value);
+              var band = hunting.bands.filter(function (band) { return level >= band[0] && level <= band[1]; })[0];
+              var table = document.getElementById("huntingSpots");
+              table.textContent = "";
+              if (band === undefined) {
+                return;
+              }
+              var url = hunting.path + "/" + band[0] + "-" + band[1] + ".json?v=" + band[2];
+              fetch(url).then(function (response) { return response.json(); }).then(function (spots) {
+                spots.forEach(function (spot, i) {
+                  var row = document.createElement("tr");
+                  cell(row, String(i + 1));
+                  var npcs = document.createElement("span");
+                  spot.npcs.slice(0, 5).forEach(function (npc) {
+                    npcs.appendChild(link(hunting.npcPath + "/" + npc[0] + ".html", npc[1] + " (" + npc[2] + ")"));
+                    npcs.appendChild(document.createTextNode(" x" + npc[3]));
+                    npcs.appendChild(document.createElement("br"));
+                  });
+                  cell(row, npcs);
+                  cell(row, spot.exp_per_hp.toFixed(2));
+                  cell(row, Math.round(spot.kills_per_hour).toLocaleString());
+                  cell(row, Math.round(spot.exp_per_hour).toLocaleString());
+                  cell(row, Math.round(spot.sp_per_hour).toLocaleString());
+                  var x = Math.round((spot.x_min + spot.x_max) / 2), y = Math.round((spot.y_min + spot.y_max) / 2);
+                  cell(row, link(hunting.locPath + "/" + spot.npcs[0][0] + ".html", x + ", " + y));
+                  table.appendChild(row);
+                });
+              });
+            }
+
+            levelInput.addEventListener("change", showSpots);
+            var query = /[?&]level=(\\d+)/.exec(window.location.search);
+            if (query) {
+              levelInput.value = query[1];
+            }
+            showSpots();
+            """,
+        )
+
+        data = {
+            "path": self.hunting_path,
+            "npcPath": self.npc_path,
+            "locPath": self.loc_path,
+            "bands": bands,
+        }
+        data = json.dumps(data, separators=(",", ":"))
+        html = f"""
+        <html>
+        <title>Hunting Grounds</title>
+        {self.css.format(self.css_path)}
+        <body>
+        <div class="content" align="center">
+            <h2>Best hunting grounds</h2>
+            Character level <input id="huntingLevel" type="number" min="1" max="{self.hunting_levels[-1][1]}" value="20">
+            <br><br>
+            <table width="100%" border="0" cellpadding="5" cellspacing="0" class="show_list">
+                <thead><tr>
+                    <th>#</th><th>Monsters</th><th>Exp per HP</th><th>Kills per hour</th>
+                    <th>Exp per hour</th><th>SP per hour</th><th>Location</th>
+                </tr></thead>
+                <tbody id="huntingSpots"></tbody>
+            </table>
+            <p>
+            Grounds are ranked by the exp earned per point of damage dealt to the monsters
+            within {self.hunting_margin} levels of the level band, in a square of
+            {grounds.grid.cell_size} units. Grounds whose respawns supply fewer than
+            {grounds.target_kills} kills per hour rank lower.
+            </p>
+        </div>
+        <script type="application/json" id="huntingData">{data}</script>
+        <script src="{script_url}"></script>
+        </body>
+        </html>
+        """
+        self.write_page("", "hunting.html", html)
+
+    def finalize(self, dist_path=None):
+        """Writes a deployable copy of the site, with hashed asset names and compressed files
+        See utils.SiteFinalizer. Files matching *.<10 hex digits>.* never change, so they
+        can be served with immutable cache headers, and .gz/.br siblings can be served
+        directly (e.g. with nginx's gzip_static and brotli_static)
+
+        Parameters
+        ----------
+        dist_path : string
+            Path to write the finalized site to (defaults to dist next to the site)
+
+        """
+        if dist_path is None:
+            dist_path = os.path.join(os.path.dirname(self.site_path), "dist")
+        n_files, n_written = utils.SiteFinalizer(self.site_path, dist_path).run()
+        print(f"Finalized {n_files} files to {dist_path} ({n_written} changed)")
+        if utils.site_finalizer.brotli is None:
+            print("Install the brotli module to also write .br files")
+
+    def render(self, families):
+        """Creates the pages with the given ids, and the search page
+
+        Parameters
+        ----------
+        families : dict
+            Dict mapping page family ("npc", "item", "loc", or "recipe") to a list of ids
+
+        """
+        if self.jobs <= 1:
+            for family, ids in families.items():
+                print(f"Creating {family} pages")
+                getattr(self, f"create_{family}_pages")(ids)
+            print("Creating search page")
+            self.create_search_page()
+            return
+
+        # Several shards per worker, so workers finishing early can pick up more work:
+        n_shards = 4 * self.jobs
+        shards = []
+        for family, ids in families.items():
+            size = max(1, -(-len(ids) // n_shards))  # Ceiling division
+            for i, start in enumerate(range(0, len(ids), size)):
+                shards.append((i, family, ids[start : start + size]))
+        shards.sort(key=lambda shard: shard[0])  # Interleave the families
+
+        print(f"Creating {', '.join(families)} pages ({len(shards)} shards, {self.jobs} jobs)")
+        with ProcessPoolExecutor(
+            max_workers=self.jobs, initializer=init_worker, initargs=(self,)
+        ) as pool:
+            futures = [pool.submit(render_pages, family, ids) for _, family, ids in shards]
+            print("Creating search page")
+            self.create_search_page()
+            for future in futures:
+                future.result()  # Re-raises any exception from the worker
+
+    def render_page(self, family, id):
+        """Renders a single page in memory, without writing it to the site
+
+        Parameters
+        ----------
+        family : string
+            Family of the page ("npc", "item", "loc", or "recipe")
+        id : int
+            Id of the page, which must be in self.page_ids()[family]
+
+        Returns
+        -------
+        string
+            HTML of the page
+
+        """
+        self.output = {}
+        try:
+            getattr(self, f"create_{family}_pages")([id])
+        finally:
+            output, self.output = self.output, None
+        return output[f"{getattr(self, f'{family}_path')}/{id}.html"]
+
+    def page_ids(self):
+        """Returns a dict mapping each page family to the ids of the pages in it"""
+        return {
+            "npc": list(self.npc_data),
+            "item": list(self.item_data),
+            "loc": [id for id in self.npc_data if id in self.spawn_data],
+            "recipe": list(self.recipe_data),
+        }
+
+    def page_fingerprints(self):
+        """Fingerprints the data each page is rendered from
+
+        Returns
+        -------
+        dict
+            Dict mapping page path (relative to the site) to its fingerprint
+
+        """
+        pages = {}
+        for id, data in self.npc_data.items():
+            # An NPC page depends on its stats, skills, drops and their items, and spawns:
+            skills = self.skill_order.get(id, data.get("skills", []))
+            skill_data = [self.skill_data[skill.id][skill.level] for skill in skills]
+            items = [self.item_data[drop[0]] for drop in data["drop"] + data["spoil"]]
+            fingerprint = utils.fingerprint(data, skills, skill_data, items, id in self.spawn_data)
+            pages[f"{self.npc_path}/{id}.html"] = fingerprint
+
+        for id, data in self.item_data.items():
+            # An item page depends on every NPC dropping or spoiling it, and their spawns:
+            drops = self.drop_data.get(id, {"drop": [], "spoil": []})
+            spawns = [drop.npc.id in self.spawn_data for drop in drops["drop"] + drops["spoil"]]
+            fingerprint = utils.fingerprint(data, drops, spawns)
+            pages[f"{self.item_path}/{id}.html"] = fingerprint
+
+        for id in self.page_ids()["loc"]:
+            data = self.npc_data[id]
+            fingerprint = utils.fingerprint(
+                data["name"],
+                data["stats"]["level"],
+                self.spawn_data[id].tolist(),
+                self.map_size,
+                self.map_tiles.max_zoom,
+                self.map_tiles.tile_size,
+            )
+            pages[f"{self.loc_path}/{id}.html"] = fingerprint
+
+        for id, recipe in self.recipe_data.items():
+            # A recipe page depends on the recipes of its ingredients, and all their items:
+            recipes, items = self.recipe_inputs(recipe)
+            fingerprint = utils.fingerprint(recipes, items)
+            pages[f"{self.recipe_path}/{id}.html"] = fingerprint
+
+        return pages
+
+    def recipe_inputs(self, recipe):
+        """Returns the recipes and items shown on a recipe page, as create_ingredient_table does"""
+        recipes, items = [recipe], {}
+        for ingredient in recipe.ingredients:
+            items[ingredient.id] = self.item_data[ingredient.id]
+            if ingredient.id in self.recipe_results and ingredient.id != recipe.id:
+                recipes_, items_ = self.recipe_inputs(
+                    self.recipe_data[self.recipe_results[ingredient.id]]
+                )
+                recipes.extend(recipes_)
+                items.update(items_)
+        return recipes, items
+
+    def write_page(self, path, fname, html):
+        """Writes a page to the directory path of the site, minifying it if enabled"""
+        if self.minify:
+            html = utils.minify_html(html)
+        if self.output is not None:
+            self.output[f"{path}/{fname}"] = html
+            return
+        with open(os.path.join(self.site_path, path, fname), "w", encoding="utf-8") as f:
+            f.write(html)
+
+    def write_asset(self, path, fname, content):
+        """Writes a script or style sheet shared by many pages, and returns its URL
+        The URL (relative to the site) includes a hash of the contents, so browsers can
+        cache the file until it changes. The file is only rewritten if it changed
+
+        Parameters
+        ----------
+        path : string
+            Directory of the site to write the file to (e.g. self.js_path)
+        fname : string
+            Name of the file
+        content : string
+            Contents of the file, which are dedented
+
+        Returns
+        -------
+        string
+            Versioned URL of the file, e.g. "js/recipe.js?v=0123abcd"
+
+        """
+        raw = textwrap.dedent(content).strip().encode("utf8") + b"\n"
+        file_path = os.path.join(self.site_path, path, fname)
+        try:
+            with open(file_path, "rb") as f:
+                changed = f.read() != raw
+        except OSError:
+            changed = True
+        if changed:
+            utils.write_atomic(os.path.join(self.site_path, path), fname, raw)
+        return f"{path}/{fname}?v={hashlib.sha1(raw).hexdigest()[:8]}"
+
+    def select(self, data, ids=None):
+        """Returns the entries of the dict data with the given ids (all entries if None)"""
+        if ids is None:
+            return data
+        return {id: data[id] for id in ids}
+
     def set_world_info(self):
         TILE_X_MIN = 16
         TILE_X_MAX = 26
@@ -104,47 +673,22 @@ class PageBuilder:
         self.WORLD_X_MAX = (TILE_X_MAX - 19) * TILE_SIZE
         self.WORLD_Y_MIN = (TILE_Y_MIN - 18) * TILE_SIZE
         self.WORLD_Y_MAX = (TILE_Y_MAX - 17) * TILE_SIZE
+        self.world_bounds = (self.WORLD_X_MIN, self.WORLD_X_MAX, self.WORLD_Y_MIN, self.WORLD_Y_MAX)
 
     def create_search_page(self):
-        img_path = self.img_path
-        search_db = {"items": {}, "npcs": {}}
-        search_db["items"] = {"names": [], "ids": []}
-        search_db["npcs"] = {"names": [], "ids": [], "levels": []}
-        names_lower = []
+        """Creates the search page, and the sharded search index it loads on demand
+        Rather than listing every NPC and item, search.html only fetches the index shard
+        of the longest query token (or the id shard for "ID=" queries), so its size and
+        query time don't grow with the number of NPCs and items
 
-        for id, data in self.item_data.items():
-            search_db["items"]["ids"].append(id)
-            search_db["items"]["names"].append(data.name)
-            names_lower.append(data.name.lower())
-
-        # Now sort the item list in order of names for easier search:
-        _, search_db["items"]["names"], search_db["items"]["ids"] = (
-            list(t)
-            for t in zip(
-                *sorted(zip(names_lower, search_db["items"]["names"], search_db["items"]["ids"]))
-            )
-        )
-
-        names_lower = []
+        """
+        index = utils.SearchIndex()
         for id, data in self.npc_data.items():
-            search_db["npcs"]["ids"].append(id)
-            search_db["npcs"]["names"].append(data["name"])
-            search_db["npcs"]["levels"].append(int(data["stats"]["level"]))
-            names_lower.append(data["name"].lower())
-
-        # Now sort the NPC list in order of levels for easier search:
-        search_db["npcs"]["levels"], search_db["npcs"]["names"], search_db["npcs"]["ids"] = (
-            list(t)
-            for t in zip(
-                *sorted(
-                    zip(
-                        search_db["npcs"]["levels"],
-                        search_db["npcs"]["names"],
-                        search_db["npcs"]["ids"],
-                    )
-                )
-            )
-        )
+            has_loc = int(id in self.spawn_data)
+            index.add("npc", id, data["name"], (int(data["stats"]["level"]), has_loc))
+        for id, data in self.item_data.items():
+            index.add("item", id, data.name, (data.icon.strip("icon.").lower(),))
+        index.write(os.path.join(self.site_path, self.search_path))
 
         html_top = """
         <html>
@@ -163,106 +707,149 @@ class PageBuilder:
             </form>
         </div>
         <div class="content">
+        <p>Words are matched from their start: "queen ant" finds Queen Ant, but "ueen" does not.</p>
+        <a href="hunting.html">Best hunting grounds</a> | <a href="loc/heatmap.html">Spawn density</a>
         """.replace(
             "$CSS", self.css.format(self.css_path)
         )
 
-        npc_list = """
+        lists = """
             <h3 id="npcHead" style='display:none'>NPCs</h3>
-            <ul id='npcUL'>
-        """
-        loc_html = """
-                    <a href="{self.loc_path}/{id}.html" title="{npc_name} location on the map">
-                        <img src="{img_path}/etc/flag.gif" border="0" align="absmiddle" alt="{npc_name} location on the map" title="{npc_name} location on the map">
-                    </a>
-        """
-        for i, id in enumerate(search_db["npcs"]["ids"]):
-            npc_name = search_db["npcs"]["names"][i]
-            npc_level = search_db["npcs"]["levels"][i]
-            loc = eval(f'f"""{loc_html}"""') if id in self.spawn_data else ""
-            npc_list += f"<li style='display:none'><a href='{self.npc_path}/{id}.html'>{npc_name} ({npc_level}) {loc}</a></li>\n"
-        npc_list += "\n</ul>"
-
-        item_list = """
+            <ul id='npcUL'></ul>
             <h3 id="itemHead" style='display:none'>Items</h3>
-            <ul id='itemUL'>
+            <ul id='itemUL'></ul>
         """
 
-        for i, id in enumerate(search_db["items"]["ids"]):
-            icon = self.item_data[id].icon.strip("icon.").lower()
-            item_list += f"<li style='display:none'><a href='{self.item_path}/{id}.html'><img src='{img_path}/icons/{icon}.png' style='position:relative; top:10px;' class='img_border'>{search_db['items']['names'][i]}</a></li>\n"
-        item_list += "\n</ul>"
-
-        html_bottom = """
-        </div>
-        <script src="https://ajax.googleapis.com/ajax/libs/jquery/2.1.1/jquery.min.js"></script>
-        <script>
-          var urlParams;
-          (window.onpopstate = function () {
-              var match,
-                  pl     = /\+/g,  // Regex for replacing addition symbol with a space
-                  search = /([^&=]+)=?([^&]*)/g,
-                  decode = function (s) { return decodeURIComponent(s.replace(pl, " ")); },
-                  query  = window.location.search.substring(1);
-
-              urlParams = {};
-              while (match = search.exec(query))
-                 urlParams[decode(match[1])] = decode(match[2]);
-          })();
-          if (urlParams["search"] !== undefined) {
-            var filter, ul, li, a, i, txtValue, listIDs, npcHead, itemHead;
-
-            listIds = ["npcUL", "itemUL"]
-            filter = urlParams["search"].toUpperCase();
-            document.getElementById("npcHead").style.display = "";
-            document.getElementById("itemHead").style.display = "";
-
-            $.each( listIds, function( index, listId) {
-
-            ul = document.getElementById(listId);
-            li = ul.getElementsByTagName('li');
-
-            if (filter.slice(0, 3) == "ID=") {
-              for (i = 0; i < li.length; i++) {
-                a = li[i].getElementsByTagName("a")[0];
-                txtValue = a.href.split('/').pop().split('.html')[0];
-                if (txtValue.toUpperCase() == filter.split('=').pop()) {
-                  li[i].style.display = "";
-                } else {
-                  li[i].style.display = "none";
-                }
-            }
+        # Script answering queries from the index (paths are relative to the site):
+        script = """
+          var indexPath = "$INDEX", npcPath = "$NPC", itemPath = "$ITEM", locPath = "$LOC", imgPath = "$IMG";
+          var idBucket = $ID_BUCKET, prefixLen = $PREFIX_LEN;
+
+          // Must match utils.search_index.tokenize:
+          function tokenize(text) { return text.toLowerCase().match(/[\\p{L}\\p{N}]+/gu) || []; }
+
+          function escapeHtml(text) {
+            return String(text).replace(/&/g, "&amp;").replace(/</g, "&lt;").replace(/>/g, "&gt;")
+              .replace(/"/g, "&quot;").replace(/'/g, "&#39;");
+          }
+
+          function loadShard(path) {
+            return fetch(indexPath + "/" + path).then(function(response) {
+              return response.ok ? response.json() : {};
+            });
+          }
+
+          // Returns true if every query token is the start of one of the name's tokens:
+          function matches(name, queryTokens) {
+            var nameTokens = tokenize(name);
+            return queryTokens.every(function(queryToken) {
+              return nameTokens.some(function(nameToken) { return nameToken.startsWith(queryToken); });
+            });
+          }
+
+          function search(query) {
+            var idMatch = /^ID=\\s*(\\d+)$/i.exec(query.trim());
+            if (idMatch) {
+              var id = idMatch[1];
+              return loadShard("id/" + Math.floor(parseInt(id) / idBucket) + ".json").then(function(shard) {
+                var results = {npc: [], item: []};
+                $.each(results, function(family) {
+                  if (shard[family] && shard[family].data[id]) { results[family].push([id].concat(shard[family].data[id])); }
+                });
+                return results;
+              });
             }
-            else {
-              for (i = 0; i < li.length; i++) {
-                a = li[i].getElementsByTagName("a")[0];
-                txtValue = a.textContent || a.innerText;
-                if (txtValue.toUpperCase().indexOf(filter) > -1) {
-                  li[i].style.display = "";
-                } else {
-                  li[i].style.display = "none";
-                }
-              }
-            };
-          });
-         }
 
-          $("#searchTxt").keyup(function(event) {
-              if (event.keyCode === 13) {
-                  $("#myButton").click();
+            var queryTokens = tokenize(query);
+            if (queryTokens.length === 0) { return Promise.resolve({npc: [], item: []}); }
+            // The longest token is the most selective, so only its shard is needed:
+            var key = queryTokens.reduce(function(a, b) { return b.length > a.length ? b : a; });
+            // Shards are named after code points, not UTF-16 units as key.slice would count:
+            return loadShard(Array.from(key).slice(0, prefixLen).join("") + ".json").then(function(shard) {
+              var results = {npc: [], item: []};
+              $.each(results, function(family) {
+                if (!shard[family]) { return; }
+                var ids = {};
+                $.each(shard[family].tokens, function(token, tokenIds) {
+                  if (token.startsWith(key)) { tokenIds.forEach(function(id) { ids[id] = true; }); }
+                });
+                $.each(ids, function(id) {
+                  var entry = shard[family].data[id];
+                  if (matches(entry[0], queryTokens)) { results[family].push([id].concat(entry)); }
+                });
+              });
+              return results;
+            });
+          }
+
+          function show(results) {
+            // NPCs are listed in order of level, and items in order of name:
+            results.npc.sort(function(a, b) { return a[2] - b[2] || (a[1] < b[1] ? -1 : a[1] > b[1]) || a[0] - b[0]; });
+            results.item.sort(function(a, b) {
+              var x = a[1].toLowerCase(), y = b[1].toLowerCase();
+              return (x < y ? -1 : x > y) || a[0] - b[0];
+            });
+
+            var npcs = results.npc.map(function(npc) {
+              var name = escapeHtml(npc[1]), loc = "";
+              if (npc[3]) {
+                loc = "<a href='" + locPath + "/" + npc[0] + ".html' title='" + name + " location on the map'>"
+                  + "<img src='" + imgPath + "/etc/flag.gif' border='0' align='absmiddle' alt='" + name
+                  + " location on the map' title='" + name + " location on the map'></a>";
               }
-          });
-
-        </script>
+              return "<li><a href='" + npcPath + "/" + npc[0] + ".html'>" + name + " (" + npc[2] + ")</a> " + loc + "</li>";
+            });
+            var items = results.item.map(function(item) {
+              return "<li><a href='" + itemPath + "/" + item[0] + ".html'><img src='" + imgPath + "/icons/"
+                + escapeHtml(item[2]) + ".png' style='position:relative; top:10px;' class='img_border'>"
+                + escapeHtml(item[1]) + "</a></li>";
+            });
+
+            document.getElementById("npcUL").innerHTML = npcs.join("\\n");
+            document.getElementById("itemUL").innerHTML = items.join("\\n");
+            document.getElementById("npcHead").style.display = "";
+            document.getElementById("itemHead").style.display = "";
+          }
 
+          var query = new URLSearchParams(window.location.search).get("search");
+          if (query !== null) {
+            document.getElementById("searchTxt").value = query;
+            search(query).then(show);
+          }
+        """
+        script = (
+            script.replace("$INDEX", self.search_path)
+            .replace("$NPC", self.npc_path)
+            .replace("$ITEM", self.item_path)
+            .replace("$LOC", self.loc_path)
+            .replace("$IMG", self.img_path)
+            .replace("$ID_BUCKET", str(index.id_bucket))
+            .replace("$PREFIX_LEN", str(index.prefix_len))
+        )
+        script_url = self.write_asset(self.js_path, "search.js", script)
 
+        html_bottom = f"""
+        </div>
+        <script src="https://ajax.googleapis.com/ajax/libs/jquery/2.1.1/jquery.min.js"></script>
+        <script src="{script_url}"></script>
         </body>
         </html>
         """
 
-        html = f"{html_top}\n{npc_list}\n{item_list}\n{html_bottom}"
-        with open(os.path.join(self.site_path, f"search.html"), "w") as f:
-            f.write(html)
+        html = f"{html_top}\n{lists}\n{html_bottom}"
+        self.write_page("", "search.html", html)
+
+    def shared_drops(self, data):
+        """Returns create_drops(data), only rendering each distinct drop table once
+        Drop tables are keyed by the NPC's drop and spoil lists, so NPCs with identical
+        lists (e.g. champion variants) all reuse the same string
+
+        """
+        key = (tuple(map(tuple, data["drop"])), tuple(map(tuple, data["spoil"])))
+        html = self.drop_tables.get(key)
+        if html is None:
+            html = self.drop_tables[key] = self.create_drops(data)
+        return html
 
     def create_drops(self, data):
         img_path = f"../{self.img_path}"
@@ -279,27 +866,25 @@ class PageBuilder:
             </tr>
         """
 
-        template = """
+        template = utils.Template(
+            """
                 <tr $COLOR>
-                  <td align="left"><img src="{img_path}/icons/{icon}.png" align="absmiddle" class="img_border" alt="{drop[4]}" title="{drop[4]}"> <a href="../{self.item_path}/{drop[0]}.html" title="{drop[4]}">{drop[4]}</a> ($DROP)</td>
-                  <td>$CRYSTALS</td>
+                  <td align="left"><img src="{img_path}/icons/{icon}.png" align="absmiddle" class="img_border" alt="{drop[4]}" title="{drop[4]}"> <a href="../{self.item_path}/{drop[0]}.html" title="{drop[4]}">{drop[4]}</a> ({amount})</td>
+                  <td>{crystals}</td>
                   <td>{format_probability(drop[3])}</td>
                 </tr>
-        """
+        """,
+            globals(),
+        )
 
         drops = []
         chances = []
         for i, drop in enumerate(data["drop"]):
             icon = self.item_data[drop[0]].icon.strip("icon.").lower()
             crystal = self.item_data[drop[0]].crystal
-            drops.append(
-                eval(f'f"""{template}"""')
-                .replace("$DROP", f"{drop[1]}-{drop[2]}" if drop[1] != drop[2] else f"{drop[1]}")
-                .replace(
-                    "$CRYSTALS",
-                    f"{crystal.count} {crystal.type}" if crystal.count is not None else "-",
-                )
-            )
+            amount = f"{drop[1]}-{drop[2]}" if drop[1] != drop[2] else f"{drop[1]}"
+            crystals = f"{crystal.count} {crystal.type}" if crystal.count is not None else "-"
+            drops.append(template.render(locals()))
             chances.append(drop[3])
 
         # Now sort the drop list in order of chance:
@@ -315,14 +900,9 @@ class PageBuilder:
         for i, drop in enumerate(data["spoil"]):
             icon = self.item_data[drop[0]].icon.strip("icon.").lower()
             crystal = self.item_data[drop[0]].crystal
-            spoils.append(
-                eval(f'f"""{template}"""')
-                .replace("$DROP", f"{drop[1]}-{drop[2]}" if drop[1] != drop[2] else f"{drop[1]}")
-                .replace(
-                    "$CRYSTALS",
-                    f"{crystal.count} {crystal.type}" if crystal.count is not None else "-",
-                )
-            )
+            amount = f"{drop[1]}-{drop[2]}" if drop[1] != drop[2] else f"{drop[1]}"
+            crystals = f"{crystal.count} {crystal.type}" if crystal.count is not None else "-"
+            spoils.append(template.render(locals()))
             chances.append(drop[3])
 
         # Now sort the spoil list in order of chance:
@@ -335,9 +915,10 @@ class PageBuilder:
 
         return f"{header}\n{drops}\n{spoils}"
 
-    def create_npc_pages(self):
+    def create_npc_pages(self, ids=None):
         img_path = f"../{self.img_path}"
-        header_template = """
+        header_template = utils.Template(
+            """
         <td valign="top" bgcolor="#1E4863">
             <table width="100%" border="0" cellpadding="5" cellspacing="0" class="show_list">
                 <tbody>
@@ -347,29 +928,41 @@ class PageBuilder:
                             <br>
                             <span class="txtbig"><b>{name}</b> ({stats["level"]})</span>
                             &nbsp;&nbsp;&nbsp;
-                            $LOC
+                            {loc}
                             <br>
                             <img src="{img_path}/etc/blank.gif" height="10">
                             <br>
-        """
+        """,
+            globals(),
+        )
 
-        loc_html = """
+        loc_html = utils.Template(
+            """
+        <a href="../{self.loc_path}/{id}.html" title="{name} location on the map">
+        <img src="../{self.thumb_path}/{id}.jpg" width="{self.thumb_width}" align="right" border="0" class="img_border" alt="{name} spawn locations">
+        </a>
         <a href="../{self.loc_path}/{id}.html" title="{name} location on the map">
         <img src="{img_path}/etc/flag.gif" border="0" align="absmiddle" alt="{name} location on the map" title="{name} location on the map">
         Location
         </a>
-        """
+        """,
+            globals(),
+        )
         skill_template = """<img src="{0}/icons/{1}.png" width="16" align="absmiddle" class="img_border" alt="{2} ({3})\n{4}" title="{2} ({3})\n{4}">"""
-        stats_template = """
+        stats_template = utils.Template(
+            """
             <b>Exp: {stats["exp"]}, SP: {stats["sp"]}</b><br>
             Aggressive: {stats["agro"]}, Herbs: {stats["herbs"]}<br>
             HP: {stats["hp"]}, P.Atk: {stats["patk"]}, M.Atk: {stats["matk"]}, RunSpd: {stats["runspd"]}
             </td>
             </tr>
-        """
+        """,
+            globals(),
+        )
         footer = "</tbody></table>\n</td>"
+        css = self.css.format(f"../{self.css_path}")
 
-        for id, data in self.npc_data.items():
+        for id, data in self.select(self.npc_data, ids).items():
             name = data["name"]
             stats = data["stats"]
             try:
@@ -384,65 +977,78 @@ class PageBuilder:
                     pass
 
             title = f"<title>{name}</title>"
-            header = eval(f'f"""{header_template}"""').replace(
-                "$LOC", eval(f'f"""{loc_html}"""') if id in self.spawn_data else ""
-            )
+            loc = loc_html.render(locals()) if id in self.spawn_data else ""
+            header = header_template.render(locals())
             # skills = Add skills here later
-            stat_list = eval(f'f"""{stats_template}"""')
+            stat_list = stats_template.render(locals())
 
-            skill_list = ""
+            skill_list = []
             for skill in skills:
                 skill_data = self.skill_data[skill.id][skill.level]
                 icon = skill_data.icon.lower().replace("icon.", "")
-                skill_list += skill_template.format(
-                    img_path, icon, skill_data.name, skill.level, skill_data.desc
+                skill_list.append(
+                    skill_template.format(
+                        img_path, icon, skill_data.name, skill.level, skill_data.desc
+                    )
                 )
-            skill_list += "\n<br><br>"
-
-            drops = self.create_drops(data)
+            skill_list.append("\n<br><br>")
+            skill_list = "".join(skill_list)
 
-            css = self.css.format(f"../{self.css_path}")
+            drops = self.shared_drops(data)
 
             html = f"<html>\n{title}\n{css}\n{self.search}\n{self.table_head.format(img_path)}\n{header}\n{skill_list}\n{stat_list}\n{drops}\n{self.table_foot.format(img_path)}\n{footer}</html>"
-            with open(
-                os.path.join(self.site_path, self.npc_path, f"{id}.html"), "w", encoding="utf-8"
-            ) as f:
-                f.write(html)
+            self.write_page(self.npc_path, f"{id}.html", html)
 
     def create_drop_data(self):
-        Drop = namedtuple("Drop", ["npc", "min", "max", "chance"])
-        Npc = namedtuple("Npc", ["id", "name", "level", "agro"])
-        drop_data = {}
-
+        npc_tuples = {}
         for npc_id, npc in self.npc_data.items():
             stats = npc["stats"]
-            npc_tuple = Npc(
+            npc_tuples[npc_id] = Npc(
                 npc_id,
                 npc["name"],
                 stats["level"],
                 "Passive" if stats["agro"] is "No" else "Aggressive",
             )
 
-            for drop_type in ["drop", "spoil"]:
-                for drop in npc[drop_type]:
-                    id, min_amt, max_amt, chance, name = drop
-
-                    if id not in drop_data:
-                        drop_data[id] = {}
-                        drop_data[id]["name"] = name
-                        drop_data[id]["type"] = self.item_data[id].type
-                        drop_data[id]["crystal"] = self.item_data[id].crystal
-                        drop_data[id]["info"] = []
-                        drop_data[id]["drop"] = []
-                        drop_data[id]["spoil"] = []
+        # Group the drop table by item, with items and their NPCs in order of appearance:
+        self.drop_table = utils.DropTable.from_npc_data(self.npc_data)
+        rows = self.drop_table.rows
+        item_ids, order, bounds = self.drop_table.group_by("item_id")
 
-                    drop_data[id][drop_type].append(Drop(npc_tuple, min_amt, max_amt, chance))
+        drop_data = {}
+        for id, start, end in zip(item_ids.tolist(), bounds[:-1], bounds[1:]):
+            drop_data[id] = {}
+            drop_data[id]["name"] = self.drop_table.item_names[id]
+            drop_data[id]["type"] = self.item_data[id].type
+            drop_data[id]["crystal"] = self.item_data[id].crystal
+            drop_data[id]["info"] = []
+            drop_data[id]["drop"] = []
+            drop_data[id]["spoil"] = []
+
+            for npc_id, _, _, min_amt, max_amt, chance, spoil in rows[order[start:end]].tolist():
+                drop_type = "spoil" if spoil else "drop"
+                drop_data[id][drop_type].append(Drop(npc_tuples[npc_id], min_amt, max_amt, chance))
 
         return drop_data
 
     def create_item_drops(self, id):
-        img_path = f"../{self.img_path}"
+        """Creates the drop table of an item page, and the data of its rows
+        Rather than a <tr> per NPC, each section of the table (drop and spoil) is only a
+        pair of spacer rows. The rows are given as JSON, sorted by level, and the item
+        page's script renders the rows that are on screen between the spacers
+
+        Parameters
+        ----------
+        id : int
+            Id of the item
+
+        Returns
+        -------
+        tuple
+            (html, data) where html is the table header and sections, and data is a
+            dict mapping "drop" and "spoil" to the output of item_drop_rows
 
+        """
         try:
             data = self.drop_data[id]
         except KeyError:
@@ -477,93 +1083,195 @@ class PageBuilder:
         #               <td class="first_line"><a href="{0}/{1}.html?sort=chance">Chance</a></td>
         #             </tr>
         # """
-        header_2 = """
+        section = """
                 <tr>
-                  <td colspan="4" align="left"><b>{}</b></td>
+                  <td colspan="5" align="left"><b>{0}</b></td>
                 </tr>
+                <tr id="{1}Top"><td colspan="5" style="padding:0; border:0"></td></tr>
+                <tr id="{1}Bottom"><td colspan="5" style="padding:0; border:0"></td></tr>
         """
 
-        template = """
-                <tr class="itemData" $COLOR>
-                  <td class="npcName" align="left">
-                    <a href="../{self.npc_path}/{drop.npc.id}.html" title="View {drop.npc.name} drop and spoil">
-                        {drop.npc.name}
-                    </a>
-                  $LOC
-                  </td>
-                  <td class="npcLevel" align="left">{drop.npc.level}</td>
-                  <td class="npcAgro">{drop.npc.agro}</td>
-                  <td class="dropCount">$DROP</td>
-                  <td class="dropChance">{format_probability(drop.chance)}</td>
-                </tr>
-        """
-        # Removed location from drop portion of template:
-        #  <a href="/loc/{drop.npc.id}/{drop.npc.name.lower().replace(" ", "-")}.html" title="{drop.npc.name} location on the map"><img src="{img_path}/etc/flag.gif" border="0" align="absmiddle" alt="{drop.npc.name} location on the map" title="{drop.npc.name} location on the map"></a>
+        drops = section.format("Drop", "drop")
+        spoils = section.format("Spoil", "spoil")
+        rows = {drop_type: self.item_drop_rows(data[drop_type]) for drop_type in ["drop", "spoil"]}
 
-        drops = []
-        levels = []
-        loc_html = """
-                    <a href="../{self.loc_path}/{drop.npc.id}.html" title="{drop.npc.name} location on the map">
-                        <img src="{img_path}/etc/flag.gif" border="0" align="absmiddle" alt="{drop.npc.name} location on the map" title="{drop.npc.name} location on the map">
-                    </a>
-        """
-        for i, drop in enumerate(data["drop"]):
-            drops.append(
-                eval(f'f"""{template}"""')
-                .replace(
-                    "$DROP", f"{drop.min}-{drop.max}" if drop.min != drop.max else f"{drop.min}"
-                )
-                .replace(
-                    "$LOC", eval(f'f"""{loc_html}"""') if drop.npc.id in self.spawn_data else ""
-                )
-            )
-            levels.append(int(drop.npc.level))
+        return f"{header}\n{drops}<tr></tr>\n{spoils}", rows
 
-        # Now sort the drop list in order of chance:
-        if len(drops) > 0:
-            _, drops = (list(t) for t in zip(*sorted(zip(levels, drops))))
-            for i, drop in enumerate(drops):
-                drops[i] = drop.replace(" $COLOR", " bgcolor=#1C425B" if i % 2 == 0 else "")
+    def item_drop_rows(self, drops):
+        """Converts the drops (or spoils) of an item to rows for the item page's script
 
-        drops = header_2.format("Drop") + "\n" + "\n".join(drops)
+        Parameters
+        ----------
+        drops : list
+            List of Drop named tuples, as in self.drop_data
 
-        spoils = []
-        levels = []
-        for i, drop in enumerate(data["spoil"]):
-            spoils.append(
-                eval(f'f"""{template}"""')
-                .replace(
-                    "$DROP", f"{drop.min}-{drop.max}" if drop.min != drop.max else f"{drop.min}"
-                )
-                .replace(
-                    "$LOC", eval(f'f"""{loc_html}"""') if drop.npc.id in self.spawn_data else ""
-                )
-            )
-            levels.append(int(drop.npc.level))
+        Returns
+        -------
+        dict
+            {"rows": rows, "levels": levels, "offsets": offsets}, where each row is
+            [npc_id, npc_name, level, aggressive, amount, chance, has_loc] and rows are
+            sorted by level. The rows of NPCs with level levels[i] are
+            rows[offsets[i] : offsets[i + 1]]
 
-        # Now sort the spoil list in order of chance:
-        if len(spoils) > 0:
-            _, spoils = (list(t) for t in zip(*sorted(zip(levels, spoils))))
-            for i, spoil in enumerate(spoils):
-                spoils[i] = spoil.replace(" $COLOR", " bgcolor=#1C425B" if i % 2 == 0 else "")
+        """
+        rows = []
+        for drop in drops:
+            amount = f"{drop.min}-{drop.max}" if drop.min != drop.max else f"{drop.min}"
+            rows.append(
+                [
+                    drop.npc.id,
+                    drop.npc.name,
+                    int(drop.npc.level),
+                    int(drop.npc.agro == "Aggressive"),
+                    amount,
+                    format_probability(drop.chance),
+                    int(drop.npc.id in self.spawn_data),
+                ]
+            )
+        # Sort by level, with NPCs of the same level in order of id (as text):
+        rows.sort(key=lambda row: (row[2], str(row[0])))
 
-        spoils = header_2.format("Spoil") + "\n" + "\n".join(spoils)
+        levels, offsets = [], []
+        for i, row in enumerate(rows):
+            if len(levels) == 0 or row[2] != levels[-1]:
+                levels.append(row[2])
+                offsets.append(i)
+        offsets.append(len(rows))
 
-        # return f"{header.format(self.item_path, data['name'].lower().replace(' ', '-'))}\n{drops}<tr></tr>\n{spoils}"
-        return f"{header}\n{drops}<tr></tr>\n{spoils}"
+        return {"rows": rows, "levels": levels, "offsets": offsets}
 
-    def create_item_pages(self):
+    def create_item_pages(self, ids=None):
         img_path = f"../{self.img_path}"
-        header_template = """
+        header_template = utils.Template(
+            """
         <td valign="top" bgcolor="#1E4863">
               <table width="100%" border="0" cellpadding="5" cellspacing="0" class="show_list">
                 <tbody id="itemDataTable"><tr><td colspan="4"><img src="{img_path}/etc/blank.gif" height="8"><br><img src="{img_path}/icons/{icon}.png" align="absmiddle" class="img_border" alt="{name}" title="{name}">
         		<b class="txtbig">{name}</b>{crystals}<br><img src="{img_path}/etc/blank.gif" height="8"><br>
-        """
+        """,
+            globals(),
+        )
         desc_template = 'Type: Blunt, P.Atk/Def: 175, M.Atk/Def: 91		<br><img src="{img_path}/etc/blank.gif" height="8"><br>Bestows either Anger, Health, or Rsk. Focus.</td></tr>'
         footer = "</tbody></table>\n</td>"
+        css = self.css.format(f"../{self.css_path}")
+        # Script rendering the drop rows, shared by every item page (paths are relative to
+        # the item directory):
+        script = """
+            function myFunction() {
+              var popup = document.getElementById("myPopup");
+              popup.classList.toggle("show");
+            };
 
-        for id, data in self.item_data.items():
+            var dropData = JSON.parse(document.getElementById("dropData").textContent);
+            var rowHeight = 32;  // Estimate, replaced by the measured height of rendered rows
+            var overscan = 10;  // Number of rows rendered beyond each edge of the window
+            var sections = ["drop", "spoil"].map(function(name) {
+              return {
+                data: dropData[name],
+                top: document.getElementById(name + "Top"),
+                bottom: document.getElementById(name + "Bottom"),
+                start: 0,
+                end: dropData[name].rows.length,
+                first: -1,
+                last: -1
+              };
+            });
+
+            function escapeHtml(text) {
+              return String(text).replace(/&/g, "&amp;").replace(/</g, "&lt;").replace(/>/g, "&gt;")
+                .replace(/"/g, "&quot;").replace(/'/g, "&#39;");
+            }
+
+            // Returns the number of levels below level (or not above it, if after is true):
+            function bisect(levels, level, after) {
+              var lo = 0, hi = levels.length;
+              while (lo < hi) {
+                var mid = (lo + hi) >> 1;
+                if (levels[mid] < level || (after && levels[mid] === level)) { lo = mid + 1; }
+                else { hi = mid; }
+              }
+              return lo;
+            }
+
+            function rowHtml(row, i) {
+              var id = row[0], name = escapeHtml(row[1]), loc = "";
+              if (row[6]) {
+                loc = '<a href="$LOC/' + id + '.html" title="' + name + ' location on the map">'
+                  + '<img src="$IMG/etc/flag.gif" border="0" align="absmiddle" alt="' + name
+                  + ' location on the map" title="' + name + ' location on the map"></a>';
+              }
+              return '<tr class="itemData"' + (i % 2 === 0 ? ' bgcolor=#1C425B' : '') + '>'
+                + '<td class="npcName" align="left"><a href="$NPC/' + id + '.html" title="View '
+                + name + ' drop and spoil">' + name + '</a> ' + loc + '</td>'
+                + '<td class="npcLevel" align="left">' + row[2] + '</td>'
+                + '<td class="npcAgro">' + (row[3] ? "Aggressive" : "Passive") + '</td>'
+                + '<td class="dropCount">' + row[4] + '</td>'
+                + '<td class="dropChance">' + row[5] + '</td></tr>';
+            }
+
+            // Renders the rows of a section that are on screen, with spacers for the rest:
+            function render(section, force) {
+              var n = section.end - section.start;
+              var top = section.top.getBoundingClientRect().top;
+              var first = Math.max(0, Math.min(n, Math.floor(-top / rowHeight) - overscan));
+              var last = Math.max(first, Math.min(n, Math.ceil((window.innerHeight - top) / rowHeight) + overscan));
+              if (!force && first === section.first && last === section.last) { return; }
+
+              while (section.top.nextElementSibling !== section.bottom) {
+                section.top.parentNode.removeChild(section.top.nextElementSibling);
+              }
+              var html = [];
+              for (var i = first; i < last; i++) { html.push(rowHtml(section.data.rows[section.start + i], i)); }
+              section.top.insertAdjacentHTML("afterend", html.join(""));
+              if (last > first) {
+                rowHeight = (section.bottom.getBoundingClientRect().top - section.top.getBoundingClientRect().bottom) / (last - first);
+              }
+              section.top.firstElementChild.style.height = first * rowHeight + "px";
+              section.bottom.firstElementChild.style.height = (n - last) * rowHeight + "px";
+              section.first = first;
+              section.last = last;
+            }
+
+            function renderAll(force) {
+              sections.forEach(function(section) { render(section, force); });
+            }
+
+            function levelFilter() {
+              var levelMin = parseInt(document.getElementById("levelMin").value);
+              var levelMax = parseInt(document.getElementById("levelMax").value);
+              sections.forEach(function(section) {
+                var levels = section.data.levels, offsets = section.data.offsets;
+                section.start = offsets[bisect(levels, levelMin, false)];
+                section.end = Math.max(section.start, offsets[bisect(levels, levelMax, true)]);
+              });
+              renderAll(true);
+            }
+
+            var scheduled = false;
+            function onScroll() {
+              if (scheduled) { return; }
+              scheduled = true;
+              window.requestAnimationFrame(function() { scheduled = false; renderAll(false); });
+            }
+            window.addEventListener("scroll", onScroll);
+            window.addEventListener("resize", onScroll);
+
+            var levels = [].concat(sections[0].data.levels, sections[1].data.levels);
+            if (levels.length > 0) {
+              document.getElementById("levelMin").value = Math.min.apply(null, levels);
+              document.getElementById("levelMax").value = Math.max.apply(null, levels);
+            }
+            renderAll(true);
+            """
+        script = (
+            script.replace("$NPC", f"../{self.npc_path}")
+            .replace("$LOC", f"../{self.loc_path}")
+            .replace("$IMG", img_path)
+        )
+        script_url = self.write_asset(self.js_path, "item_drops.js", script)
+        script = f'<script src="../{script_url}"></script>'
+
+        for id, data in self.select(self.item_data, ids).items():
             name = data.name
             title = f"<title>{name}</title>"
             crystals = (
@@ -572,248 +1280,258 @@ class PageBuilder:
                 else f" (crystals: {data.crystal.count} {data.crystal.type}) "
             )
             icon = data.icon.strip("icon.").lower()
-            header = eval(f'f"""{header_template}"""')
+            header = header_template.render(locals())
             # Need to scrape descriptions from game files before enabling this:
             desc = ""  # eval(f'f"""{desc_template}"""')
 
-            drops = self.create_item_drops(id)
-
-            css = self.css.format(f"../{self.css_path}")
-            jquery = """
-                <script src="https://ajax.googleapis.com/ajax/libs/jquery/2.1.1/jquery.min.js"></script>
-                <script>
-                function myFunction() {
-                  var popup = document.getElementById("myPopup");
-                  popup.classList.toggle("show");
-                };
-
-                var itemDataTable = document.getElementById("itemDataTable");
-                var itemDatas = itemDataTable.getElementsByClassName("itemData");
-
-                function levelFilter() {
-                  var npcLevel;
-                  var levelMin = parseInt(document.getElementById("levelMin").value);
-                  var levelMax = parseInt(document.getElementById("levelMax").value);
-                  $.each(itemDatas, function(index, itemData) {
-                    npcLevel = parseInt($(itemData.getElementsByClassName("npcLevel")[0]).text());
-                    if ((npcLevel < levelMin) || (npcLevel > levelMax)) { itemData.style.display = "none" }
-                    else { itemData.style.display = "" };
-                  });
-                }
-
-                $(document).ready(function() {
-                  var levelMin = 100;
-                  var levelMax = 0;
-                  $.each(itemDatas, function(index, itemData) {
-                    npcLevel = parseInt($(itemData.getElementsByClassName("npcLevel")[0]).text());
-                    if (npcLevel < levelMin) { levelMin = npcLevel };
-                    if (npcLevel > levelMax) { levelMax = npcLevel };
-
-                    document.getElementById("levelMin").value = levelMin;
-                    document.getElementById("levelMax").value = levelMax;
-                  });
-                })
-                </script>
-            """
+            drops, rows = self.create_item_drops(id)
+            # Escape "</" so names can't end the script element early:
+            rows = json.dumps(rows, separators=(",", ":")).replace("</", "<\\/")
+            data_script = f'<script type="application/json" id="dropData">{rows}</script>'
 
-            html = f"<html>\n{title}\n{css}\n<body>\n{self.search}\n{self.table_head.format(img_path)}\n{header}\n{desc}\n{drops}\n{self.table_foot.format(img_path)}\n{footer}\n</body>\n{jquery}\n</html>"
-            with open(os.path.join(self.site_path, self.item_path, f"{id}.html"), "w") as f:
-                f.write(html)
+            html = f"<html>\n{title}\n{css}\n<body>\n{self.search}\n{self.table_head.format(img_path)}\n{header}\n{desc}\n{drops}\n{self.table_foot.format(img_path)}\n{footer}\n{data_script}\n</body>\n{script}\n</html>"
+            self.write_page(self.item_path, f"{id}.html", html)
 
-    def spawn2map(self, spawn_point):
-        x_map = (
-            (spawn_point.x - self.WORLD_X_MIN) / (self.WORLD_X_MAX - self.WORLD_X_MIN)
-        ) * self.map_size[0]
+    def spawn2map(self, x, y):
+        """Converts world coordinates (numbers or arrays) to pixel coordinates on the map"""
+        x_map = ((x - self.WORLD_X_MIN) / (self.WORLD_X_MAX - self.WORLD_X_MIN)) * self.map_size[0]
         y_map = (
             self.map_size[1]
-            - ((spawn_point.y - self.WORLD_Y_MIN) / (self.WORLD_Y_MAX - self.WORLD_Y_MIN))
-            * self.map_size[1]
+            - ((y - self.WORLD_Y_MIN) / (self.WORLD_Y_MAX - self.WORLD_Y_MIN)) * self.map_size[1]
         )
         return x_map, y_map
 
-    def create_loc_pages(self):
-        img_path = f"../{self.img_path}"
+    def spawn_clusters(self, ids=None):
+        """Clusters the spawn points of NPCs on the map, for each zoom level of the loc pages
+        The spawn points of every NPC are clustered at once, on a grid whose cells are
+        self.cluster_size pixels wide on screen at each zoom level in self.cluster_zooms
 
-        for id, data in self.npc_data.items():
-            if id not in self.spawn_data:
-                continue
+        Parameters
+        ----------
+        ids : list
+            Ids of the NPCs to cluster the spawn points of (defaults to every NPC)
 
-            name = data["name"]
-            title = f"<title>{name} Location</title>"
-            # css = self.css.format(f"../{self.css_path}")
-            css = """
+        Returns
+        -------
+        dict
+            Dict mapping NPC id to a list with the clusters at each zoom level, where each
+            cluster is [x, y, count] with the centroid of the points in map coordinates
+
+        """
+        if ids is None:
+            rows = self.spawn_data.rows
+        else:
+            rows = [self.spawn_data[id] for id in ids if id in self.spawn_data]
+            rows = np.concatenate(rows) if rows else self.spawn_data.rows[:0]
+        x_map, y_map = self.spawn2map(rows["x"], rows["y"])
+
+        clusters = {}
+        for zoom in self.cluster_zooms:
+            # At zoom level z, each pixel of the map image is 2^z pixels on screen:
+            cell_size = self.cluster_size / 2 ** zoom
+            npc_ids, x, y, counts = utils.grid_clusters(rows["npc_id"], x_map, y_map, cell_size)
+            points = list(zip(np.round(x, 1).tolist(), np.round(y, 1).tolist(), counts.tolist()))
+            npc_ids, starts = np.unique(npc_ids, return_index=True)
+            ends = np.r_[starts[1:], len(points)]
+            for npc_id, start, end in zip(npc_ids.tolist(), starts.tolist(), ends.tolist()):
+                clusters.setdefault(npc_id, []).append(points[start:end])
+        return clusters
+
+    def world_map_assets(self):
+        """Writes the style sheet and script showing the world map, shared by the pages
+        with a map (the loc and heatmap pages), and returns the HTML using them
+
+        Returns
+        -------
+        tuple
+            (css, scripts, map_div) HTML of the page's head, of the map's element, and of
+            the scripts creating the map (which must come after map_div)
+
+        """
+        style_url = self.write_asset(
+            self.css_path,
+            "loc.css",
+            """
+            #map {
+              margin: auto;
+              height: 874px;
+              width: 604px;
+            }
+            .spawnCluster {
+              background: rgba(200, 30, 30, 0.85);
+              border: 2px solid #fff;
+              border-radius: 50%;
+              color: #fff;
+              font: bold 11px sans-serif;
+              line-height: 24px;
+              text-align: center;
+            }
+            """,
+        )
+        css = f"""
                     <head>
-                        <link href="{0}/pmfun.css" rel="stylesheet" type="text/css" />
+                        <link href="../{self.css_path}/pmfun.css" rel="stylesheet" type="text/css" />
                         <link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/4.7.0/css/font-awesome.min.css">
-                        <style>
-                        #map {{
-                          margin: auto;
-                          height: 874px;
-                          width: 604px;
-                        }}
-                        </style>
+                        <link href="../{style_url}" rel="stylesheet" type="text/css" />
                     </head>
-            """.format(
-                f"../{self.css_path}"
-            )
-
-            spawn_points = self.spawn_data[id]
-            spawn_list = "<ul id='coords' style='display:none;'>"
-            for spawn_point in spawn_points:
-                x_map, y_map = self.spawn2map(spawn_point)
-                spawn_list += f"\n\t<li x={x_map} y={y_map}></li>"
-            spawn_list += "\n</ul>"
+            """
 
-            npc_title = f"<div align='center'><a href='../{self.npc_path}/{id}.html' title='View {name} drop and spoil'><h2>{name} ({data['stats']['level']})</h2></a></div>"
-            map = '<div id="map" align="center"></div>'
+        # Script creating the map, from the tiles of the world map image:
+        script = """
+                  var map = L.map('map', {
+                      crs: L.CRS.Simple,
+                      nowrap: true,
+                      minZoom: -1.6
+                  });
 
-            jquery = """
+                  // Size of the map image, in pixels, with its top left corner at (0, 0):
+                  var mapDiv = document.getElementById("map");
+                  var height = parseInt(mapDiv.dataset.height);
+                  var bounds = [[-height, 0], [0, parseInt(mapDiv.dataset.width)]];
+                  // Tiles of the map, where tile zoom level maxZoom is the image's own size:
+                  var maxZoom = parseInt(mapDiv.dataset.maxZoom);
+                  L.tileLayer(mapDiv.dataset.tiles + "/{z}/{x}/{y}.png", {
+                    bounds: bounds,
+                    tileSize: parseInt(mapDiv.dataset.tileSize),
+                    minZoom: Math.floor(map.getMinZoom()),
+                    zoomOffset: maxZoom,
+                    minNativeZoom: -maxZoom,
+                    maxNativeZoom: 0,
+                    noWrap: true
+                  }).addTo(map);
+                  map.fitBounds(bounds);
+                  map.setMaxBounds(bounds);
+                  map.on('drag', function() { map.panInsideBounds(bounds, { animate: false }); });
+            """
+        script_url = self.write_asset(self.js_path, "world_map.js", script)
+        scripts = f"""
                 <link rel="stylesheet" href="https://unpkg.com/leaflet@1.6.0/dist/leaflet.css"   integrity="sha512-xwE/Az9zrjBIphAcBb3F6JVqxf46+CDLwfLMHloNu6KEQCAWi6HcDUbeOfBIptF7tcCzusKFjFw2yuvEpDL9wQ=="   crossorigin=""/>
                 <script src="https://unpkg.com/leaflet@1.6.0/dist/leaflet.js"  integrity="sha512-gZwIG9x3wUXg2hdXF6+rVkLF/0Vi9U8D2Ntg4Ga5I5BZpVkVxlJWbSQtXPSiUTtC0TjtGOmxa1AJPuV0CPthew=="  crossorigin=""></script>
               	<script type="text/javascript" src="https://code.jquery.com/jquery-3.2.1.min.js"></script>
               	<script type="text/javascript" src="https://code.jquery.com/ui/1.12.1/jquery-ui.min.js"></script>
-                <script>
+                <script src="../{script_url}"></script>
+            """
+        map_div = f'<div id="map" align="center" data-height="{self.map_size[1]}" data-width="{self.map_size[0]}" data-tiles="../{self.tile_path}" data-tile-size="{self.map_tiles.tile_size}" data-max-zoom="{self.map_tiles.max_zoom}"></div>'
+        return css, scripts, map_div
 
-                  var map = L.map('map', {{
-                      crs: L.CRS.Simple,
-                      nowrap: true,
-                      minZoom: -1.6
-                  }});
+    def create_loc_pages(self, ids=None):
+        css, map_scripts, map = self.world_map_assets()
 
-                  var redIcon = new L.Icon({{
+        # Script showing the spawn points on the map, shared by every loc page:
+        script = """
+                  var redIcon = new L.Icon({
                     iconUrl: 'https://cdn.rawgit.com/pointhi/leaflet-color-markers/master/img/marker-icon-2x-red.png',
                     shadowUrl: 'https://cdnjs.cloudflare.com/ajax/libs/leaflet/0.7.7/images/marker-shadow.png',
                     iconSize: [25, 41],
                     iconAnchor: [12, 41],
                     popupAnchor: [1, -34],
                     shadowSize: [41, 41]
-                  }});
-
-                  var bounds = [[0, 0], [{0}, {1}]];
-                  var image = L.imageOverlay("../img/etc/world_map_interlude_big.png", bounds).addTo(map);
-                  map.fitBounds(bounds);
+                  });
 
-                  var bigIcon = new L.Icon({{
+                  var bigIcon = new L.Icon({
                     iconUrl: 'https://cdn.rawgit.com/pointhi/leaflet-color-markers/master/img/marker-icon-2x-red.png',
                     iconSize: [25, 41],
                     iconAnchor: [12, 41],
                     popupAnchor: [1, -34],
-                  }});
+                  });
 
-                  var smallIcon = new L.Icon({{
+                  var smallIcon = new L.Icon({
                     iconUrl: 'https://cdn.rawgit.com/pointhi/leaflet-color-markers/master/img/marker-icon-2x-red.png',
                     iconSize: [12.5, 20.5],
                     iconAnchor: [6, 20.5],
                     popupAnchor: [1, -34],
-                  }});
+                  });
 
-                  var ul = document.getElementById("coords");
-                  var li = ul.getElementsByTagName('li');
-                  var markers = []
-                  for (i = 0; i < li.length; i++) {{
-                    x = li[i].getAttribute("x");
-                    y = li[i].getAttribute("y");
-                    markers.push(L.marker(L.latLng(y, x), {{icon: smallIcon}}).addTo(map));
-                  }}
+                  // Clusters of spawn points for each zoom level, as [x, y, count]:
+                  var spawns = JSON.parse(document.getElementById("spawnData").textContent);
+                  var markers = L.layerGroup().addTo(map);
+
+                  // Only the clusters of the current zoom level in (or near) the view are shown:
+                  function showSpawns() {
+                    var zoom = Math.round(map.getZoom());
+                    var level = Math.min(Math.max(zoom - spawns.minZoom, 0), spawns.levels.length - 1);
+                    var view = map.getBounds().pad(0.5);
+                    var icon = zoom > 1 ? bigIcon : smallIcon;
+                    markers.clearLayers();
+                    spawns.levels[level].forEach(function (cluster) {
+                      var latLng = L.latLng(cluster[1] - height, cluster[0]);
+                      if (!view.contains(latLng)) {
+                        return;
+                      }
+                      if (cluster[2] == 1) {
+                        markers.addLayer(L.marker(latLng, {icon: icon}));
+                      } else {
+                        markers.addLayer(L.marker(latLng, {
+                          icon: L.divIcon({className: "spawnCluster", html: cluster[2], iconSize: [28, 28]}),
+                          title: cluster[2] + " spawns"
+                        }));
+                      }
+                    });
+                  }
+
+                  map.on('moveend', showSpawns);  // Also fired when zooming
+                  showSpawns();
+            """
+        script_url = self.write_asset(self.js_path, "loc_map.js", script)
+        jquery = f"""{map_scripts}
+                <script src="../{script_url}"></script>
+            """
+
+        npc_data = self.select(self.npc_data, ids)
+        clusters = self.spawn_clusters([id for id in npc_data if id in self.spawn_data])
+        for id, data in npc_data.items():
+            if id not in self.spawn_data:
+                continue
+
+            name = data["name"]
+            title = f"<title>{name} Location</title>"
+
+            spawns = {"minZoom": self.cluster_zooms.start, "levels": clusters[id]}
+            spawns = json.dumps(spawns, separators=(",", ":"))
+            spawn_list = f'<script type="application/json" id="spawnData">{spawns}</script>'
+
+            npc_title = f"<div align='center'><a href='../{self.npc_path}/{id}.html' title='View {name} drop and spoil'><h2>{name} ({data['stats']['level']})</h2></a><a href='heatmap.html'>Spawn density of all NPCs</a><br><br></div>"
 
-                  map.setMaxBounds(bounds);
-                  map.on('drag', function() {{ map.panInsideBounds(bounds, {{ animate: false }}); }});
-
-                  map.on('zoomend', function(ev){{
-                    for (i = 0; i < markers.length; i++) {{
-                      marker = markers[i];
-                      if (map.getZoom() > 1) {{
-                        marker.setIcon(bigIcon);
-                      }} else {{
-                        marker.setIcon(smallIcon);
-                      }}
-                    }}
-                  }})
-              	</script>
-            """.format(
-                self.map_size[1], self.map_size[0]
-            )
             html = f"<html>\n{title}\n{css}\n{self.search}\n<br><br><br><br>\n{spawn_list}\n{npc_title}\n{map}\n{jquery}</html>"
-            with open(os.path.join(self.site_path, self.loc_path, f"{id}.html"), "w") as f:
-                f.write(html)
+            self.write_page(self.loc_path, f"{id}.html", html)
 
     def create_ingredient_table(self, recipe, first=True):
         img_path = f"../{self.img_path}"
         ingredient_list = set()
 
         if first:
-            ingredients = f"<ul class='{recipe.result.id}'>\n"
+            ingredients = [f"<ul class='{recipe.result.id}'>\n"]
         else:
-            ingredients = f"<ul class='{recipe.result.id}' style = 'display:none'>\n"
+            ingredients = [f"<ul class='{recipe.result.id}' style = 'display:none'>\n"]
 
         for ingredient in recipe.ingredients:
             icon = self.item_data[ingredient.id].icon.strip("icon.").lower()
-            ingredients += f"\t<li class='{ingredient.id}'><img src='{img_path}/icons/{icon}.png' style='position:relative; top:10px;' class='img_border'> <text class='item_count'>{ingredient.count}</text>x <a href='../item/{ingredient.id}.html'>{ingredient.name}</a>"
+            ingredients.append(
+                f"\t<li class='{ingredient.id}'><img src='{img_path}/icons/{icon}.png' style='position:relative; top:10px;' class='img_border'> <text class='item_count'>{ingredient.count}</text>x <a href='../item/{ingredient.id}.html'>{ingredient.name}</a>"
+            )
             ingredient_list.add(ingredient.id)
 
             if ingredient.id in self.recipe_results and ingredient.id != recipe.id:
-                ingredients += f" (<a href='../{self.recipe_path}/{ingredient.id}.html'>recipe</a>) <img src='../img/etc/expand.png' id='{ingredient.id}' height='12' style='cursor:pointer; position:relative; top:3px;' onclick='myFunction(this)'></li>\n"
+                ingredients.append(
+                    f" (<a href='../{self.recipe_path}/{ingredient.id}.html'>recipe</a>) <img src='../img/etc/expand.png' id='{ingredient.id}' height='12' style='cursor:pointer; position:relative; top:3px;' onclick='myFunction(this)'></li>\n"
+                )
                 ingredients_, ingredient_list_ = self.create_ingredient_table(
                     self.recipe_data[self.recipe_results[ingredient.id]], first=False
                 )
-                ingredients += ingredients_
-                ingredients += "</details>"
+                ingredients.append(ingredients_)
+                ingredients.append("</details>")
                 ingredient_list = ingredient_list.union(ingredient_list_)
             else:
-                ingredients += "</li>\n"
-        ingredients += "</ul>"
-        return ingredients, ingredient_list
+                ingredients.append("</li>\n")
+        ingredients.append("</ul>")
+        return "".join(ingredients), ingredient_list
 
-    def create_recipe_pages(self):
+    def create_recipe_pages(self, ids=None):
         img_path = f"../{self.img_path}"
         css = self.css.format(f"../{self.css_path}")
 
-        self.recipe_data = utils.RecipeParser(item_data=self.item_data).parse()
-        self.recipe_results = {}
-        for recipe_id, recipe in self.recipe_data.items():
-            self.recipe_results[recipe.result.id] = recipe_id
-
-        for recipe in self.recipe_data.values():
-            title = f"<title>{recipe.name}</title>"
-            info = f"<b>{recipe.name}</b> (level {recipe.level}, quantity {recipe.result.count}, sucess chance {recipe.chance}, MP {recipe.mp}"
-            ingredients, ingredient_list = self.create_ingredient_table(recipe)
-
-            table_0 = """
-            <td align="center" valign="top" bgcolor="#1E4863">
-            <img src="{0}/etc/blank.gif" height="8"><br>
-            <b class="txtbig"><a href='../item/{1}.html'>Recipe</a>:
-            <a href='../item/{2}.html'>{3}</a> ({4})</b><br><img src="{0}/etc/blank.gif" height="8"><br>
-            <table cellspacing='0' cellpadding='0' border='0' width='100%' class='txt'>\n<tbody>\n<tr>\n<td>
-            """.format(
-                img_path, recipe.id, recipe.result.id, recipe.result.name, recipe.chance
-            )
-            table_1 = "</td>\n<td valign='top'><h3>Totals:</h3>"
-            table_2 = "</td>\n</tr>\n</tbody>\n</table>"
-
-            totals = "<ul id='totals'>\n"
-            base_ingredients = [ingredient.id for ingredient in recipe.ingredients]
-            base_ingredient_counts = [ingredient.count for ingredient in recipe.ingredients]
-
-            for ingredient_id in ingredient_list:
-                ingredient_data = self.item_data[ingredient_id]
-                ingredient_name = ingredient_data.name
-                icon = ingredient_data.icon.strip("icon.").lower()
-
-                if ingredient_id in base_ingredients:
-                    ingredient_count = base_ingredient_counts[
-                        base_ingredients.index(ingredient_id)
-                    ]
-                    style = "style = ''"
-                else:
-                    ingredient_count = 0
-                    style = "style='display:none'"
-
-                totals += f"\t<li {style} id='total_{ingredient_id}' ><img src='{img_path}/icons/{icon}.png' style='position:relative; top:10px;' class='img_border'><text class='item_count'>{ingredient_count}</text>x <a href='../item/{ingredient_id}.html'>{ingredient_name}</a>\n"
-            totals += "</ul>\n"
-
-            jquery = """
-<script src="https://ajax.googleapis.com/ajax/libs/jquery/2.1.1/jquery.min.js"></script>
-<script>
+        # Script expanding and collapsing ingredient recipes, shared by every recipe page:
+        script = """
   var totalUL = document.getElementById("totals");
   var totalLIs = totalUL.getElementsByTagName('li');
   var i, childNode, childNodes, findID, findLI, parentVal, childVal, totalVal, childID;
@@ -908,14 +1626,57 @@ class PageBuilder:
       contract(elem, ul)
     }
   };
-</script>
             """
+        script_url = self.write_asset(self.js_path, "recipe.js", script)
+        jquery = f"""
+<script src="https://ajax.googleapis.com/ajax/libs/jquery/2.1.1/jquery.min.js"></script>
+<script src="../{script_url}"></script>
+            """
+
+        for recipe in self.select(self.recipe_data, ids).values():
+            title = f"<title>{recipe.name}</title>"
+            info = f"<b>{recipe.name}</b> (level {recipe.level}, quantity {recipe.result.count}, sucess chance {recipe.chance}, MP {recipe.mp}"
+            ingredients, ingredient_list = self.create_ingredient_table(recipe)
+
+            table_0 = """
+            <td align="center" valign="top" bgcolor="#1E4863">
+            <img src="{0}/etc/blank.gif" height="8"><br>
+            <b class="txtbig"><a href='../item/{1}.html'>Recipe</a>:
+            <a href='../item/{2}.html'>{3}</a> ({4})</b><br><img src="{0}/etc/blank.gif" height="8"><br>
+            <table cellspacing='0' cellpadding='0' border='0' width='100%' class='txt'>\n<tbody>\n<tr>\n<td>
+            """.format(
+                img_path, recipe.id, recipe.result.id, recipe.result.name, recipe.chance
+            )
+            table_1 = "</td>\n<td valign='top'><h3>Totals:</h3>"
+            table_2 = "</td>\n</tr>\n</tbody>\n</table>"
+
+            totals = ["<ul id='totals'>\n"]
+            base_ingredients = [ingredient.id for ingredient in recipe.ingredients]
+            base_ingredient_counts = [ingredient.count for ingredient in recipe.ingredients]
+
+            for ingredient_id in ingredient_list:
+                ingredient_data = self.item_data[ingredient_id]
+                ingredient_name = ingredient_data.name
+                icon = ingredient_data.icon.strip("icon.").lower()
+
+                if ingredient_id in base_ingredients:
+                    ingredient_count = base_ingredient_counts[
+                        base_ingredients.index(ingredient_id)
+                    ]
+                    style = "style = ''"
+                else:
+                    ingredient_count = 0
+                    style = "style='display:none'"
+
+                totals.append(
+                    f"\t<li {style} id='total_{ingredient_id}' ><img src='{img_path}/icons/{icon}.png' style='position:relative; top:10px;' class='img_border'><text class='item_count'>{ingredient_count}</text>x <a href='../item/{ingredient_id}.html'>{ingredient_name}</a>\n"
+                )
+            totals.append("</ul>\n")
+            totals = "".join(totals)
+
 
             html = f"<html>\n{title}\n{css}\n{self.search}\n{'<br>'*4}\n{self.table_head.format(img_path)}\n{table_0}\n{ingredients}\n{table_1}\n{totals}\n{self.table_foot.format(img_path)}\n{table_2}\n{jquery}\n</html>"
-            with open(
-                os.path.join(self.site_path, self.recipe_path, f"{recipe.id}.html"), "w"
-            ) as f:
-                f.write(html)
+            self.write_page(self.recipe_path, f"{recipe.id}.html", html)
 
     def scrape_pmfun_images(self):
         for id, data in self.item_data.items():
@@ -934,6 +1695,21 @@ class PageBuilder:
             time.sleep(0.1)
 
 
+# PageBuilder used by this worker process, set once by init_worker when the worker starts:
+worker_builder = None
+
+
+def init_worker(page_builder):
+    global worker_builder
+    worker_builder = page_builder
+
+
+def render_pages(family, ids):
+    """Creates the pages of the given family (e.g. "npc") for the given ids in a worker"""
+    getattr(worker_builder, f"create_{family}_pages")(ids)
+    return len(ids)
+
+
 def icons_to_lower():
     dir = r"C:\git\l2reborn\create_drop_site\site\img\icons"
     os.chdir(dir)
@@ -965,15 +1741,62 @@ def format_probability(chance, n=4):
         return f"1 / {round(1/chance):,}"
 
 
+def npc_type(stats):
+    """Returns the type of an NPC from its stats, where NPCs without one are monsters"""
+    return stats.get("type", "Monster")
+
+
+def format_options(values):
+    """Formats the options of a select element from a list of (value, label) pairs"""
+    return "".join(f'<option value="{value}">{label}</option>' for value, label in values)
+
+
+def main(argv):
+    """Builds the site with the specified command line arguments
+
+    Parameters
+    ----------
+    argv : list
+        List of command line arguments to be parsed
+
+    """
+    usage = "Usage: create_site.py <--jobs=N | --no-cache | --full | --no-minify | --finalize | --dist=DIR>"
+    try:
+        opts, args = getopt.getopt(
+            argv, "h", ["jobs=", "no-cache", "full", "no-minify", "finalize", "dist=", "help"]
+        )
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+
+    jobs, cache, incremental, minify = 1, True, True, True
+    finalize, dist_path = False, None
+    for opt, arg in opts:
+        if opt == "--jobs":
+            try:
+                jobs = int(arg)
+            except ValueError:
+                print(usage)
+                sys.exit(2)
+        elif opt == "--no-cache":
+            cache = False
+        elif opt == "--full":
+            incremental = False
+        elif opt == "--no-minify":
+            minify = False
+        elif opt == "--finalize":
+            finalize = True
+        elif opt == "--dist":
+            finalize, dist_path = True, arg
+        elif opt in ["--help", "-h"]:
+            print(usage)
+            sys.exit(2)
+
+    pb = PageBuilder(jobs=jobs, cache=cache, incremental=incremental, minify=minify)
+    pb.build()
+    if finalize:
+        pb.finalize(dist_path)
+
+
 if __name__ == "__main__":
-    pb = PageBuilder()
-    print("Creating NPC pages")
-    pb.create_npc_pages()
-    print("Creating Item pages")
-    pb.create_item_pages()
-    print("Creating search page")
-    pb.create_search_page()
-    print("Creating loc pages")
-    pb.create_loc_pages()
-    print("Creating recipe pages")
-    pb.create_recipe_pages()
+    main(sys.argv[1:])
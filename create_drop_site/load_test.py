@@ -0,0 +1,130 @@
+import sys
+import json
+import time
+import random
+import getopt
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def fetch(url, headers=None):
+    """Requests url, returning (latency in seconds, HTTP status, X-Cache header)"""
+    request = urllib.request.Request(url, headers=headers or {})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request) as response:
+            response.read()
+            status, cache_status = response.status, response.headers.get("X-Cache")
+    except urllib.error.HTTPError as e:  # Includes 304 Not Modified
+        e.read()
+        status, cache_status = e.code, e.headers.get("X-Cache")
+    return time.perf_counter() - start, status, cache_status
+
+
+def percentile(values, p):
+    """Returns the p-th percentile of values (nearest rank)"""
+    values = sorted(values)
+    return values[max(0, -(-len(values) * p // 100) - 1)]
+
+
+def run_phase(name, urls, concurrency, headers=None):
+    """Requests every url in urls with concurrency threads, and prints statistics
+
+    Parameters
+    ----------
+    name : string
+        Name of the phase, shown in the results
+    urls : list
+        URLs to request
+    concurrency : int
+        Number of requests in flight at a time
+    headers : dict or callable
+        Request headers, or a function taking a URL and returning its headers
+
+    """
+    get_headers = headers if callable(headers) else lambda url: headers
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda url: fetch(url, get_headers(url)), urls))
+    elapsed = time.perf_counter() - start
+
+    latencies = [latency * 1000 for latency, _, _ in results]
+    statuses = sorted({status for _, status, _ in results})
+    hits = sum(cache_status == "HIT" for _, _, cache_status in results)
+    print(
+        f"{name:<12} {len(urls) / elapsed:8.1f} req/s   "
+        f"p50 {percentile(latencies, 50):7.2f} ms   p99 {percentile(latencies, 99):7.2f} ms   "
+        f"cache hits {hits}/{len(urls)}   status {','.join(str(s) for s in statuses)}"
+    )
+
+
+def main(argv):
+    """Load tests a running serve_site.py with the specified command line arguments
+    Requests a random sample of pages three times: rendering each page (uncached),
+    from the server's page cache (cached), and revalidating with the page's ETag
+
+    Parameters
+    ----------
+    argv : list
+        List of command line arguments to be parsed
+
+    """
+    usage = (
+        "Usage: load_test.py <--url=URL | --requests=N | --concurrency=N | --family=NAME | --seed=N>"
+    )
+    try:
+        opts, args = getopt.getopt(
+            argv, "h", ["url=", "requests=", "concurrency=", "family=", "seed=", "help"]
+        )
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+
+    url, n_requests, concurrency, families, seed = "http://127.0.0.1:8000", 500, 8, None, 0
+    for opt, arg in opts:
+        if opt == "--url":
+            url = arg.rstrip("/")
+        elif opt == "--family":
+            families = arg.split(",")
+        elif opt in ["--requests", "--concurrency", "--seed"]:
+            try:
+                value = int(arg)
+            except ValueError:
+                print(usage)
+                sys.exit(2)
+            if opt == "--requests":
+                n_requests = value
+            elif opt == "--concurrency":
+                concurrency = value
+            else:
+                seed = value
+        elif opt in ["--help", "-h"]:
+            print(usage)
+            sys.exit(2)
+
+    with urllib.request.urlopen(f"{url}/pages.json") as response:
+        page_ids = json.load(response)
+    pages = [
+        f"{url}/{family}/{id}.html"
+        for family, ids in page_ids.items()
+        if families is None or family in families
+        for id in ids
+    ]
+    urls = random.Random(seed).sample(pages, min(n_requests, len(pages)))
+    print(f"{len(urls)} of {len(pages)} pages, {concurrency} concurrent requests")
+
+    # Cache-Control: no-cache makes the server render each page, and caches the result:
+    run_phase("uncached", urls, concurrency, {"Cache-Control": "no-cache"})
+    run_phase("cached", urls, concurrency)
+
+    etags = {}
+    for page_url in urls:
+        request = urllib.request.Request(page_url, method="HEAD")
+        with urllib.request.urlopen(request) as response:
+            etags[page_url] = response.headers.get("ETag")
+    run_phase("revalidated", urls, concurrency, lambda url: {"If-None-Match": etags[url]})
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,186 @@
+import re
+import sys
+import json
+import time
+import getopt
+import threading
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+sys.path.append("..")
+import utils
+from create_site import PageBuilder
+
+# Paths of the pages rendered on request, e.g. /npc/20432.html:
+PAGE_REGEX = re.compile(r"^/(npc|item|loc|recipe)/(\d+)\.html$")
+
+
+class SiteServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, page_builder, page_cache, verbose=False):
+        """HTTP server rendering the pages of the site on request
+        Pages are rendered from the data parsed by page_builder, which stays in memory,
+        and kept in page_cache. Every other path (assets, the search page and its
+        index) is served from the site directory as a static file
+
+        Parameters
+        ----------
+        address : tuple
+            (host, port) to listen on
+        page_builder : PageBuilder
+            PageBuilder used to render pages
+        page_cache : utils.PageCache
+            Cache of rendered pages
+        verbose : bool
+            If enabled, every request is logged
+
+        """
+        self.page_builder = page_builder
+        self.page_cache = page_cache
+        self.verbose = verbose
+        self.page_ids = {family: set(ids) for family, ids in page_builder.page_ids().items()}
+        # Pages are rendered one at a time, since the PageBuilder isn't thread safe:
+        self.render_lock = threading.Lock()
+        super().__init__(address, SiteRequestHandler)
+
+
+class SiteRequestHandler(SimpleHTTPRequestHandler):
+    def __init__(self, request, client_address, server):
+        super().__init__(request, client_address, server, directory=server.page_builder.site_path)
+
+    def do_GET(self):
+        if not self.send_page():
+            super().do_GET()
+
+    def do_HEAD(self):
+        if not self.send_page(head=True):
+            super().do_HEAD()
+
+    def send_page(self, head=False):
+        """Sends a rendered page, if the request is for one
+
+        Parameters
+        ----------
+        head : bool
+            If enabled, only the headers are sent
+
+        Returns
+        -------
+        bool
+            False if the request isn't for a rendered page
+
+        """
+        path = self.path.split("?")[0].split("#")[0]
+        if path == "/pages.json":
+            ids = {family: sorted(ids) for family, ids in self.server.page_ids.items()}
+            self.send_body(json.dumps(ids).encode("utf8"), "application/json", head)
+            return True
+
+        match = PAGE_REGEX.match(path)
+        if match is None:
+            return False
+        family, id = match.group(1), int(match.group(2))
+        if id not in self.server.page_ids[family]:
+            self.send_error(404, "Page not found")
+            return True
+
+        # Requests with Cache-Control: no-cache always render the page again:
+        entry = None
+        if "no-cache" not in self.headers.get("Cache-Control", ""):
+            entry = self.server.page_cache.get(path)
+        cache_status = "HIT" if entry is not None else "MISS"
+        if entry is None:
+            with self.server.render_lock:
+                html = self.server.page_builder.render_page(family, id)
+            entry = self.server.page_cache.put(path, html)
+        body, etag = entry
+
+        if etag in [tag.strip() for tag in self.headers.get("If-None-Match", "").split(",")]:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("X-Cache", cache_status)
+            self.end_headers()
+            return True
+        self.send_body(body, "text/html; charset=utf-8", head, etag, cache_status)
+        return True
+
+    def send_body(self, body, content_type, head=False, etag=None, cache_status=None):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if etag is not None:
+            # Browsers revalidate on every use, and get a 304 while the page is unchanged:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        if cache_status is not None:
+            self.send_header("X-Cache", cache_status)
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def main(argv):
+    """Serves the site with the specified command line arguments
+
+    Parameters
+    ----------
+    argv : list
+        List of command line arguments to be parsed
+
+    """
+    usage = "Usage: serve_site.py <--host=HOST | --port=N | --cache-mb=N | --no-cache | --verbose>"
+    try:
+        opts, args = getopt.getopt(
+            argv, "hv", ["host=", "port=", "cache-mb=", "no-cache", "verbose", "help"]
+        )
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+
+    host, port, cache_mb, cache, verbose = "127.0.0.1", 8000, 64, True, False
+    for opt, arg in opts:
+        if opt == "--host":
+            host = arg
+        elif opt in ["--port", "--cache-mb"]:
+            try:
+                value = int(arg)
+            except ValueError:
+                print(usage)
+                sys.exit(2)
+            if opt == "--port":
+                port = value
+            else:
+                cache_mb = value
+        elif opt == "--no-cache":
+            cache = False
+        elif opt in ["--verbose", "-v"]:
+            verbose = True
+        elif opt in ["--help", "-h"]:
+            print(usage)
+            sys.exit(2)
+
+    start = time.time()
+    pb = PageBuilder(cache=cache)
+    pb.create_map_tiles()
+    pb.create_spawn_thumbnails()
+    pb.create_heatmap_page()
+    pb.create_hunting_page()
+    pb.create_search_page()
+    print(f"Loaded site data in {time.time() - start:.1f}s")
+
+    server = SiteServer((host, port), pb, utils.PageCache(cache_mb * 1024 * 1024), verbose)
+    print(f"Serving {pb.site_path} on http://{host}:{port}/search.html")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,24 +1,59 @@
+import os
 import getopt
 import numpy as np
 import sys
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 sys.path.append("..")
 import utils
 
+# Multipliers applied to the displayed NPC info: XP/SP, drop chance of items other than
+# adena (except for raid bosses), and drop chance and amount of adena
+RateProfile = namedtuple("RateProfile", ["name", "xp_sp", "drop", "adena_chance", "adena_amount"])
+
+RATE_PROFILES = {
+    "normal": RateProfile("normal", 1, 1, 1, 1),
+    "vip": RateProfile("vip", 1.5, 1, 1, 1.5),
+}
+
 
 class DataBuilder:
-    def __init__(self, info=True, drops=True, spoils=True, VIP=False):
+    def __init__(
+        self,
+        info=True,
+        drops=True,
+        spoils=True,
+        VIP=False,
+        jobs=1,
+        cache=True,
+        new_data_path="./new_dat_files",
+        profiles=None,
+        dedup=False,
+    ):
         self.original_data_path = "../server_data/dat_files"  # Path of clean dat files
-        self.new_data_path = "./new_dat_files"  # Output path of new data (with drop info)
+        self.new_data_path = new_data_path  # Output path of new data (with drop info)
 
         self.npcs_xml_dir = "../server_data/npcs"  # Directory containing NPC xml files
         self.items_xml_dir = "../server_data/items"  # Directory containing item xml files
+        self.jobs = jobs  # Number of worker processes used when parsing and encoding
+        # If enabled, parsed XMLs and decoded .dat files are cached per file, and only
+        # changed files are re-parsed:
+        self.cache = utils.ParseCache() if cache else None
 
         self.VIP = VIP  # If True, currency amount/xp/sp/drop rates are all scaled accordingly
-        self.VIP_xp_sp_rate = 1.5  # Experience and SP multiplier
-        self.VIP_drop_rate = 1  # 1.5  # Drop chance multipler increase for items
-        self.VIP_adena_rate = 1  # 1.1  # Drop chance increase multiplier for adena
-        self.VIP_adena_amount = 1.5  # Drop amount increase multiplier for adena
+        # If a list of RateProfiles is given, then one set of files is built for each, in
+        # the subdirectory of new_data_path named after the profile. Otherwise only the
+        # VIP or normal profile is built, directly into new_data_path:
+        self.profile_dirs = profiles is not None
+        if profiles is None:
+            profiles = [RATE_PROFILES["vip"] if VIP else RATE_PROFILES["normal"]]
+        self.profiles = profiles
+
+        # If enabled, NPCs whose drop (or spoil) lists read the same in every profile share
+        # a single skill level, rather than each having its own copy:
+        self.dedup = dedup
+        self.skill_levels = {}  # Maps info type -> NPC id -> shared skill level (see dedup)
 
         self.skill_include = {"Drop": drops, "Spoil": spoils, "Information": info}
         self.skill_ids = {"Drop": 20000, "Spoil": 20001, "Information": 20003}
@@ -35,21 +70,65 @@ class DataBuilder:
         Returns
         -------
         None
-            Outputs updated skillname-e.dat and skillgrp.dat to self.new_data_path
+            Outputs updated skillname-e.dat, skillgrp.dat and npcgrp.dat to the output
+            path of each profile
 
         """
         print("[] Parsing NPC .xml files")
         sys.stdout.flush()
         self.parse_npc_xmls()
-        print("[] Updating skillname-e.dat")
-        sys.stdout.flush()
-        self.modify_skill_name()
-        print("[] Updating skillgrp.dat")
-        sys.stdout.flush()
-        self.modify_skill_grp()
-        print("[] Updating npcgrp.dat")
+
+        if self.dedup:
+            print("[] Deduplicating drop/spoil skills")
+            sys.stdout.flush()
+            dedup_stats = self.dedup_skill_levels()
+
+        print("[] Decoding .dat files")
         sys.stdout.flush()
-        self.modify_npc_grp()
+        # Decode each file once up front, so every step (and profile) reuses the result:
+        for fname in ["skillname-e.dat", "skillgrp.dat", "npcgrp.dat"]:
+            utils.read_encrypted(self.original_data_path, fname, cache=self.cache)
+
+        # Only skillname-e.dat depends on the rates, so the others are built once and
+        # shared by every profile. Each .dat file is modified and encoded independently:
+        shared_paths = [self.output_path(profile) for profile in self.profiles]
+        steps = []
+        for profile in self.profiles:
+            steps.append(
+                (
+                    f"skillname-e.dat ({profile.name})",
+                    self.modify_skill_name,
+                    (profile,),
+                    [self.output_path(profile)],
+                )
+            )
+        steps.append(("skillgrp.dat", self.modify_skill_grp, (), shared_paths))
+        steps.append(("npcgrp.dat", self.modify_npc_grp, (), shared_paths))
+
+        if self.jobs <= 1:
+            for name, modify, args, paths in steps:
+                print(f"[] Updating {name}")
+                sys.stdout.flush()
+                write_dat(paths, *modify(*args))
+        else:
+            # Encoding takes most of the time, so the lines are modified here and only
+            # they are sent to the workers, which encode and write them:
+            with ProcessPoolExecutor(max_workers=min(self.jobs, len(steps))) as pool:
+                futures = {}
+                for name, modify, args, paths in steps:
+                    futures[pool.submit(write_dat, paths, *modify(*args))] = name
+                for future in as_completed(futures):
+                    future.result()  # Re-raises any exception from the worker
+                    print(f"[] Updated {futures[future]}")
+                    sys.stdout.flush()
+
+        if self.dedup:
+            n_skills, n_unique, n_chars = dedup_stats
+            print(
+                f"\n[] Deduplication reduced the drop/spoil skills from {n_skills:,} to "
+                f"{n_unique:,} ({1 - n_unique / max(n_skills, 1):.1%} fewer), removing "
+                f"{n_chars:,} characters of description from each skillname-e.dat"
+            )
         print("\n[] Build complete")
         sys.stdout.flush()
 
@@ -72,6 +151,106 @@ class DataBuilder:
         else:
             return f"1 / {round(1/chance):,}"
 
+    def drop_bodies(self, profile):
+        """Formats the drop and spoil skill description bodies of every NPC
+
+        Parameters
+        ----------
+        profile : RateProfile
+            Rates to scale the drop chances and adena amounts by
+
+        Returns
+        -------
+        dict
+            Dict mapping "Drop" and "Spoil" to a dict mapping NPC id to description body
+
+        """
+        # Multiply adena amount by profile.adena_amount and chance by profile.adena_chance,
+        # and the chance of other items by profile.drop (except for raid bosses), with
+        # all chances capped at 1:
+        drops, spoils = self.drop_table.drops, self.drop_table.spoils
+        adena = drops.names() == "Adena"
+        boss_ids = [
+            npc_id
+            for npc_id, npc in self.npc_data.items()
+            if npc["stats"]["type"] in ["RaidBoss", "GrandBoss"]
+        ]
+        boss = np.isin(drops["npc_id"], boss_ids)
+        drops = drops.scale(profile.adena_chance, profile.adena_amount, where=adena)
+        drops = drops.scale(profile.drop, where=~adena & ~boss)
+        return {"Drop": self.format_drops(drops), "Spoil": self.format_drops(spoils)}
+
+    def dedup_skill_levels(self):
+        """Finds the NPCs with identical drop (or spoil) lists across every profile, and
+        points them all at the skill level of the first such NPC, so that the shared
+        description is only stored once in skillname-e.dat and skillgrp.dat
+
+        Returns
+        -------
+        tuple
+            (n_skills, n_unique, n_chars) - the number of drop/spoil skills before and
+            after deduplication, and the number of description characters removed from
+            each profile's skillname-e.dat. Stores the shared levels in self.skill_levels
+
+        """
+        bodies = [self.drop_bodies(profile) for profile in self.profiles]
+
+        n_skills = n_unique = n_chars = 0
+        for info_type in ["Drop", "Spoil"]:
+            if not self.skill_include[info_type]:
+                continue
+            levels = self.skill_levels[info_type] = {}
+            shared = {}  # Maps the bodies of an NPC in every profile -> its skill level
+            for npc_id in bodies[0][info_type]:
+                key = tuple(profile_bodies[info_type][npc_id] for profile_bodies in bodies)
+                levels[npc_id] = shared.setdefault(key, npc_id)
+                if levels[npc_id] != npc_id:
+                    n_chars += len(key[0])
+            n_skills += len(levels)
+            n_unique += len(shared)
+
+        return n_skills, n_unique, n_chars
+
+    def skill_level(self, info_type, npc_id):
+        """Returns the level of the info_type skill describing the NPC npc_id, which is
+        the NPC id itself unless the skill is shared with another NPC (see dedup)"""
+        return self.skill_levels.get(info_type, {}).get(npc_id, npc_id)
+
+    def format_drops(self, table):
+        """Formats the drop list of each NPC in table as a skill description body,
+        with one line per item in order of decreasing drop rate
+
+        Parameters
+        ----------
+        table : DropTable
+            Table containing the drops (or spoils) to be formatted
+
+        Returns
+        -------
+        dict
+            Dict mapping NPC id to the formatted drop list of that NPC
+
+        """
+        table = table.sort_by_npc()
+
+        # Many rows share the same chance, so each distinct chance is only formatted once:
+        chances, chance_idx = np.unique(table["chance"], return_inverse=True)
+        chances = [self.format_probability(chance) for chance in chances.tolist()]
+
+        drop_lines = []
+        for name, item_min, item_max, idx in zip(
+            table.names(), table["min"].tolist(), table["max"].tolist(), chance_idx.tolist()
+        ):
+            # If item_min == item_max, then only show one:
+            item_amt = f"{item_min}-{item_max}" if item_min != item_max else f"{item_min}"
+            drop_lines.append(f"{name} [{item_amt}] {chances[idx]}\\n")
+
+        bodies = {}
+        npc_ids, order, bounds = table.group_by("npc_id")
+        for npc_id, start, end in zip(npc_ids.tolist(), bounds[:-1], bounds[1:]):
+            bodies[npc_id] = "".join(drop_lines[idx] for idx in order[start:end])
+        return bodies
+
     def parse_npc_xmls(self):
         """Parses the server XML files and creates a dict of NPC data
         including drops, spoils, stats, etc.
@@ -79,11 +258,13 @@ class DataBuilder:
         Returns
         -------
         None
-            Stores self.npc_data - a dict containing the information of each NPC
+            Stores self.npc_data - a dict containing the information of each NPC,
+            and self.drop_table - a DropTable containing every drop and spoil
 
         """
-        parser = utils.NpcParser()
-        self.npc_data = parser.parse()
+        parser = utils.NpcParser(cache=self.cache)
+        self.npc_data = parser.parse(jobs=self.jobs)
+        self.drop_table = parser.drop_table
 
     def modify_npc_grp(self):
         """Takes an unmodified npcgrp.dat and first increases the number of possible
@@ -95,8 +276,9 @@ class DataBuilder:
 
         Returns
         -------
-        None
-            Outputs updated npcdrp.dat to self.new_data_path
+        tuple
+            (fname, lines, fname_ddf) - the name of the file, its updated lines, and the
+            .ddf file to encode them with
 
         """
 
@@ -110,7 +292,7 @@ class DataBuilder:
         dtab_max = 32  # New max number of allowed skills = 16 (x2)
 
         # Decode and convert from .dat to .txt
-        lines = utils.read_encrypted(self.original_data_path, fname)
+        lines = utils.read_encrypted(self.original_data_path, fname, cache=self.cache)
 
         # Now modify each line to add the skill slots, and data where appropriate:
         for i, line in enumerate(lines):
@@ -142,16 +324,15 @@ class DataBuilder:
                 # field of information that we wish to add:
                 line[dtab_loc - 1] = str(n_skill + 2 * additional_skills)
 
-                for idx, skill_id in enumerate(self.skill_ids.values()):
+                for idx, (info_type, skill_id) in enumerate(self.skill_ids.items()):
                     loc = dtab_loc + n_skill + 2 * idx  # Select first empty skill index
-                    line[loc : loc + 2] = [str(skill_id), str(npc_id)]  # Insert skill and npc id
+                    level = self.skill_level(info_type, npc_id)  # Usually the npc id
+                    line[loc : loc + 2] = [str(skill_id), str(level)]  # Insert skill and level
 
             lines[i] = "\t".join(line)  # Now rejoin the list to form a tab-delimited string
 
         # Since we'll add new skills, we must write with a custom ddf file:
-        fname_ddf = fname.replace(".dat", "-custom.ddf")
-        # Now encrypt and write updated lines:
-        utils.write_encrypted(self.new_data_path, fname, lines, ddf=fname_ddf)
+        return fname, lines, fname.replace(".dat", "-custom.ddf")
 
     def modify_skill_grp(self):
         """Takes an unmodified skillgrp.dat and adds the skills which will store
@@ -159,8 +340,9 @@ class DataBuilder:
 
         Returns
         -------
-        None
-            Outputs updated skillgrp.dat to self.new_data_path
+        tuple
+            (fname, lines, fname_ddf) - the name of the file, its updated lines, and the
+            .ddf file to encode them with
 
         """
 
@@ -169,7 +351,7 @@ class DataBuilder:
         # Define the format each line takes:
         line_format = "{}\t{}\t2\t0\t-1\t0\t0.00000000\t0\t\t\t{}\t0\t0\t0\t0\t-1\t-1"
         # First decode and convert from .dat to .txt
-        lines = utils.read_encrypted(self.original_data_path, fname)
+        lines = utils.read_encrypted(self.original_data_path, fname, cache=self.cache)
 
         for npc_id, npc in self.npc_data.items():
             for info_type in self.skill_ids.keys():
@@ -184,6 +366,9 @@ class DataBuilder:
                     # Don't include spoil skill for NPCs with no drops
                     if "spoil" not in npc or len(npc["spoil"]) == 0:
                         continue
+                if self.skill_level(info_type, npc_id) != npc_id:
+                    # Skill level is shared with an earlier NPC, which already added it
+                    continue
                 # Add info to line_format and append to lines:
                 lines.append(
                     line_format.format(
@@ -191,17 +376,22 @@ class DataBuilder:
                     )
                 )
 
-        # Now encrypt and write updated lines:
-        utils.write_encrypted(self.new_data_path, fname, lines)
+        return fname, lines, fname.replace(".dat", ".ddf")
 
-    def modify_skill_name(self):
+    def modify_skill_name(self, profile):
         """Takes an unmodified skillname-e.dat and adds the skills which will store
         drop/spoil/other info about mobs
 
+        Parameters
+        ----------
+        profile : RateProfile
+            Rates to scale the displayed XP/SP, drop chances, and adena amounts by
+
         Returns
         -------
-        None
-            Outputs updated skillname-e.dat to self.new_data_path
+        tuple
+            (fname, lines, fname_ddf) - the name of the file, its updated lines, and the
+            .ddf file to encode them with
 
         """
 
@@ -211,7 +401,9 @@ class DataBuilder:
         tail = "\\0\ta,none\\0\ta,none\\0"  # Every line ends with this
 
         # First decode and convert from .dat to .txt
-        lines = utils.read_encrypted(self.original_data_path, fname)
+        lines = utils.read_encrypted(self.original_data_path, fname, cache=self.cache)
+
+        bodies = self.drop_bodies(profile)
 
         for npc_id, npc in self.npc_data.items():
             for info_type in self.skill_ids.keys():
@@ -223,81 +415,88 @@ class DataBuilder:
 
                 if info_type == "Information":
                     minfo = npc["stats"]
+                    exp, sp = minfo["exp"], minfo["sp"]
 
-                    if self.VIP is True:
-                        # If VIP, then multiply exp and sp by VIP_xp_sp_rate:
-                        minfo["exp"] = int(np.floor(eval(minfo["exp"]) * self.VIP_xp_sp_rate))
-                        minfo["sp"] = int(np.floor(eval(minfo["sp"]) * self.VIP_xp_sp_rate))
+                    if profile.xp_sp != 1:
+                        # Multiply exp and sp by the profile's rate (without modifying npc_data,
+                        # which is shared by every profile):
+                        exp = int(np.floor(eval(exp) * profile.xp_sp))
+                        sp = int(np.floor(eval(sp) * profile.xp_sp))
 
                     body = (
                         f"NPC ID: {npc_id}   "
                         f"Level: {minfo['level']}   "
                         f"Agro: {minfo['agro']}\\n"
-                        f"Exp: {minfo['exp']}   SP: {minfo['sp']}   HP: {minfo['hp']}   "
+                        f"Exp: {exp}   SP: {sp}   HP: {minfo['hp']}   "
                         f"MP: {minfo['mp']}\\nP. Atk: {minfo['patk']}   P. Def: {minfo['pdef']}   "
                         f"M. Atk: {minfo['matk']}   M. Def: {minfo['mdef']}\\n"
                     )
 
-                elif info_type == "Drop":
-                    if "drop" not in npc or len(npc["drop"]) == 0:
-                        # Don't include drop skill for NPCs with no drops
+                elif info_type in bodies:
+                    if npc_id not in bodies[info_type]:
+                        # Don't include drop/spoil skill for NPCs with no drops/spoils
                         continue
-                    npc_type = npc["stats"]["type"]
-                    # Here we create lists to store the info, and the drop chance:
-                    drop_lines, drop_lines_chance = [], []
-                    for drop in npc["drop"]:
-                        id, item_min, item_max, chance, name = drop  # Extract relevant info
-                        if self.VIP is True:
-                            # If VIP, then multiply accordingly:
-                            if name == "Adena":
-                                # If adena, then multiply amount by VIP_adena_amount:
-                                item_min *= self.VIP_adena_amount
-                                item_max *= self.VIP_adena_amount
-                                # And multiply chance by VIP_adena_rate:
-                                chance = min(chance * self.VIP_adena_rate, 1)
-                            elif npc_type not in ["RaidBoss", "GrandBoss"]:
-                                # If not adena or raid boss, then multiply chance by VIP_drop_rate (to a max of 1):
-                                chance = min(chance * self.VIP_drop_rate, 1)
-                            item_min, item_max = (round(item_min), round(item_max))  # Round to int
-
-                        item_amt = (  # If item_min == item_max, then only show one:
-                            f"{item_min}-{item_max}" if item_min != item_max else f"{item_min}"
-                        )
-                        drop_info = f"{name} [{item_amt}] {self.format_probability(chance)}\\n"
-                        drop_lines.append(drop_info)
-                        drop_lines_chance.append(chance)
-
-                    else:
-                        # Now we go through item by item and insert in order of decreasing drop rate:
-                        for idx in np.argsort(drop_lines_chance)[::-1]:
-                            body += drop_lines[idx]
-
-                elif info_type == "Spoil":
-                    if "spoil" not in npc or len(npc["spoil"]) == 0:
-                        # Don't include spoil skill for NPCs with no drops
+                    if self.skill_level(info_type, npc_id) != npc_id:
+                        # Skill level is shared with an earlier NPC, which already added it
                         continue
-                    # Here we create lists to store the info, and the spoil chance:
-                    spoil_lines, spoil_lines_chance = [], []
-                    for spoil in npc["spoil"]:
-                        id, item_min, item_max, chance, name = spoil  # Extract relevant info
-                        item_min, item_max = (round(item_min), round(item_max))  # Round to int
-                        item_amt = (  # If item_min == item_max, then only show one:
-                            f"{item_min}-{item_max}" if item_min != item_max else f"{item_min}"
-                        )
-                        spoil_info = f"{name} [{item_amt}] {self.format_probability(chance)}\\n"
-
-                        spoil_lines.append(spoil_info)
-                        spoil_lines_chance.append(chance)
-                    else:
-                        # Now we go through item by item and insert in order of decreasing drop rate:
-                        for idx in np.argsort(spoil_lines_chance)[::-1]:
-                            body += spoil_lines[idx]
+                    body = bodies[info_type][npc_id]
 
                 new_line = head + body + tail  # Combine the three parts to get the full line
                 lines.append(new_line)
 
-        # Now encrypt and write updated lines:
-        utils.write_encrypted(self.new_data_path, fname, lines)
+        return fname, lines, fname.replace(".dat", ".ddf")
+
+    def output_path(self, profile):
+        """Returns the path that the files built with the given RateProfile are output to"""
+        if self.profile_dirs:
+            return os.path.join(self.new_data_path, profile.name)
+        return self.new_data_path
+
+
+def write_dat(paths, fname, lines, fname_ddf):
+    """Encodes the lines of a .dat file and writes it to each of the given directories
+    This is a module-level function, so a worker process is only sent the lines
+
+    Parameters
+    ----------
+    paths : list
+        Paths of the directories to write the file to
+    fname : string
+        Name of the .dat file
+    lines : list
+        Decoded lines of the file
+    fname_ddf : string
+        Name of the .ddf file describing the format of the lines
+
+    """
+    raw = utils.encode_dat(lines, fname_ddf)
+    for path in paths:
+        utils.write_atomic(path, fname, raw)
+
+
+def parse_profile(spec):
+    """Parses a rate profile given on the command line
+
+    Parameters
+    ----------
+    spec : string
+        Either the name of a built-in profile in RATE_PROFILES, or a custom profile
+        in the format "name:xp_sp,drop,adena_chance,adena_amount"
+
+    Returns
+    -------
+    RateProfile
+        Rate profile described by spec
+
+    """
+    if spec in RATE_PROFILES:
+        return RATE_PROFILES[spec]
+
+    name, _, rates = spec.partition(":")
+    rates = rates.split(",")
+    if not name or len(rates) != 4:
+        raise ValueError(f"Invalid rate profile: {spec}")
+    return RateProfile(name, *(float(rate) for rate in rates))
 
 
 def main(argv):
@@ -309,14 +508,34 @@ def main(argv):
         List of command line arguments to be parsed
 
     """
-    usage = "Usage: create_skill_data.py <--no-info | --no-drops | --no-spoils | --vip >"
+    usage = (
+        "Usage: create_skill_data.py "
+        "<--no-info | --no-drops | --no-spoils | --vip | --profile=PROFILE | --dedup | "
+        "--jobs=N | --no-cache | --output=DIR >"
+    )
     try:
-        opts, args = getopt.getopt(argv, "h", ["no-info", "no-drops", "no-spoils", "vip", "help"])
+        opts, args = getopt.getopt(
+            argv,
+            "h",
+            [
+                "no-info",
+                "no-drops",
+                "no-spoils",
+                "vip",
+                "profile=",
+                "dedup",
+                "jobs=",
+                "no-cache",
+                "output=",
+                "help",
+            ],
+        )
     except getopt.GetoptError:
         print(usage)
         sys.exit(2)
 
-    info, drops, spoils, vip = True, True, True, False
+    info, drops, spoils, vip, jobs, cache = True, True, True, False, 1, True
+    output, profiles, dedup = "./new_dat_files", None, False
     for opt, arg in opts:
         if opt == "--no-info":
             info = False
@@ -326,12 +545,44 @@ def main(argv):
             spoils = False
         elif opt == "--vip":
             vip = True
+        elif opt == "--profile":
+            try:
+                profiles = (profiles or []) + [parse_profile(arg)]
+            except ValueError as e:
+                print(e)
+                print(usage)
+                sys.exit(2)
+        elif opt == "--dedup":
+            dedup = True
+        elif opt == "--jobs":
+            try:
+                jobs = int(arg)
+            except ValueError:
+                print(usage)
+                sys.exit(2)
+        elif opt == "--no-cache":
+            cache = False
+        elif opt == "--output":
+            output = arg
         elif opt in ["--help", "-h"]:
             print(usage)
             sys.exit(2)
 
-    print(f"[] Running with setup: info={info}, drops={drops}, spoils={spoils}, VIP={vip}")
-    builder = DataBuilder(info=info, drops=drops, spoils=spoils, VIP=vip)
+    setup = f"VIP={vip}" if profiles is None else f"profiles={[p.name for p in profiles]}"
+    print(
+        f"[] Running with setup: info={info}, drops={drops}, spoils={spoils}, {setup}, jobs={jobs}"
+    )
+    builder = DataBuilder(
+        info=info,
+        drops=drops,
+        spoils=spoils,
+        VIP=vip,
+        jobs=jobs,
+        cache=cache,
+        new_data_path=output,
+        profiles=profiles,
+        dedup=dedup,
+    )
     builder.build()
 
 
@@ -0,0 +1,107 @@
+import os
+import sys
+from collections import namedtuple
+import numpy as np
+import pytest
+
+root_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+sys.path.append(root_path)
+sys.path.append(os.path.join(root_path, "create_drop_site"))
+import utils
+
+cv2 = pytest.importorskip("cv2")
+pytest.importorskip("requests")  # Imported by create_site for scraping images
+import create_site
+
+# Data returned by ItemParser, NpcSqlParser and RecipeParser, which are not in this tree:
+Item = namedtuple("Item", ["name", "type", "crystal", "icon"])
+Ingredient = namedtuple("Ingredient", ["id", "name", "count"])
+Recipe = namedtuple("Recipe", ["id", "name", "level", "chance", "mp", "result", "ingredients"])
+
+
+class FixtureParser:
+    """Stands in for the parsers missing from this tree, returning the given data"""
+
+    def __init__(self, data):
+        self.data = data
+
+    def parse(self):
+        return self.data
+
+
+class EvalTemplate(utils.Template):
+    """Renders a template as the site builder did before utils.Template, by evaluating
+    its source as an f-string every time"""
+
+    def render(self, namespace):
+        return eval(f'f"""{self.source}"""', self.env, namespace)
+
+
+def fixture_data(n_npcs=6):
+    """Returns small item, NPC and recipe data, with the first NPCs of server_data that
+    have drops, spoils and spawns, and two recipes (one an ingredient of the other)"""
+    parser = utils.NpcParser()
+    spawn_data = utils.SpawnParser().parse()
+    npc_data = {}
+    for id, data in parser.parse().items():
+        if data["drop"] and data["spoil"] and id in spawn_data and len(npc_data) < n_npcs:
+            data["stats"].setdefault("herbs", "No")
+            npc_data[id] = data
+
+    drops = [drop for data in npc_data.values() for drop in data["drop"] + data["spoil"]]
+    item_ids = sorted({drop[0] for drop in drops})
+    item_data = {}
+    for id in item_ids:
+        item = parser.item_data[id]
+        item_data[id] = Item(item.name, item.type, item.crystal, f"icon.etc_item_{id}")
+
+    a, b, c, d = (
+        Ingredient(id, item_data[id].name, count) for count, id in enumerate(item_ids[:4], 1)
+    )
+    recipe_data = {
+        a.id: Recipe(a.id, f"Recipe: {b.name}", 1, "100%", 30, b, [c, d]),
+        c.id: Recipe(c.id, f"Recipe: {d.name}", 5, "70%", 60, d, [a]),
+    }
+    return item_data, npc_data, recipe_data
+
+
+@pytest.fixture(scope="module")
+def builder(tmp_path_factory):
+    """PageBuilder over the fixture data, writing to a temporary site directory"""
+    site_path = tmp_path_factory.mktemp("site")
+    os.makedirs(os.path.join(site_path, "img", "etc"))
+    world_map = np.zeros((175, 121, 3), dtype=np.uint8)
+    cv2.imwrite(os.path.join(site_path, "img", "etc", "world_map_interlude_big.png"), world_map)
+
+    item_data, npc_data, recipe_data = fixture_data()
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(utils, "ItemParser", lambda: FixtureParser(item_data), raising=False)
+        monkeypatch.setattr(
+            utils, "NpcSqlParser", lambda item_data: FixtureParser(npc_data), raising=False
+        )
+        monkeypatch.setattr(
+            utils, "RecipeParser", lambda item_data: FixtureParser(recipe_data), raising=False
+        )
+        yield create_site.PageBuilder(cache=False, minify=False, site_path=str(site_path))
+
+
+@pytest.mark.parametrize("family", ["npc", "item"])  # The pages rendered with templates
+def test_template_matches_eval(builder, family, monkeypatch):
+    """Pages rendered with utils.Template are identical to those rendered with eval"""
+    ids = builder.page_ids()[family]
+    assert len(ids) > 0
+    pages = {id: builder.render_page(family, id) for id in ids}
+
+    monkeypatch.setattr(utils, "Template", EvalTemplate)
+    builder.drop_tables = {}  # Rendered drop tables are reused by later NPC pages
+    for id in ids:
+        assert builder.render_page(family, id) == pages[id], f"{family} page {id} differs"
+
+
+def test_untyped_npcs_are_monsters(builder, monkeypatch):
+    """Heatmaps count NPCs without a type as monsters, as the hunting grounds page does"""
+    id = next(iter(builder.npc_data))
+    monkeypatch.delitem(builder.npc_data[id]["stats"], "type", raising=False)
+    assert create_site.npc_type(builder.npc_data[id]["stats"]) == "Monster"
+    start, end = builder.spawn_data.index[id]
+    assert builder.heatmap_filters()["monster_all_any"][start:end].all()
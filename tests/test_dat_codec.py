@@ -0,0 +1,35 @@
+import os
+import sys
+import glob
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+import utils
+from utils import dat_codec
+
+root_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+# Client .dat files in the tree, decoded with the Interlude .ddf file of the same name:
+dat_files = sorted(
+    glob.glob(os.path.join(root_path, "server_data", "dat_files", "*.dat"))
+    + glob.glob(os.path.join(root_path, "skill_drop_data", "new_dat_files", "*.dat"))
+)
+
+
+@pytest.mark.parametrize("fname", dat_files, ids=lambda fname: os.path.relpath(fname, root_path))
+def test_round_trip(fname):
+    """Decoding a .dat file and encoding the lines again gives back the same file"""
+    with open(fname, "rb") as f:
+        raw = f.read()
+    fname_ddf = os.path.basename(fname).replace(".dat", ".ddf")
+
+    lines = utils.decode_dat(raw, fname_ddf)
+    encoded = utils.encode_dat(lines, fname_ddf)
+    assert dat_codec.decrypt(encoded) == dat_codec.decrypt(raw)
+    assert encoded == raw
+
+
+@pytest.mark.parametrize("bits", [0x3C360B61, 0x00000001, 0x7F7FFFFF, 0x3DCCCCCD, 0x80000000])
+def test_float_round_trip(bits):
+    """Floats are written as text without losing any of their bits"""
+    text = dat_codec.format_value("FLOAT", bits)
+    assert dat_codec.pack_value("FLOAT", text) == bits.to_bytes(4, "little")
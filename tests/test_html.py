@@ -0,0 +1,21 @@
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+from utils.html import minify_html
+
+
+def test_minify():
+    html = "<div>\n    <p>Text</p>  \n\n    <pre>\n  code\n</pre>\n</div>\n\n"
+    assert minify_html(html) == "<div>\n<p>Text</p>\n<pre>\n  code\n</pre>\n</div>\n"
+
+
+def test_attribute_line_breaks():
+    """Line breaks and indentation in attribute values are kept, even next to "<" or ">" """
+    tags = [
+        '<img title="Skill\n    Level 2">',
+        '<img title="P. Atk. > 100\n    M. Atk. < 50" alt=\'a > b\n  c\'>',
+        "<a\n    href=\"#\"\n    title='<b>\n  bold</b>'>",
+    ]
+    for tag in tags:
+        assert minify_html(f"<td>\n    {tag}\n</td>") == f"<td>\n{tag}\n</td>\n"
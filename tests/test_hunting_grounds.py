@@ -0,0 +1,83 @@
+import os
+import sys
+from collections import Counter
+import numpy as np
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+import utils
+from utils.spawn_table import SPAWN_DTYPE
+
+BOUNDS = (-40000, 40000, -30000, 50000)
+BANDS = [(1, 20), (15, 40), (41, 80), (90, 99)]
+
+
+@pytest.fixture(scope="module")
+def data():
+    """Random spawn points of 60 NPCs (some without stats), and the NPCs' stats"""
+    rng = np.random.default_rng(0)
+    n = 3000
+    rows = np.zeros(n, dtype=SPAWN_DTYPE)
+    rows["npc_id"] = rng.integers(20000, 20060, n)
+    rows["x"] = rng.integers(-45000, 45000, n)  # Some points are outside BOUNDS
+    rows["y"] = rng.integers(-35000, 55000, n)
+    rows["respawn_delay"] = rng.choice([0, 5, 30, 60, 600], n)
+    npc_stats = {
+        id: {
+            "level": int(rng.integers(1, 81)),
+            "exp": float(rng.uniform(10, 1e4)),
+            "sp": float(rng.uniform(1, 1e3)),
+            "hp": float(rng.uniform(50, 1e4)),
+        }
+        for id in range(20000, 20055)
+    }
+    return utils.SpawnTable(rows), npc_stats
+
+
+def brute_force(spawn_table, npc_stats, grid, band, min_respawn=10, target_kills=120):
+    """Scores each cell of the grid for a level band, one spawn point at a time"""
+    cells = {}
+    for row in spawn_table.rows:
+        stats = npc_stats.get(int(row["npc_id"]))
+        if stats is None or not band[0] <= stats["level"] <= band[1]:
+            continue
+        cell = int(grid.cells(row["x"], row["y"]))
+        totals = cells.setdefault(cell, {"exp": 0, "hp": 0, "kills_per_hour": 0, "npcs": Counter()})
+        kills_per_hour = 3600 / max(int(row["respawn_delay"]), min_respawn)
+        totals["exp"] += stats["exp"]
+        totals["hp"] += stats["hp"]
+        totals["kills_per_hour"] += kills_per_hour
+        totals["npcs"][int(row["npc_id"])] += 1
+    for totals in cells.values():
+        totals["exp_per_hp"] = totals["exp"] / totals["hp"]
+        supply = min(totals["kills_per_hour"] / target_kills, 1)
+        totals["score"] = totals["exp_per_hp"] * supply
+    return cells
+
+
+def test_rank(data):
+    spawn_table, npc_stats = data
+    g = utils.HuntingGrounds(spawn_table, BOUNDS, npc_stats)
+    ranking = g.rank(BANDS, n=10)
+    assert len(ranking) == len(BANDS)
+
+    for band, spots in zip(BANDS, ranking):
+        cells = brute_force(spawn_table, npc_stats, g.grid, band)
+        best = sorted(cells, key=lambda cell: -cells[cell]["score"])[:10]
+        assert len(spots) == len(best)
+        for cell, spot in zip(best, spots):
+            expected = cells[cell]
+            assert (spot["x_min"], spot["y_min"], spot["x_max"], spot["y_max"]) == tuple(
+                g.grid.cell_bounds(cell)
+            )
+            for key in ["exp", "hp", "kills_per_hour", "exp_per_hp", "score"]:
+                assert spot[key] == pytest.approx(expected[key])
+            assert dict(spot["npcs"]) == expected["npcs"]
+            counts = [count for _, count in spot["npcs"]]
+            assert counts == sorted(counts, reverse=True)
+
+
+def test_rank_empty_band(data):
+    """Bands without NPCs have no grounds"""
+    spawn_table, npc_stats = data
+    assert utils.HuntingGrounds(spawn_table, BOUNDS, npc_stats).rank([(90, 99)]) == [[]]
@@ -0,0 +1,106 @@
+import os
+import sys
+import warnings
+import pytest
+from bs4 import BeautifulSoup
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+import utils
+
+server_data_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "server_data")
+item_dir = os.path.join(server_data_path, "items")
+npc_dir = os.path.join(server_data_path, "npcs")
+
+
+def parse_items_soup(item_dir):
+    """Parses the item XMLs as NpcParser did with BeautifulSoup, before it used iterparse"""
+    item_data = {}
+    for file in os.listdir(item_dir):
+        if not file.endswith(".xml"):
+            continue
+        with open(os.path.join(item_dir, file), "r") as f:
+            soup = BeautifulSoup(f.read(), features="html.parser")
+
+        for item in soup.find_all("item"):
+            try:
+                crystal_count = int(item.find("set", {"name": "crystal_count"})["val"])
+                crystal_type = item.find("set", {"name": "crystal_type"})["val"]
+            except (TypeError, KeyError, ValueError):
+                crystal_count = crystal_type = None
+            crystal = utils.parse_npc_xml.Crystal(crystal_count, crystal_type)
+            item_data[eval(item["id"])] = utils.parse_npc_xml.Item(
+                item["name"], item["type"], crystal
+            )
+    return item_data
+
+
+def parse_npcs_soup(npc_dir, item_data, stat_names):
+    """Parses the NPC XMLs as NpcParser did with BeautifulSoup, before it used iterparse"""
+    npc_data = {}
+    for file in os.listdir(npc_dir):
+        if not file.endswith(".xml"):
+            continue
+        with open(os.path.join(npc_dir, file), "r") as f:
+            soup = BeautifulSoup(f.read(), features="html.parser")
+
+        for npc in soup.find_all("npc"):
+            npc_id = eval(npc["id"])
+            data = {"name": npc["name"], "title": npc["title"], "file": file}
+            data["drop"], data["spoil"] = [], []
+
+            stats = {}
+            for stat in npc.find_all("set"):
+                stat_name = stat["name"].lower()
+                if stat_name in stat_names:
+                    try:  # If stat is numerical, then round:
+                        stats[stat_name] = str(round(eval(stat["val"])))
+                    except NameError:
+                        stats[stat_name] = stat["val"]
+                elif stat_name == "dropherbgroup":
+                    stats["herbs"] = "Yes" if stat["val"] != "0" else "No"
+            ai = npc.find("ai")
+            stats["agro"] = "Yes" if ai.has_attr("aggro") and ai["aggro"] != "0" else "No"
+            data["stats"] = stats
+
+            data["skills"] = [
+                utils.parse_npc_xml.Skill(int(skill["id"]), int(skill["level"]))
+                for skill in npc.find("skills").find_all("skill")
+            ]
+
+            drop_list = npc.find("drops")
+            for category in [] if drop_list is None else drop_list.find_all("category"):
+                for drop in category.find_all("drop"):
+                    id = eval(drop["itemid"])
+                    row = [id, eval(drop["min"]), eval(drop["max"]), eval(drop["chance"]) / 1e6]
+                    row.append(item_data[id].name)
+                    # Category -1 holds the spoils:
+                    data["drop" if eval(category["id"]) != -1 else "spoil"].append(row)
+            npc_data[npc_id] = data
+    return npc_data
+
+
+@pytest.fixture(scope="module")
+def parsed():
+    """Parses server_data with NpcParser, and with the BeautifulSoup reference"""
+    parser = utils.NpcParser()  # Reads server_data by default
+    npc_data = parser.parse()
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")  # XMLParsedAsHTMLWarning
+        soup_item_data = parse_items_soup(item_dir)
+        soup_npc_data = parse_npcs_soup(npc_dir, soup_item_data, parser.stats)
+    return parser.item_data, npc_data, soup_item_data, soup_npc_data
+
+
+def test_items_match_soup(parsed):
+    item_data, _, soup_item_data, _ = parsed
+    assert len(item_data) > 0
+    assert item_data == soup_item_data
+
+
+def test_npcs_match_soup(parsed):
+    _, npc_data, _, soup_npc_data = parsed
+    assert len(npc_data) > 0
+    assert npc_data.keys() == soup_npc_data.keys()
+    for npc_id, data in soup_npc_data.items():
+        assert npc_data[npc_id] == data, f"NPC {npc_id} differs"
@@ -0,0 +1,31 @@
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+import utils
+from utils.search_index import tokenize
+
+
+def test_tokenize():
+    assert tokenize("Queen's Ant") == ["queen", "s", "ant"]
+    assert tokenize("Orc_Archer (Lv. 20)") == ["orc", "archer", "lv", "20"]
+    # Letters of any script are kept, so names without ASCII letters can be found:
+    assert tokenize("Элмор Страж") == ["элмор", "страж"]
+    assert tokenize("騎士の剣") == ["騎士の剣"]
+
+
+def test_shards():
+    index = utils.SearchIndex(prefix_len=2)
+    index.add("item", 57, "Adena", ("etc_adena_i00",))
+    index.add("npc", 29001, "Queen Ant", (40, 1))
+    index.add("npc", 30001, "Страж", (20, 0))
+    shards = index.shards()
+
+    # Each token is stored under each of its prefixes, up to prefix_len characters:
+    for path in ["a.json", "ad.json"]:
+        assert shards[path]["item"]["tokens"] == {"adena": [57]}
+        assert shards[path]["item"]["data"] == {57: ("Adena", "etc_adena_i00")}
+    assert shards["an.json"]["npc"]["tokens"] == {"ant": [29001]}
+    assert shards["ст.json"]["npc"]["tokens"] == {"страж": [30001]}
+    assert shards["id/29.json"]["npc"]["data"] == {29001: ("Queen Ant", 40, 1)}
+    assert "de.json" not in shards  # Only prefixes are indexed, not every substring
@@ -0,0 +1,67 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+import utils
+from utils.spawn_table import SPAWN_DTYPE
+
+BOUNDS = (-20000, 20000, -10000, 30000)
+
+
+def random_table(n, seed=0):
+    """SpawnTable of n random points, some outside BOUNDS and some sharing coordinates"""
+    rng = np.random.default_rng(seed)
+    rows = np.zeros(n, dtype=SPAWN_DTYPE)
+    rows["npc_id"] = rng.integers(20000, 20050, n)
+    rows["x"] = rng.integers(-25000, 25000, n)
+    rows["y"] = rng.integers(-15000, 35000, n)
+    rows["x"][: n // 10] = rows["x"][n // 10 : 2 * (n // 10)]  # Duplicate points
+    rows["y"][: n // 10] = rows["y"][n // 10 : 2 * (n // 10)]
+    return utils.SpawnTable(rows)
+
+
+@pytest.fixture(scope="module", params=[None, BOUNDS], ids=["extent", "bounds"])
+def index(request):
+    return utils.SpawnIndex(random_table(5000), request.param, cell_size=2048)
+
+
+def queries(n=200, seed=1):
+    rng = np.random.default_rng(seed)
+    return zip(rng.integers(-30000, 30000, n), rng.integers(-20000, 40000, n))
+
+
+def test_box(index):
+    x, y = index.spawn_table["x"], index.spawn_table["y"]
+    rng = np.random.default_rng(2)
+    for x_min, y_min in queries():
+        x_max, y_max = x_min + rng.integers(-100, 20000), y_min + rng.integers(-100, 20000)
+        expected = np.flatnonzero((x >= x_min) & (x <= x_max) & (y >= y_min) & (y <= y_max))
+        assert np.array_equal(np.sort(index.box(x_min, y_min, x_max, y_max)), expected)
+
+
+def test_radius(index):
+    x, y = index.spawn_table["x"].astype(np.int64), index.spawn_table["y"].astype(np.int64)
+    for (qx, qy), r in zip(queries(), [0, 1, 500, 2048, 3000.5, 15000, 60000] * 30):
+        expected = np.flatnonzero((x - qx) ** 2 + (y - qy) ** 2 <= r * r)
+        assert np.array_equal(np.sort(index.radius(qx, qy, r)), expected)
+
+
+def test_nearest(index):
+    x, y = index.spawn_table["x"].astype(np.int64), index.spawn_table["y"].astype(np.int64)
+    for (qx, qy), n in zip(queries(), [0, 1, 2, 10, 100, 6000] * 40):
+        dist = np.sqrt((x - qx) ** 2 + (y - qy) ** 2)
+        rows, distances = index.nearest(qx, qy, n)
+        # Points at equal distances may be returned in any order:
+        assert np.array_equal(distances, np.sort(dist)[: min(n, len(dist))])
+        assert np.array_equal(dist[rows], distances)
+        assert len(np.unique(rows)) == len(rows)
+
+
+def test_empty():
+    index = utils.SpawnIndex(utils.SpawnTable())
+    assert len(index.box(-100, -100, 100, 100)) == 0
+    assert len(index.radius(0, 0, 1000)) == 0
+    rows, distances = index.nearest(0, 0, 5)
+    assert len(rows) == 0 and len(distances) == 0
@@ -0,0 +1,65 @@
+import io
+import os
+import sys
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+from utils.sql_reader import iter_inserts
+
+SQL = """-- Dump of `spawnlist`
+/* Multi-line comment;
+   with a semicolon */
+CREATE TABLE `spawnlist` (`id` int, `name` varchar(20), `x` double);
+# MySQL comment
+INSERT INTO `spawnlist` (`id`, `name`, `x`) VALUES (1, 'it''s', -1.5e3),
+  (2, 'a\\'b; c', NULL), (3, 'x''''y', 42);
+REPLACE spawnlist VALUES (4, '', TRUE)
+"""
+ROWS = [
+    ("spawnlist", ["id", "name", "x"], (1, "it's", -1500.0)),
+    ("spawnlist", ["id", "name", "x"], (2, "a'b; c", None)),
+    ("spawnlist", ["id", "name", "x"], (3, "x''y", 42)),
+    ("spawnlist", None, (4, "", 1)),
+]
+
+
+class ShortReads(io.StringIO):
+    """Text file whose reads return at most n characters, so the SQL is read in chunks
+    of n characters whatever chunk size the reader asks for"""
+
+    def __init__(self, text, n):
+        super().__init__(text)
+        self.n = n
+
+    def read(self, size=-1):
+        return super().read(self.n if size < 0 else min(size, self.n))
+
+
+def test_rows():
+    assert list(iter_inserts(io.StringIO(SQL))) == ROWS
+
+
+@pytest.mark.parametrize("n", range(1, len(SQL) + 1))
+def test_chunk_boundaries(n):
+    """Rows are the same wherever the chunks split tokens, e.g. inside 'it''s'"""
+    assert list(iter_inserts(ShortReads(SQL, n))) == ROWS
+
+
+def test_last_statement_without_semicolon():
+    sql = "INSERT INTO t VALUES (1, 'a'), (2, 'b')"
+    assert list(iter_inserts(io.StringIO(sql))) == [("t", None, (1, "a")), ("t", None, (2, "b"))]
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        "INSERT INTO",
+        "INSERT INTO t",
+        "INSERT INTO t (a, b",
+        "INSERT INTO t (a, b) VALUES (1, 2",
+        "INSERT INTO t (a, b) VALUES (1, 'it''s",
+    ],
+)
+def test_truncated(sql):
+    with pytest.raises(ValueError):
+        list(iter_inserts(io.StringIO(sql)))
@@ -1,8 +1,31 @@
 from .utils import read_encrypted
 from .utils import write_encrypted
+from .utils import write_atomic
+from .utils import decode_dat
+from .utils import encode_dat
 from .utils import round_chance
 from .utils import round_sf
 from .parse_npc_xml import NpcParser
 from .parse_skills_dat import SkillParser
 from .parse_npc_spawn import SpawnParser
-from .parse_l2off import L2OffParser
+try:
+    from .parse_l2off import L2OffParser  # Not part of this repository
+except ImportError:
+    L2OffParser = None
+from .parse_cache import ParseCache
+from .drop_table import DropTable
+from .spawn_table import SpawnTable
+from .world_grid import WorldGrid
+from .spawn_index import SpawnIndex
+from .template import Template
+from .site_manifest import SiteManifest
+from .site_manifest import fingerprint
+from .search_index import SearchIndex
+from .html import minify_html
+from .site_finalizer import SiteFinalizer
+from .page_cache import PageCache
+from .map_tiles import TilePyramid
+from .grid_clusters import grid_clusters
+from .map_thumbnails import MapThumbnails
+from .spawn_heatmap import SpawnHeatmaps
+from .hunting_grounds import HuntingGrounds
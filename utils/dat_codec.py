@@ -0,0 +1,524 @@
+import re
+import math
+import zlib
+import struct
+import binascii
+from collections import namedtuple
+
+# Lineage2Ver413 files as written by l2encdec: RSA blocks over a zlib stream.
+# The modulus and exponents are l2encdec's default "new" key pair, which the
+# L2Reborn client is patched to accept (see l2encdec's USAGE file).
+HEADER_413 = "Lineage2Ver413".encode("utf-16le")
+RSA_MODULUS = int(
+    "75b4d6de5c016544068a1acf125869f43d2e09fc55b8b1e289556daf9b8757635593446288b3653da1ce91c8"
+    "7bb1a5c18f16323495c55d7d72c0890a83f69bfd1fd9434eb1c02f3e4679edfa43309319070129c267c85604"
+    "d87bb65bae205de3707af1d2108881abb567c3b3d069ae67c3a4c6a3aa93d26413d4c66094ae2039",
+    16,
+)
+RSA_PUBLIC_EXPONENT = 0x1D
+RSA_PRIVATE_EXPONENT = int(
+    "30b4c2d798d47086145c75063c8e841e719776e400291d7838d3e6c4405b504c6a07f8fca27f32b86643d264"
+    "9d1d5f124cdd0bf272f0909dd7352fe10a77b34d831043d9ae541f8263c6fe3d1c14c2f04e43a7253a6dda9a"
+    "8c1562cbd493c1b631a1957618ad5dfe5ca28553f746e2fc6f2db816c7db223ec91e955081c1de65",
+    16,
+)
+# Prime factors of RSA_MODULUS, used to encrypt via the Chinese remainder theorem:
+RSA_P = int(
+    "4ea6381bf6b04f88685885e7ec27e05fe1df5a0d5ec2b88138722503950bd65c2a5702374ab1e123f64e93b0"
+    "c76940cef21d2ee480838e8b5590ac50f1db005f",
+    16,
+)
+RSA_Q = RSA_MODULUS // RSA_P
+
+BLOCK_SIZE = 128  # Size of each RSA block
+BLOCK_DATA = 124  # Maximum number of payload bytes in each block
+TAIL_SIZE = 20  # Size of the footer holding the CRC32 of the file
+ZLIB_CHUNK = 1 << 20  # l2encdec compresses in 1 MiB chunks, sync flushing after each one
+SAFE_PACKAGE = b"\x0cSafePackage\x00"  # Marker l2asm writes at the end of decoded files
+
+DdfField = namedtuple("DdfField", ["type", "name", "count", "props"])
+
+INT_TYPES = {
+    "UINT": "<I",
+    "INT": "<i",
+    "HEX": "<I",
+    "UWORD": "<H",
+    "WORD": "<h",
+    "UCHAR": "<B",
+    "CHAR": "<b",
+    "CHEX": "<B",
+}
+FIELD_TYPES = set(INT_TYPES) | {"FLOAT", "UNICODE", "ASCF", "CNTR", "FILLER"}
+
+
+def decrypt(raw):
+    """Decrypts the contents of an encrypted Lineage2Ver413 .dat file
+    Equivalent to `l2encdec -s`
+
+    Parameters
+    ----------
+    raw : bytes
+        Contents of the encrypted .dat file
+
+    Returns
+    -------
+    bytes
+        Decrypted and decompressed contents
+
+    """
+    if raw[: len(HEADER_413)] != HEADER_413:
+        raise ValueError("Input is not a Lineage2Ver413 encrypted file")
+
+    body = raw[len(HEADER_413) : -TAIL_SIZE]
+    if len(body) % BLOCK_SIZE != 0:
+        raise ValueError("Encrypted file has a truncated block")
+
+    compressed = bytearray()
+    for i in range(0, len(body), BLOCK_SIZE):
+        block = int.from_bytes(body[i : i + BLOCK_SIZE], "big")
+        block = pow(block, RSA_PUBLIC_EXPONENT, RSA_MODULUS).to_bytes(BLOCK_SIZE, "big")
+        size = block[3]
+        start = block_start(size)
+        compressed += block[start : start + size]
+
+    size = int.from_bytes(compressed[:4], "little")
+    data = zlib.decompress(bytes(compressed[4:]))
+    if len(data) != size:
+        raise ValueError("Decrypted file size does not match its header")
+    return data
+
+
+def encrypt(data):
+    """Compresses and encrypts data as a Lineage2Ver413 .dat file
+    Produces the same bytes as `l2encdec -h 413`
+
+    Parameters
+    ----------
+    data : bytes
+        Decrypted contents, as produced by assemble
+
+    Returns
+    -------
+    bytes
+        Contents of the encrypted .dat file
+
+    """
+    compressor = zlib.compressobj(6)
+    compressed = bytearray(len(data).to_bytes(4, "little"))
+    for i in range(0, len(data), ZLIB_CHUNK):
+        compressed += compressor.compress(data[i : i + ZLIB_CHUNK])
+        compressed += compressor.flush(zlib.Z_SYNC_FLUSH)
+    compressed += compressor.flush()
+
+    d_p = RSA_PRIVATE_EXPONENT % (RSA_P - 1)
+    d_q = RSA_PRIVATE_EXPONENT % (RSA_Q - 1)
+    q_inv = pow(RSA_Q, -1, RSA_P)
+
+    out = bytearray(HEADER_413)
+    for i in range(0, len(compressed), BLOCK_DATA):
+        chunk = compressed[i : i + BLOCK_DATA]
+        block = bytearray(BLOCK_SIZE)
+        block[3] = len(chunk)
+        start = block_start(len(chunk))
+        block[start : start + len(chunk)] = chunk
+
+        # RSA with the private exponent, split over the two prime factors:
+        m = int.from_bytes(block, "big")
+        m_p, m_q = pow(m, d_p, RSA_P), pow(m, d_q, RSA_Q)
+        c = m_q + ((q_inv * (m_p - m_q)) % RSA_P) * RSA_Q
+        out += c.to_bytes(BLOCK_SIZE, "big")
+
+    out += bytes(12) + binascii.crc32(out).to_bytes(4, "little") + bytes(4)
+    return bytes(out)
+
+
+def block_start(size):
+    """Offset of the payload in a decrypted block holding size bytes (right aligned to 4)"""
+    return BLOCK_SIZE - size - ((BLOCK_DATA - size) % 4)
+
+
+def parse_ddf(text):
+    """Parses the contents of a .ddf dat definition file (see l2asm-disasm's MANUAL)
+    Only the field types and properties used by the Interlude npcgrp, skillgrp,
+    skillname-e and systemmsg-e definitions are supported
+
+    Parameters
+    ----------
+    text : string
+        Contents of the .ddf file
+
+    Returns
+    -------
+    dict
+        Dict of the control variables (FS, HEADER, RECCNT, MAGIC, ...)
+    list
+        List of DdfField, in file order
+
+    """
+    text = re.sub(r"/\*.*?\*/", "", text, flags=re.S)  # Strip C comments
+    text = re.sub(r"(//|#).*", "", text)  # Strip C++ and shell comments
+
+    head, body = text.split("{", 1)
+    body = body.rsplit("}", 1)[0]
+
+    controls = {"HEADER": 1, "RECCNT": -1, "MAGIC": 0}
+    for statement in head.split(";"):
+        if "=" in statement:
+            key, val = (s.strip() for s in statement.split("=", 1))
+            controls[key] = ddf_literal(val)
+
+    fields = []
+    for statement in body.split(";"):
+        statement = statement.strip()
+        if not statement:
+            continue
+
+        if "=" in statement:
+            # Property of the previous field, e.g. SOFT = 32 or ENBBY = [(a,1)]
+            key, val = (s.strip() for s in statement.split("=", 1))
+            props = fields[-1].props
+            if key == "ENBBY":
+                props.setdefault("ENBBY", []).append(parse_enbby(val))
+            elif key in ("SOFT", "ORD"):
+                props[key] = ddf_literal(val)
+            else:
+                raise ValueError(f"Unsupported ddf property: {key}")
+            continue
+
+        match = re.fullmatch(r"(\w+)\s+([^\s\[\]{}]+)\s*(?:\[\s*(\w+)\s*\]|\{\s*(\d+)\s*\})?", statement)
+        if match is None or match.group(1) not in FIELD_TYPES:
+            raise ValueError(f"Unsupported ddf field: {statement}")
+
+        field_type, name, count, filler = match.groups()
+        if filler is not None:
+            count = int(filler)
+        elif count is not None and count.isdigit():
+            count = int(count)
+        fields.append(DdfField(field_type, name, count, {}))
+
+    return controls, fields
+
+
+def ddf_literal(val):
+    val = val.strip()
+    literals = {"NO": 0, "YES": 1, "OFF": -1}
+    if val in literals:
+        return literals[val]
+    if val.startswith('"'):
+        return val.strip('"').replace("\\t", "\t")
+    return int(val)
+
+
+def parse_enbby(val):
+    """Parses an ENBBY condition such as [(val_enb:2,2),(val1,3)] into a list of
+    (field name, mask, value) tuples, all of which must hold"""
+    conditions = []
+    for ref, value in re.findall(r"\(\s*([^,()]+?)\s*,\s*(-?\d+)\s*\)", val):
+        name, _, mask = ref.partition(":")
+        conditions.append((name.strip(), int(mask) if mask else None, int(value)))
+    return conditions
+
+
+def is_enabled(field, values):
+    """Checks whether field is enabled by its ENBBY conditions (ORed across properties)"""
+    if "ENBBY" not in field.props:
+        return True
+
+    for conditions in field.props["ENBBY"]:
+        for name, mask, value in conditions:
+            ref = values[name]
+            ref = ref[0] if isinstance(ref, list) else ref
+            if (ref & mask if mask is not None else ref) != value:
+                break
+        else:
+            return True
+    return False
+
+
+def read_cntr(data, pos):
+    """Reads a packed CNTR counter, returning the value and the new position"""
+    byte = data[pos]
+    pos += 1
+    negative = byte & 0x80
+    value = byte & 0x3F
+    shift = 6
+    more = byte & 0x40
+    while more:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        more = byte & 0x80
+    return (-value if negative else value), pos
+
+
+def write_cntr(value):
+    """Packs value as a CNTR counter"""
+    negative = value < 0
+    value = abs(value)
+    out = bytearray([(0x80 if negative else 0) | (value & 0x3F)])
+    value >>= 6
+    if value:
+        out[0] |= 0x40
+    while value:
+        byte = value & 0x7F
+        value >>= 7
+        out.append(byte | (0x80 if value else 0))
+    return bytes(out)
+
+
+def escape(string):
+    return (
+        string.replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\0", "\\0")
+        .replace("\r", "\\r")
+        .replace("\n", "\\n")
+    )
+
+
+ESCAPES = {"t": "\t", "0": "\0", "r": "\r", "n": "\n"}
+
+
+def unescape(string):
+    if "\\" not in string:
+        return string
+    return re.sub(r"\\(.)", lambda m: ESCAPES.get(m.group(1), m.group(1)), string, flags=re.S)
+
+
+def read_value(field_type, data, pos):
+    """Reads a single value of field_type, returning the value and the new position"""
+    if field_type in INT_TYPES:
+        fmt = INT_TYPES[field_type]
+        return struct.unpack_from(fmt, data, pos)[0], pos + struct.calcsize(fmt)
+    elif field_type == "FLOAT":
+        return struct.unpack_from("<I", data, pos)[0], pos + 4  # Kept as raw bits
+    elif field_type == "CNTR":
+        return read_cntr(data, pos)
+    elif field_type == "UNICODE":
+        size = struct.unpack_from("<I", data, pos)[0]
+        pos += 4
+        return data[pos : pos + size].decode("utf-16le"), pos + size
+    elif field_type == "ASCF":
+        size, pos = read_cntr(data, pos)
+        if size >= 0:
+            return ("a", data[pos : pos + size].decode("latin-1")), pos + size
+        return ("u", data[pos : pos - 2 * size].decode("utf-16le")), pos - 2 * size
+    raise ValueError(f"Unsupported field type: {field_type}")
+
+
+def format_value(field_type, value):
+    if field_type in ("HEX",):
+        return f"{value:08X}"
+    elif field_type == "CHEX":
+        return f"{value:02X}"
+    elif field_type == "FLOAT":
+        number = struct.unpack("<f", struct.pack("<I", value))[0]
+        if math.isnan(number):
+            return f"NaN(0x{value:X})"
+        # Written with %.8f as by l2disasm, unless that loses bits of the float (e.g. for
+        # very small values), where 9 significant digits always give back the same float:
+        text = f"{number:.8f}"
+        if struct.pack("<f", float(text)) != struct.pack("<I", value):
+            text = f"{number:.9g}"
+        return text
+    elif field_type == "UNICODE":
+        return escape(value)
+    elif field_type == "ASCF":
+        return f"{value[0]},{escape(value[1])}"
+    return str(value)
+
+
+def pack_value(field_type, cell):
+    if field_type in ("HEX", "CHEX"):
+        return struct.pack(INT_TYPES[field_type], int(cell, 16))
+    elif field_type in INT_TYPES:
+        return struct.pack(INT_TYPES[field_type], int(cell))
+    elif field_type == "FLOAT":
+        if cell.startswith("NaN("):
+            return struct.pack("<I", int(cell[4:-1], 16))
+        return struct.pack("<f", float(cell))
+    elif field_type == "CNTR":
+        return write_cntr(int(cell))
+    elif field_type == "UNICODE":
+        string = unescape(cell).encode("utf-16le")
+        return struct.pack("<I", len(string)) + string
+    elif field_type == "ASCF":
+        hint, string = cell[:2], cell[2:]
+        if hint not in ("a,", "u,"):
+            hint, string = "a,", cell
+        string = unescape(string)
+        if hint == "a,":
+            try:
+                return write_cntr(len(string)) + string.encode("latin-1")
+            except UnicodeEncodeError:
+                pass  # Not representable as 8-bit, so store as unicode instead
+        return write_cntr(-len(string)) + string.encode("utf-16le")
+    raise ValueError(f"Unsupported field type: {field_type}")
+
+
+def column_names(field, width):
+    if field.count is None:
+        return [field.name]
+    return [f"{field.name}[{i}]" for i in range(width)]
+
+
+def disassemble(data, ddf):
+    """Converts decrypted .dat contents to tab-delimited lines, as l2disasm does
+
+    Parameters
+    ----------
+    data : bytes
+        Decrypted .dat contents
+    ddf : string
+        Contents of the .ddf file describing the records
+
+    Returns
+    -------
+    list
+        List of strings, one per record (preceded by the header if enabled)
+
+    """
+    controls, fields = parse_ddf(ddf)
+
+    pos = 0
+    if controls["RECCNT"] == -1:
+        n_records = struct.unpack_from("<I", data, 0)[0]
+        pos = 4
+    else:
+        n_records = controls["RECCNT"]
+
+    # First pass reads every record, so dynamic tables can be padded to their widest row:
+    records = []
+    widths = {}
+    for _ in range(n_records):
+        values = {}
+        record = []
+        for idx, field in enumerate(fields):
+            if not is_enabled(field, values):
+                record.append(None)
+                continue
+
+            if field.type == "FILLER":
+                value = (field.count, data[pos] if field.count else 0)
+                pos += field.count
+            elif field.count is None:
+                value, pos = read_value(field.type, data, pos)
+            else:
+                count = field.count if isinstance(field.count, int) else values[field.count]
+                value = []
+                for _ in range(count):
+                    item, pos = read_value(field.type, data, pos)
+                    value.append(item)
+                widths[idx] = max(widths.get(idx, 0), count)
+            values[field.name] = value
+            record.append(value)
+        records.append(record)
+
+    for idx, field in enumerate(fields):
+        if field.count is not None and field.type != "FILLER":
+            static = field.count if isinstance(field.count, int) else 0
+            widths[idx] = max(widths.get(idx, 0), field.props.get("SOFT", 0), static)
+
+    lines = []
+    if controls["HEADER"]:
+        header = []
+        for idx, field in enumerate(fields):
+            if field.type == "FILLER":
+                header.append(field.name)
+            else:
+                header.extend(column_names(field, widths.get(idx)))
+        lines.append(controls.get("FS", "\t").join(header))
+
+    for record in records:
+        cells = []
+        for idx, (field, value) in enumerate(zip(fields, record)):
+            if field.type == "FILLER":
+                cells.append("" if value is None else f"{value[0]},{value[1]}")
+            elif field.count is None:
+                cells.append("" if value is None else format_value(field.type, value))
+            else:
+                value = [] if value is None else value
+                cells.extend(format_value(field.type, item) for item in value)
+                cells.extend([""] * (widths[idx] - len(value)))
+        lines.append(controls.get("FS", "\t").join(cells))
+
+    return lines
+
+
+def assemble(lines, ddf):
+    """Converts tab-delimited lines back to decrypted .dat contents, as l2asm does
+
+    Parameters
+    ----------
+    lines : list
+        List of strings, one per record (preceded by the header if enabled)
+    ddf : string
+        Contents of the .ddf file describing the records
+
+    Returns
+    -------
+    bytes
+        Decrypted .dat contents, ready to be encrypted
+
+    """
+    controls, fields = parse_ddf(ddf)
+    lines = [line for line in lines if line != ""]
+
+    # Column count of each table is taken from the header where present, as l2asm does.
+    # Only the [i] suffixes are matched, since a header written with another .ddf may
+    # name the table differently (e.g. npcgrp-custom.ddf renames the second tex1 to tex2):
+    widths = {}
+    header = lines[0].split("\t") if controls["HEADER"] else None
+    col = 0
+    for idx, field in enumerate(fields):
+        if field.count is None or field.type == "FILLER":
+            col += 1
+            continue
+        if header is not None:
+            width = 0
+            while col + width < len(header) and header[col + width].endswith(f"[{width}]"):
+                width += 1
+        elif "SOFT" in field.props:
+            width = field.props["SOFT"]
+        elif isinstance(field.count, int):
+            width = field.count
+        else:
+            raise ValueError(f"No SOFT property or header to size table {field.name}")
+        widths[idx] = width
+        col += width
+
+    records = lines[1:] if controls["HEADER"] else lines
+    out = bytearray()
+    if controls["RECCNT"] == -1:
+        out += struct.pack("<I", len(records))
+
+    for line in records:
+        cells = line.split("\t")
+        col = 0
+        values = {}
+        for idx, field in enumerate(fields):
+            width = widths.get(idx, 1)
+            if not is_enabled(field, values):
+                col += width
+                continue
+
+            if field.type == "FILLER":
+                count, fill = cells[col].split(",")
+                out += bytes([int(fill)]) * int(count)
+            elif field.count is None:
+                out += pack_value(field.type, cells[col])
+                if field.type in INT_TYPES or field.type == "CNTR":
+                    values[field.name] = int(cells[col], 16 if "HEX" in field.type else 10)
+            else:
+                count = field.count if isinstance(field.count, int) else values[field.count]
+                items = cells[col : col + count]
+                for item in items:
+                    out += pack_value(field.type, item)
+                if field.type in INT_TYPES and items:
+                    values[field.name] = [int(items[0], 16 if "HEX" in field.type else 10)]
+            col += width
+
+    out += bytes(4 * controls["MAGIC"])
+    out += SAFE_PACKAGE
+    return bytes(out)
@@ -0,0 +1,158 @@
+import numpy as np
+
+DROP_DTYPE = np.dtype(
+    [
+        ("npc_id", "<i4"),
+        ("item_id", "<i4"),
+        ("category", "<i4"),
+        ("min", "<i8"),
+        ("max", "<i8"),
+        ("chance", "<f8"),
+        ("spoil", "?"),
+    ]
+)
+
+
+class DropTable:
+    def __init__(self, rows=None, item_names=None):
+        """Columnar table of NPC drops and spoils, one row per drop list entry
+        Rows are kept in the order the NPCs and their drop lists were parsed in, and
+        all operations work on whole columns at once
+
+        Parameters
+        ----------
+        rows : numpy.ndarray
+            Structured array with dtype DROP_DTYPE
+        item_names : dict
+            Dict mapping item id to item name
+
+        """
+        self.rows = np.zeros(0, dtype=DROP_DTYPE) if rows is None else rows
+        self.item_names = {} if item_names is None else item_names
+
+    @classmethod
+    def from_rows(cls, rows, item_names=None):
+        """Creates a table from (npc_id, item_id, category, min, max, chance, spoil) tuples"""
+        return cls(np.array(rows, dtype=DROP_DTYPE), item_names)
+
+    @classmethod
+    def from_npc_data(cls, npc_data):
+        """Creates a table from NPC data in the format returned by the NPC parsers
+        Note: Drop categories aren't stored in npc_data, so drops are given category 0
+              and spoils category -1
+
+        Parameters
+        ----------
+        npc_data : dict
+            Dict mapping NPC id to a dict with "drop" and "spoil" lists of
+            [item_id, min, max, chance, name] rows
+
+        Returns
+        -------
+        DropTable
+            Table containing every drop and spoil in npc_data
+
+        """
+        rows, item_names = [], {}
+        for npc_id, npc in npc_data.items():
+            for spoil, drop_type in enumerate(["drop", "spoil"]):
+                for item_id, min_amt, max_amt, chance, name in npc[drop_type]:
+                    rows.append((npc_id, item_id, -spoil, min_amt, max_amt, chance, spoil))
+                    item_names[item_id] = name
+        return cls.from_rows(rows, item_names)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, key):
+        """Returns a single column by name, or a new table of the selected rows"""
+        if isinstance(key, str):
+            return self.rows[key]
+        return DropTable(self.rows[key], self.item_names)
+
+    @property
+    def drops(self):
+        return self[~self.rows["spoil"]]
+
+    @property
+    def spoils(self):
+        return self[self.rows["spoil"]]
+
+    def names(self):
+        """Returns an array containing the item name of each row"""
+        item_ids, inverse = np.unique(self.rows["item_id"], return_inverse=True)
+        names = np.array([self.item_names[item_id] for item_id in item_ids.tolist()], dtype=object)
+        return names[inverse]
+
+    def scale(self, chance=1, amount=1, where=None):
+        """Returns a copy of the table with rates multiplied, for the rows in where only
+
+        Parameters
+        ----------
+        chance : float
+            Multiplier applied to the drop chance, which is then clamped to at most 1
+        amount : float
+            Multiplier applied to the min and max amounts, which are then rounded to
+            the nearest integer (with halves rounded to even, as Python's round does)
+        where : numpy.ndarray
+            Boolean mask of rows to scale (default is all rows)
+
+        Returns
+        -------
+        DropTable
+            Scaled copy of the table
+
+        """
+        rows = self.rows.copy()
+        if where is None:
+            where = np.ones(len(rows), dtype=bool)
+
+        rows["chance"][where] = np.minimum(rows["chance"][where] * chance, 1)
+        for col in ["min", "max"]:
+            rows[col][where] = np.round(rows[col][where] * amount)
+
+        return DropTable(rows, self.item_names)
+
+    def sort_by_npc(self):
+        """Returns a copy of the table with each NPC's rows in order of decreasing chance
+        NPCs keep the order they first appear in, and rows with equal chance are placed
+        in reverse order of appearance, as np.argsort(chance)[::-1] did on each NPC when
+        its sort happened to be stable (the order of ties depends on the NumPy build)
+
+        Returns
+        -------
+        DropTable
+            Sorted copy of the table
+
+        """
+        npc_order = self.first_index("npc_id")
+        order = np.lexsort((-np.arange(len(self.rows)), -self.rows["chance"], npc_order))
+        return self[order]
+
+    def first_index(self, field):
+        """Returns, for each row, the index of the first row with the same value of field"""
+        _, first, inverse = np.unique(self.rows[field], return_index=True, return_inverse=True)
+        return first[inverse]
+
+    def group_by(self, field):
+        """Splits the table into groups of rows sharing the same value of field
+        Groups are returned in order of first appearance, and each group keeps its rows
+        in their original order
+
+        Parameters
+        ----------
+        field : string
+            Name of the column to group by, e.g. "npc_id" or "item_id"
+
+        Returns
+        -------
+        tuple
+            (keys, order, bounds) where the rows of group i are
+            order[bounds[i] : bounds[i + 1]], and have field equal to keys[i]
+
+        """
+        order = np.argsort(self.first_index(field), kind="stable")
+        values = self.rows[field][order]
+        starts = np.flatnonzero(np.r_[True, values[1:] != values[:-1]])
+        bounds = np.r_[starts, len(values)]
+        return values[starts], order, bounds
@@ -0,0 +1,36 @@
+import numpy as np
+
+
+def grid_clusters(groups, x, y, cell_size):
+    """Clusters points of many groups at once, merging the points of a group in each grid cell
+
+    Parameters
+    ----------
+    groups : numpy.ndarray
+        Group of each point (e.g. NPC id), as integers
+    x, y : numpy.ndarray
+        Coordinates of each point
+    cell_size : float
+        Width and height of each grid cell, in the units of x and y
+
+    Returns
+    -------
+    tuple
+        (groups, x, y, counts) arrays with one entry per cluster, sorted by group, where
+        x and y are the centroid of the cluster's points and counts their number
+
+    """
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    keys = np.stack(
+        [
+            np.asarray(groups, dtype=np.int64),
+            np.floor(x / cell_size).astype(np.int64),
+            np.floor(y / cell_size).astype(np.int64),
+        ],
+        axis=1,
+    )
+    clusters, inverse, counts = np.unique(keys, axis=0, return_inverse=True, return_counts=True)
+    inverse = inverse.ravel()  # Some numpy versions return inverse with the keys' shape
+    centroid_x = np.bincount(inverse, weights=x, minlength=len(clusters)) / counts
+    centroid_y = np.bincount(inverse, weights=y, minlength=len(clusters)) / counts
+    return clusters[:, 0], centroid_x, centroid_y, counts
@@ -0,0 +1,35 @@
+import re
+
+# Tags, whose quoted attribute values may contain any characters, including "<" and ">":
+TAG = r"""<[A-Za-z](?:[^<>"']|"[^"]*"|'[^']*')*>"""
+# Spans whose whitespace is significant: preformatted elements, and tags (whose attribute
+# values may contain line breaks, e.g. skill tooltips):
+PROTECTED_REGEX = re.compile(rf"<(pre|textarea)\b.*?</\1\s*>|{TAG}", re.DOTALL | re.IGNORECASE)
+# Indentation, trailing whitespace, and blank lines:
+WHITESPACE_REGEX = re.compile(r"[ \t]*\n\s*")
+
+
+def minify_html(html):
+    """Removes indentation, trailing whitespace, and blank lines from generated HTML
+    Line breaks are kept (as a single newline), so inline scripts and text render the
+    same, and spans where whitespace matters are left unchanged
+
+    Parameters
+    ----------
+    html : string
+        HTML to minify
+
+    Returns
+    -------
+    string
+        Minified HTML
+
+    """
+    parts = []
+    pos = 0
+    for match in PROTECTED_REGEX.finditer(html):
+        parts.append(WHITESPACE_REGEX.sub("\n", html[pos : match.start()]))
+        parts.append(match.group())
+        pos = match.end()
+    parts.append(WHITESPACE_REGEX.sub("\n", html[pos:]))
+    return "".join(parts).strip() + "\n"
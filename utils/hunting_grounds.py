@@ -0,0 +1,142 @@
+import numpy as np
+
+from .world_grid import WorldGrid
+
+
+class HuntingGrounds:
+    # Aggregates summed over the spawn points of each cell, for each level band:
+    TOTALS = ["spawns", "exp", "sp", "hp", "kills_per_hour", "exp_per_hour", "sp_per_hour"]
+
+    def __init__(
+        self, spawn_table, bounds, npc_stats, cell_size=8192, min_respawn=10, target_kills=120
+    ):
+        """Ranks the cells of a grid over the world by how fast players level there
+        Each spawn point is joined with the stats of its NPC once, as arrays with one
+        entry per spawn point, so every level band and cell is aggregated with a few
+        vectorized operations (np.bincount over (band, cell) keys)
+
+        For each cell and band, the NPCs whose level is in the band contribute:
+            exp_per_hp : total exp / total HP of the NPCs, i.e. the exp earned per point
+                of damage dealt, which is how fast a player levels while killing
+            kills_per_hour : kills the spawns can supply each hour, from their respawn
+                delays (a spawn with a 30s delay supplies 120 kills per hour)
+            exp_per_hour, sp_per_hour : exp and SP the spawns supply each hour
+        and cells are ranked by exp_per_hp, scaled down in cells that can't supply
+        target_kills kills per hour (where players would wait for respawns)
+
+        Parameters
+        ----------
+        spawn_table : SpawnTable
+            Spawn points
+        bounds : tuple
+            (x_min, x_max, y_min, y_max) of the world
+        npc_stats : dict
+            Dict mapping NPC id to a dict with its "level", "exp", "sp", and "hp". Spawn
+            points of NPCs without stats are ignored
+        cell_size : int
+            Width and height of each cell, in world units
+        min_respawn : int
+            Shortest respawn delay assumed, in seconds (for spawns with no delay)
+        target_kills : float
+            Kills per hour a cell must supply to be ranked by exp_per_hp alone
+
+        """
+        self.grid = WorldGrid(bounds, cell_size)
+        self.target_kills = target_kills
+
+        # Spawn points of the NPCs with stats (in order of NPC id), and a function
+        # returning a stat of each point's NPC, repeated over the NPC's points:
+        counts = {
+            id: end - start for id, (start, end) in spawn_table.index.items() if id in npc_stats
+        }
+        rows = spawn_table.rows[np.isin(spawn_table["npc_id"], list(counts))]
+        column = lambda key: np.repeat(
+            [float(npc_stats[id][key]) for id in counts], list(counts.values())
+        )
+
+        self.npc_ids = rows["npc_id"]
+        self.level = column("level")
+        self.cells = self.grid.cells(rows["x"], rows["y"])
+
+        kills_per_hour = 3600 / np.maximum(rows["respawn_delay"], min_respawn)
+        self.values = {
+            "spawns": np.ones(len(rows)),
+            "exp": column("exp"),
+            "sp": column("sp"),
+            "hp": column("hp"),
+            "kills_per_hour": kills_per_hour,
+            "exp_per_hour": column("exp") * kills_per_hour,
+            "sp_per_hour": column("sp") * kills_per_hour,
+        }
+
+    def aggregate(self, bands):
+        """Sums the values of the spawn points in each cell, for every level band at once
+
+        Parameters
+        ----------
+        bands : list
+            List of (min_level, max_level) tuples of NPC levels (inclusive)
+
+        Returns
+        -------
+        dict
+            Dict mapping each name in self.TOTALS, and "exp_per_hp" and "score", to an
+            array of shape (len(bands), number of cells)
+
+        """
+        low = np.array([band[0] for band in bands])[:, None]
+        high = np.array([band[1] for band in bands])[:, None]
+        band_index, row_index = np.nonzero((self.level >= low) & (self.level <= high))
+        n_cells = self.grid.n_cells
+        keys = band_index * n_cells + self.cells[row_index]
+
+        totals = {}
+        for name in self.TOTALS:
+            weights = self.values[name][row_index]
+            sums = np.bincount(keys, weights=weights, minlength=len(bands) * n_cells)
+            totals[name] = sums.reshape(len(bands), n_cells)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            totals["exp_per_hp"] = np.where(totals["hp"] > 0, totals["exp"] / totals["hp"], 0)
+        supply = np.minimum(totals["kills_per_hour"] / self.target_kills, 1)
+        totals["score"] = totals["exp_per_hp"] * supply
+        return totals
+
+    def rank(self, bands, n=20):
+        """Finds the best cells for each level band
+
+        Parameters
+        ----------
+        bands : list
+            List of (min_level, max_level) tuples of NPC levels (inclusive)
+        n : int
+            Number of cells to return for each band
+
+        Returns
+        -------
+        list
+            List with, for each band, a list of the n best cells (best first), each a
+            dict with the cell's bounds in world units ("x_min", "y_min", "x_max",
+            "y_max"), its aggregates, and "npcs", a list of (npc_id, count) tuples of
+            the NPCs in the band spawning there, most common first
+
+        """
+        totals = self.aggregate(bands)
+        ranking = []
+        for b, (low, high) in enumerate(bands):
+            scores = totals["score"][b]
+            cells = np.nonzero(scores > 0)[0]
+            cells = cells[np.argsort(-scores[cells], kind="stable")[:n]]
+
+            spots = []
+            for cell in cells.tolist():
+                spot = dict(zip(["x_min", "y_min", "x_max", "y_max"], self.grid.cell_bounds(cell)))
+                for name in totals:
+                    spot[name] = float(totals[name][b, cell])
+                in_spot = (self.cells == cell) & (self.level >= low) & (self.level <= high)
+                npc_ids, counts = np.unique(self.npc_ids[in_spot], return_counts=True)
+                order = np.argsort(-counts, kind="stable")
+                spot["npcs"] = list(zip(npc_ids[order].tolist(), counts[order].tolist()))
+                spots.append(spot)
+            ranking.append(spots)
+        return ranking
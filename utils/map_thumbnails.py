@@ -0,0 +1,106 @@
+import os
+import hashlib
+import numpy as np
+import cv2
+
+from .utils import write_atomic
+from .site_manifest import SiteManifest
+
+# Offsets of the pixels of each stamped point, a dark outline under a colored dot:
+OUTLINE_OFFSETS = np.array(
+    [(dy, dx) for dy in range(-2, 3) for dx in range(-2, 3) if abs(dy) + abs(dx) <= 3]
+)
+DOT_OFFSETS = np.array([(dy, dx) for dy in range(-1, 2) for dx in range(-1, 2)])
+
+
+class MapThumbnails:
+    VERSION = 1  # Bump whenever the way thumbnails are drawn changes, to rewrite them all
+
+    def __init__(self, thumb_path, image, width=160, quality=80, color=(0, 0, 255)):
+        """Small copies of a map image, with the points of one group stamped on each
+        The map is downsampled once, and every thumbnail is a copy of it with the group's
+        points drawn as dots. A manifest records a hash of the downsampled map and the
+        dots of each thumbnail, so thumbnails that would be unchanged aren't rewritten
+
+        Parameters
+        ----------
+        thumb_path : string
+            Directory to write the thumbnails to, as {group}.jpg
+        image : numpy.ndarray
+            Map image, as read by cv2.imread
+        width : int
+            Width of the thumbnails, in pixels (the height keeps the map's aspect ratio)
+        quality : int
+            JPEG quality of the thumbnails (0-100)
+        color : tuple
+            BGR color of the dots
+
+        """
+        self.thumb_path = thumb_path
+        self.manifest_path = os.path.join(thumb_path, "thumbnails.json")
+        self.quality = quality
+        self.color = color
+
+        if image.ndim == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        self.scale = width / image.shape[1]
+        self.size = (width, max(1, round(image.shape[0] * self.scale)))
+        self.base = cv2.resize(image[:, :, :3], self.size, interpolation=cv2.INTER_AREA)
+        base_hash = hashlib.sha1(self.base.tobytes())
+        base_hash.update(repr((quality, color)).encode())
+        self.base_hash = base_hash.hexdigest()
+
+    def build(self, groups, x, y):
+        """Writes the thumbnail of every group, skipping thumbnails that are unchanged
+        Points are projected onto the thumbnails all at once, and points falling on the
+        same thumbnail pixel are only stamped once
+
+        Parameters
+        ----------
+        groups : numpy.ndarray
+            Group of each point (e.g. NPC id), as integers
+        x, y : numpy.ndarray
+            Pixel coordinates of each point on the full map image, from its top left corner
+
+        Returns
+        -------
+        tuple
+            (n_thumbnails, n_written) numbers of thumbnails, and thumbnails written
+
+        """
+        # Unique (group, pixel) pairs, sorted by group:
+        width, height = self.size
+        cols = np.clip((np.asarray(x) * self.scale).astype(np.int64), 0, width - 1)
+        rows = np.clip((np.asarray(y) * self.scale).astype(np.int64), 0, height - 1)
+        keys = np.asarray(groups, dtype=np.int64) * (width * height) + rows * width + cols
+        groups, pixels = np.divmod(np.unique(keys), width * height)
+        group_ids, starts = np.unique(groups, return_index=True)
+        ends = np.r_[starts[1:], len(pixels)]
+
+        thumbnails = {}  # Maps file name to the hash of the thumbnail
+        group_pixels = {}  # Maps file name to the pixels of the group's points
+        for group, start, end in zip(group_ids.tolist(), starts.tolist(), ends.tolist()):
+            fname = f"{group}.jpg"
+            thumbnail_hash = hashlib.sha1(self.base_hash.encode())
+            thumbnail_hash.update(pixels[start:end].tobytes())
+            thumbnails[fname] = thumbnail_hash.hexdigest()
+            group_pixels[fname] = pixels[start:end]
+
+        manifest = SiteManifest(self.manifest_path, self.VERSION)
+        dirty, removed = manifest.changes(thumbnails, self.thumb_path)
+        for fname in sorted(dirty):
+            thumbnail = self.base.copy()
+            group_rows, group_cols = np.divmod(group_pixels[fname], width)
+            self.stamp(thumbnail, group_rows, group_cols, OUTLINE_OFFSETS, 0)
+            self.stamp(thumbnail, group_rows, group_cols, DOT_OFFSETS, self.color)
+            _, jpg = cv2.imencode(".jpg", thumbnail, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+            write_atomic(self.thumb_path, fname, jpg.tobytes())
+        manifest.remove(removed, self.thumb_path)
+        manifest.save(thumbnails)
+        return len(thumbnails), len(dirty)
+
+    def stamp(self, thumbnail, rows, cols, offsets, color):
+        """Sets the pixels at each offset around each (row, col) point to color"""
+        stamp_rows = np.clip(rows[:, None] + offsets[None, :, 0], 0, thumbnail.shape[0] - 1)
+        stamp_cols = np.clip(cols[:, None] + offsets[None, :, 1], 0, thumbnail.shape[1] - 1)
+        thumbnail[stamp_rows.ravel(), stamp_cols.ravel()] = color
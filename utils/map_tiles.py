@@ -0,0 +1,97 @@
+import os
+import hashlib
+import numpy as np
+import cv2
+
+from .utils import write_atomic
+from .site_manifest import SiteManifest
+
+
+class TilePyramid:
+    VERSION = 1  # Bump whenever the way tiles are drawn changes, to rewrite every tile
+
+    def __init__(self, size, tile_path, tile_size=256):
+        """Cuts a map image into a z/x/y pyramid of tiles, for a Leaflet tile layer
+        Level 0 holds the whole image in a single tile, and each level doubles the
+        resolution, up to the image's own resolution at the last level. Tiles are
+        numbered from the top left corner, and tiles along the right and bottom edges
+        are padded with transparent pixels to the full tile size
+
+        With L.CRS.Simple, the image at its own resolution is at zoom 0, so a tile layer
+        over bounds [[-height, 0], [0, width]] uses zoomOffset = self.max_zoom, and
+        minNativeZoom = -self.max_zoom and maxNativeZoom = 0
+
+        Parameters
+        ----------
+        size : tuple
+            (width, height) of the map image, in pixels
+        tile_path : string
+            Directory to write the tiles to, as {z}/{x}/{y}.png
+        tile_size : int
+            Width and height of each tile, in pixels
+
+        """
+        self.size = tuple(size)
+        self.tile_path = tile_path
+        self.tile_size = tile_size
+        self.manifest_path = os.path.join(tile_path, "tiles.json")
+        # Level showing the image at its own resolution (level 0 fits it in one tile):
+        self.max_zoom = max(0, int(np.ceil(np.log2(max(self.size) / tile_size))))
+
+    def build(self, image):
+        """Writes the tiles of every level, skipping tiles whose source region is unchanged
+        The source region of each tile (the part of the full image it shows) is hashed,
+        and compared to the hashes recorded in the manifest by the last build
+
+        Parameters
+        ----------
+        image : numpy.ndarray
+            Map image, as read by cv2.imread, of size self.size
+
+        Returns
+        -------
+        tuple
+            (n_tiles, n_written) numbers of tiles in the pyramid, and tiles written
+
+        """
+        if image.ndim == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGRA)
+        elif image.shape[2] == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2BGRA)
+        height, width = image.shape[:2]
+
+        tiles = {}  # Maps tile path to the hash of its source region
+        sources = {}  # Maps tile path to its source region and scale
+        for z in range(self.max_zoom + 1):
+            scale = 2 ** (self.max_zoom - z)  # Source pixels per tile pixel
+            region_size = self.tile_size * scale
+            for x in range(-(-width // region_size)):
+                for y in range(-(-height // region_size)):
+                    region = image[
+                        y * region_size : (y + 1) * region_size,
+                        x * region_size : (x + 1) * region_size,
+                    ]
+                    tile = f"{z}/{x}/{y}.png"
+                    tile_hash = hashlib.sha1(region.tobytes())
+                    tile_hash.update(repr((region.shape, scale, self.tile_size)).encode())
+                    tiles[tile] = tile_hash.hexdigest()
+                    sources[tile] = (region, scale)
+
+        manifest = SiteManifest(self.manifest_path, self.VERSION)
+        dirty, removed = manifest.changes(tiles, self.tile_path)
+        for tile in sorted(dirty):
+            self.write_tile(os.path.join(self.tile_path, *tile.split("/")), *sources[tile])
+        manifest.remove(removed, self.tile_path, prune=True)
+        manifest.save(tiles)
+        return len(tiles), len(dirty)
+
+    def write_tile(self, tile_file, region, scale):
+        """Scales a region of the image down by scale, and writes it as a padded tile"""
+        if scale > 1:
+            region_height, region_width = region.shape[:2]
+            size = (-(-region_width // scale), -(-region_height // scale))
+            region = cv2.resize(region, size, interpolation=cv2.INTER_AREA)
+        tile = np.zeros((self.tile_size, self.tile_size, 4), dtype=region.dtype)
+        tile[: region.shape[0], : region.shape[1]] = region
+        _, png = cv2.imencode(".png", tile, [cv2.IMWRITE_PNG_COMPRESSION, 9])
+        write_atomic(os.path.dirname(tile_file), os.path.basename(tile_file), png.tobytes())
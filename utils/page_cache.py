@@ -0,0 +1,77 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class PageCache:
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        """Bounded LRU cache of rendered pages, safe to share between threads
+        Each page is stored encoded, with an ETag derived from its contents, and the
+        least recently used pages are evicted once the pages total more than max_bytes
+
+        Parameters
+        ----------
+        max_bytes : int
+            Maximum total size of the cached pages, in bytes (0 disables caching)
+
+        """
+        self.max_bytes = max_bytes
+        self.pages = OrderedDict()  # Maps key to (body, etag), least recently used first
+        self.size = 0
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.pages)
+
+    def get(self, key):
+        """Returns the (body, etag) of a cached page, or None if it isn't cached"""
+        with self.lock:
+            entry = self.pages.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.pages.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, html):
+        """Caches a rendered page, evicting the least recently used pages if needed
+
+        Parameters
+        ----------
+        key : string
+            Key of the page, e.g. its path
+        html : string
+            Rendered page
+
+        Returns
+        -------
+        tuple
+            (body, etag) of the page, where body is the page encoded as utf-8
+
+        """
+        body = html.encode("utf8")
+        entry = (body, f'"{hashlib.sha1(body).hexdigest()[:16]}"')
+        if len(body) > self.max_bytes:
+            return entry  # Too large to cache
+
+        with self.lock:
+            old = self.pages.pop(key, None)
+            if old is not None:
+                self.size -= len(old[0])
+            self.pages[key] = entry
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, (old_body, _) = self.pages.popitem(last=False)
+                self.size -= len(old_body)
+                self.evictions += 1
+        return entry
+
+    def clear(self):
+        with self.lock:
+            self.pages.clear()
+            self.size = 0
@@ -0,0 +1,122 @@
+import os
+import pickle
+import hashlib
+
+
+class ParseCache:
+    def __init__(self, cache_dir=None):
+        """On-disk cache of parsed server data, stored per source file
+        Each entry records the content hash of its source file and the version of the
+        parser that produced it, and is only used when both still match
+
+        Parameters
+        ----------
+        cache_dir : string
+            Directory to store cache entries in (defaults to tmp/cache in the repo root)
+
+        """
+        self.util_dir = os.path.dirname(os.path.realpath(__file__))
+        if cache_dir is None:
+            cache_dir = os.path.join(self.util_dir, "..", "tmp", "cache")
+        self.cache_dir = cache_dir
+
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, kind, path, version, parse_func):
+        """Returns the parsed contents of path, only calling parse_func on a cache miss
+
+        Parameters
+        ----------
+        kind : string
+            Name of the type of data stored (e.g. "npc_xml"), used as a subdirectory
+        path : string
+            Path of the source file
+        version : int
+            Version of the parser producing the data
+        parse_func : callable
+            Function taking path and returning the parsed data
+
+        Returns
+        -------
+        object
+            Parsed contents of path
+
+        """
+        data = self.get(kind, path, version)
+        if data is None:
+            data = parse_func(path)
+            self.put(kind, path, version, data)
+        return data
+
+    def get(self, kind, path, version):
+        """Returns the cached data for path, or None if missing or stale
+
+        Parameters
+        ----------
+        kind : string
+            Name of the type of data stored
+        path : string
+            Path of the source file
+        version : int
+            Version of the parser producing the data
+
+        Returns
+        -------
+        object/None
+            Cached data if the entry matches the file's content hash and version
+
+        """
+        entry_path = self.entry_path(kind, path)
+        try:
+            with open(entry_path, "rb") as f:
+                entry = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            # Entries referring to classes that no longer exist are stale too:
+            self.misses += 1
+            return None
+
+        if entry["version"] != version or entry["hash"] != file_hash(path):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return entry["data"]
+
+    def put(self, kind, path, version, data):
+        """Stores the parsed data of path in the cache
+
+        Parameters
+        ----------
+        kind : string
+            Name of the type of data stored
+        path : string
+            Path of the source file
+        version : int
+            Version of the parser producing the data
+        data : object
+            Picklable parsed contents of path
+
+        """
+        entry_path = self.entry_path(kind, path)
+        if not os.path.exists(os.path.dirname(entry_path)):
+            os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+
+        entry = {"hash": file_hash(path), "version": version, "data": data}
+        # Write to a temporary file first so concurrent builds never read a partial entry:
+        tmp_path = f"{entry_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, entry_path)
+
+    def entry_path(self, kind, path):
+        return os.path.join(self.cache_dir, kind, f"{os.path.basename(path)}.pkl")
+
+
+def file_hash(path):
+    """Returns the SHA-1 hex digest of the contents of the file at path"""
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha1.update(chunk)
+    return sha1.hexdigest()
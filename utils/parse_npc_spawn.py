@@ -1,75 +1,137 @@
 import os
-import re
-from collections import namedtuple
+import numpy as np
 
+from .sql_reader import iter_inserts
+from .spawn_table import SpawnTable, SPAWN_DTYPE
 
-class SpawnParser:
-    def __init__(self, sql_path=None):
-        self.SpawnData = namedtuple("SpawnData", ["x", "y"])
 
+class SpawnParser:
+    VERSION = 2  # Bump whenever the parsed output changes, to invalidate cached results
+
+    # Spawn files, with the name of their table, its columns in order, the columns read
+    # into each SpawnTable field, and the number of seconds in a unit of each field:
+    SOURCES = [
+        (
+            "spawnlist.sql",
+            "spawnlist",
+            ["npc_templateid", "locx", "locy", "locz", "heading", "respawn_delay",
+             "respawn_rand", "periodOfDay"],
+            {"npc_id": "npc_templateid", "x": "locx", "y": "locy", "z": "locz",
+             "heading": "heading", "respawn_delay": "respawn_delay",
+             "respawn_rand": "respawn_rand", "period_of_day": "periodOfDay"},
+            {},
+        ),
+        (
+            "raidboss_spawnlist.sql",
+            "raidboss_spawnlist",
+            ["boss_id", "loc_x", "loc_y", "loc_z", "heading", "spawn_time", "random_time",
+             "respawn_time", "currentHp", "currentMp"],
+            {"npc_id": "boss_id", "x": "loc_x", "y": "loc_y", "z": "loc_z",
+             "heading": "heading", "respawn_delay": "spawn_time", "respawn_rand": "random_time"},
+            {"respawn_delay": 3600, "respawn_rand": 3600},  # Raid boss respawns are in hours
+        ),
+        (
+            "grandboss_data.sql",
+            "grandboss_data",
+            ["boss_id", "loc_x", "loc_y", "loc_z", "heading", "respawn_time", "currentHP",
+             "currentMP", "status"],
+            {"npc_id": "boss_id", "x": "loc_x", "y": "loc_y", "z": "loc_z", "heading": "heading"},
+            {},
+        ),
+    ]
+
+    def __init__(self, sql_path=None, cache=None):
         self.util_dir = os.path.dirname(os.path.realpath(__file__))
         if sql_path is None:
-            self.sql_path = os.path.join(self.util_dir, "..", "server_data", "sql")
+            sql_path = os.path.join(self.util_dir, "..", "server_data", "sql")
+        self.sql_path = sql_path
+        self.cache = cache  # Optional ParseCache storing the parsed contents of each file
 
     def parse(self):
-        self.spawn_data = {}
-
-        self.parse_spawn_normal()
-        self.parse_spawn_raidboss()
-        self.parse_spawn_grandboss()
-
+        """Parses the spawn points of every NPC from the spawn files
+
+        Returns
+        -------
+        SpawnTable
+            Spawn points of every NPC, which also behaves as a dict mapping NPC id to
+            the rows of that NPC's spawn points
+
+        """
+        tables = []
+        for source, (fname, table, columns, fields, units) in enumerate(self.SOURCES):
+            rows = self.parse_file(fname, table, columns, fields, units)
+            rows["source"] = source
+            tables.append(rows)
+
+        self.spawn_data = SpawnTable(np.concatenate(tables))
         return self.spawn_data
 
-    def parse_spawn_normal(self):
-        regex = "\(('-?[0-9]{1,9}', ){7}('-?[0-9]')\)"
-        with open(f"{self.sql_path}/spawnlist.sql", "r") as f:
-            lines = f.readlines()
-
-        for line in lines:
-            match = re.match(regex, line)
-            if match:
-                data = eval(match.group())  # Evaluate the matched line as a tuple
-                data = tuple(int(d) for d in data)  # Convert data points from str to numbers
-
-                npc_id, loc_x, loc_y = data[0], data[1], data[2]
-                if npc_id not in self.spawn_data:
-                    self.spawn_data[npc_id] = []
-
-                # Convert data to SpawnData named tuple format, then add to dict:
-                self.spawn_data[npc_id].append(self.SpawnData(loc_x, loc_y))
-
-    def parse_spawn_raidboss(self):
-        regex = "\((-?[0-9]{1,9},){9}(-?[0-9])\)"
-        with open(f"{self.sql_path}/raidboss_spawnlist.sql", "r") as f:
-            lines = f.readlines()
-
-        for line in lines:
-            match = re.match(regex, line)
-            if match:
-                data = eval(match.group())  # Evaluate the matched line as a tuple
-                data = tuple(int(d) for d in data)  # Convert data points from str to numbers
-
-                npc_id, loc_x, loc_y = data[0], data[1], data[2]
-                if npc_id not in self.spawn_data:
-                    self.spawn_data[npc_id] = []
-
-                # Convert data to SpawnData named tuple format, then add to dict:
-                self.spawn_data[npc_id].append(self.SpawnData(loc_x, loc_y))
-
-    def parse_spawn_grandboss(self):
-        regex = "\((-?[0-9]{1,9}, ){8}(-?[0-9])\)"
-        with open(f"{self.sql_path}/grandboss_data.sql", "r") as f:
-            lines = f.readlines()
-
-        for line in lines:
-            match = re.match(regex, line)
-            if match:
-                data = eval(match.group())  # Evaluate the matched line as a tuple
-                data = tuple(int(d) for d in data)  # Convert data points from str to numbers
-
-                npc_id, loc_x, loc_y = data[0], data[1], data[2]
-                if npc_id not in self.spawn_data:
-                    self.spawn_data[npc_id] = []
-
-                # Convert data to SpawnData named tuple format, then add to dict:
-                self.spawn_data[npc_id].append(self.SpawnData(loc_x, loc_y))
+    def parse_file(self, fname, table, columns, fields, units):
+        """Parses the spawn points from a single .sql file, using the cache if available
+
+        Parameters
+        ----------
+        fname : string
+            Name of .sql file in self.sql_path
+        table : string
+            Name of the table containing the spawn points
+        columns : list
+            Names of the table's columns, in order
+        fields : dict
+            Dict mapping SpawnTable field to the column it is read from
+        units : dict
+            Dict mapping SpawnTable field to the number of seconds in its unit
+
+        Returns
+        -------
+        numpy.ndarray
+            Structured array with dtype SPAWN_DTYPE, in the order of the file
+
+        """
+        path = f"{self.sql_path}/{fname}"
+        parse_func = lambda path: parse_spawn_file(path, table, columns, fields, units)
+        if self.cache is None:
+            return parse_func(path)
+        return self.cache.load("spawn_sql", path, self.VERSION, parse_func)
+
+
+def parse_spawn_file(path, table, columns, fields, units=None):
+    """Parses the spawn points from the INSERT statements of a single .sql file
+
+    Parameters
+    ----------
+    path : string
+        Path of .sql file
+    table : string
+        Name of the table containing the spawn points (rows of other tables are ignored)
+    columns : list
+        Names of the table's columns, in order, used for INSERTs without a column list
+    fields : dict
+        Dict mapping SpawnTable field to the column it is read from
+    units : dict
+        Dict mapping SpawnTable field to the number of seconds in its unit
+
+    Returns
+    -------
+    numpy.ndarray
+        Structured array with dtype SPAWN_DTYPE, in the order of the file
+
+    """
+    units = {} if units is None else units
+    positions = {}  # Maps each column list to the positions of the fields' columns in it
+    rows = []
+    with open(path, "r") as f:
+        for row_table, row_columns, values in iter_inserts(f):
+            if row_table != table:
+                continue
+            row_columns = tuple(columns if row_columns is None else row_columns)
+            if row_columns not in positions:
+                positions[row_columns] = [row_columns.index(col) for col in fields.values()]
+            rows.append([int(values[i]) for i in positions[row_columns]])
+
+    data = np.zeros(len(rows), dtype=SPAWN_DTYPE)
+    if len(rows) > 0:
+        values = np.array(rows, dtype=np.int64)
+        for i, field in enumerate(fields):
+            data[field] = values[:, i] * units.get(field, 1)
+    return data
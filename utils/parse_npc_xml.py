@@ -1,18 +1,30 @@
 import os
 import sys
 import json
-from bs4 import BeautifulSoup
+import xml.etree.ElementTree as ET
 from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from .drop_table import DropTable
+
+Item = namedtuple("Item", ["name", "type", "crystal"])
+Crystal = namedtuple("Crystal", ["count", "type"])
+Skill = namedtuple("Skill", ["id", "level"])
 
 
 class NpcParser:
-    def __init__(self, item_dir=None, npc_dir=None):
+    VERSION = 2  # Bump whenever the parsed output changes, to invalidate cached results
+
+    def __init__(self, item_dir=None, npc_dir=None, cache=None):
         self.util_dir = os.path.dirname(os.path.realpath(__file__))
 
         if item_dir is None:
-            self.item_dir = os.path.join(self.util_dir, "..", "server_data", "items")
+            item_dir = os.path.join(self.util_dir, "..", "server_data", "items")
         if npc_dir is None:
-            self.npc_dir = os.path.join(self.util_dir, "..", "server_data", "npcs")
+            npc_dir = os.path.join(self.util_dir, "..", "server_data", "npcs")
+        self.item_dir = item_dir
+        self.npc_dir = npc_dir
+        self.cache = cache  # Optional ParseCache storing the parsed contents of each file
 
         # Stats to extract from NPC XMLs:
         self.stats = {
@@ -31,134 +43,330 @@ class NpcParser:
 
         self.item_data = None
         self.drop_data = None
+        self.drop_table = None  # DropTable of every drop and spoil, filled in by parse_npc_xml
+
+    def parse(self, jobs=1):
+        """Parses the item and NPC XMLs
+
+        Parameters
+        ----------
+        jobs : int
+            Number of worker processes to parse the XML files with. Each range file
+            is independent, so with jobs > 1 the files are spread across a process
+            pool and the per-file results merged in file name order
+
+        Returns
+        -------
+        dict
+            Dict containing the information of each NPC
 
-    def parse(self):
-        self.item_data = self.parse_item_xml()
-        self.drop_data = self.parse_npc_xml()
+        """
+        self.item_data = self.parse_item_xml(jobs=jobs)
+        self.drop_data = self.parse_npc_xml(jobs=jobs)
         return self.drop_data
 
     def dump(self, out_file="drop_data_xml.json"):
         json.dump(self.drop_data, open("drop_data_xml.json", "w"))
 
-    def parse_item_xml(self):
-        Item = namedtuple("Item", ["name", "type", "crystal"])
-        Crystal = namedtuple("Crystal", ["count", "type"])
-
+    def parse_item_xml(self, jobs=1):
         item_files = []
-        for file in os.listdir(self.item_dir):
+        for file in sorted(os.listdir(self.item_dir)):
             if file.endswith(".xml"):
-                item_files.append(file)
-        item_data = {}
+                item_files.append(os.path.join(self.item_dir, file))
 
-        for file in item_files:
-            with open(os.path.join(self.item_dir, file), "r") as f:
-                contents = f.read()
-            soup = BeautifulSoup(contents, features="html.parser")
-
-            items = soup.find_all("item")
-            for item in items:
-                item_id = eval(item["id"])
-                item_name = item["name"]
-                item_type = item["type"]
-                try:
-                    crystal_count = int(item.find("set", {"name": "crystal_count"})["val"])
-                    crystal_type = item.find("set", {"name": "crystal_type"})["val"]
-                except:
-                    crystal_count = crystal_type = None
-
-                crystal = Crystal(crystal_count, crystal_type)
-                item_data[item_id] = Item(item_name, item_type, crystal)
+        item_data = {}
+        for file_data in self.parse_files("item_xml", parse_item_file, item_files, jobs):
+            item_data.update(file_data)
         return item_data
 
-    def parse_npc_xml(self):
-        Skill = namedtuple("Skill", ["id", "level"])
+    def parse_npc_xml(self, jobs=1):
         if self.item_data is None:
             assert ValueError("self.item_data is None, first parse item xml")
         npc_files = []
-        for file in os.listdir(self.npc_dir):
+        for file in sorted(os.listdir(self.npc_dir)):
             if file.endswith(".xml"):
-                npc_files.append(file)
+                npc_files.append(os.path.join(self.npc_dir, file))
 
         npc_data = {}
-        for file in npc_files:
-            with open(os.path.join(self.npc_dir, file), "r") as f:
-                contents = f.read()
-            soup = BeautifulSoup(contents, features="html.parser")
-
-            npcs = soup.find_all("npc")
-
-            for npc in npcs:
-                npc_id = eval(npc["id"])
-                npc_name = npc["name"]
-                npc_title = npc["title"]
-
-                npc_data[npc_id] = {
-                    "name": npc_name,
-                    "title": npc_title,
-                    "file": file,
-                    "stats": [],
-                    "drop": [],
-                    "spoil": [],
-                }
-
-                stat_list = npc.find_all("set")
-
-                stats = {}
-                for stat in stat_list:
-                    stat_name = stat["name"].lower()
-                    if stat_name in self.stats:  # If it's a stat we're interested in:
-                        try:  # If stat is numerical, then round:
-                            stats[stat_name] = str(round(eval(stat["val"])))
-                        except NameError:  # Otherwise:
-                            stats[stat_name] = stat["val"]
-                    elif stat_name == "dropherbgroup":
-                        if stat["val"] != "0":
-                            stats["herbs"] = "Yes"
-                        else:
-                            stats["herbs"] = "No"
-
-                ai = npc.find("ai")
-                if ai.has_attr("aggro") and ai["aggro"] != "0":
-                    stats["agro"] = "Yes"
-                else:
-                    stats["agro"] = "No"
-
-                skills = []
-                skill_list = npc.find("skills")
-                for skill in skill_list.find_all("skill"):
-                    skills.append(Skill(int(skill["id"]), int(skill["level"])))
-                npc_data[npc_id]["skills"] = skills
-
-                npc_data[npc_id]["stats"] = stats
-
-                drop_list = npc.find("drops")
-
-                if drop_list is None:
-                    continue
-
-                categories = drop_list.find_all("category")
-                for category in categories:
-                    drops = category.find_all("drop")
-                    for drop in drops:
-
-                        id = eval(drop["itemid"])
-                        min_amt = eval(drop["min"])
-                        max_amt = eval(drop["max"])
-                        chance = eval(drop["chance"]) / 1e6
-
-                        cat = eval(category["id"])
-                        if cat != -1:
-                            npc_data[npc_id]["drop"].append(
-                                [id, min_amt, max_amt, chance, self.item_data[id].name]
-                            )
-                        else:
-                            # id == -1 means spoil
-                            npc_data[npc_id]["spoil"].append(
-                                [id, min_amt, max_amt, chance, self.item_data[id].name]
-                            )
+        parse_file = partial(parse_npc_file, stat_names=self.stats)
+        for file_data in self.parse_files("npc_xml", parse_file, npc_files, jobs):
+            npc_data.update(file_data)
 
+        rows, item_names = [], {}
+        for npc_id, npc in npc_data.items():
+            for spoil, drop_type in enumerate(["drop", "spoil"]):
+                for drop in npc[drop_type]:
+                    id, min_amt, max_amt, chance, category = drop
+                    rows.append((npc_id, id, category, min_amt, max_amt, chance, spoil))
+
+                    # Item names are resolved here, after the merge, so workers don't need
+                    # item_data. The name replaces the category, which is kept in drop_table:
+                    item_names[id] = self.item_data[id].name
+                    drop[4] = item_names[id]
+
+        self.drop_table = DropTable.from_rows(rows, item_names)
         return npc_data
 
+    def parse_files(self, kind, func, files, jobs=1):
+        """Parses each file with func, reusing cached results for unchanged files
+
+        Parameters
+        ----------
+        kind : string
+            Name of the type of data stored in the cache
+        func : callable
+            Picklable function taking a file path and returning its parsed contents
+        files : list
+            List of file paths to be parsed
+        jobs : int
+            Number of worker processes to parse the changed files with
+
+        Returns
+        -------
+        list
+            Parsed contents of each file, in the same order as files
+
+        """
+        if self.cache is None:
+            return map_files(func, files, jobs)
+
+        file_data = {}
+        for file in files:
+            file_data[file] = self.cache.get(kind, file, self.VERSION)
+
+        changed = [file for file in files if file_data[file] is None]
+        for file, data in zip(changed, map_files(func, changed, jobs)):
+            self.cache.put(kind, file, self.VERSION, data)
+            file_data[file] = data
+
+        return [file_data[file] for file in files]
+
+
+def map_files(func, files, jobs=1):
+    """Applies func to each file, optionally across a pool of worker processes
+
+    Parameters
+    ----------
+    func : callable
+        Picklable function taking a file path
+    files : list
+        List of file paths to be processed
+    jobs : int
+        Number of worker processes to use (1 processes the files in this process)
+
+    Returns
+    -------
+    list
+        Results of func, in the same order as files
+
+    """
+    if jobs is None or jobs <= 1 or len(files) <= 1:
+        return [func(file) for file in files]
+
+    with ProcessPoolExecutor(max_workers=min(jobs, len(files))) as pool:
+        return list(pool.map(func, files))
+
+
+def parse_item_file(path):
+    """Parses a single item XML file
+
+    Parameters
+    ----------
+    path : string
+        Path of item XML file
+
+    Returns
+    -------
+    dict
+        Dict mapping item id to Item
+
+    """
+    item_data = {}
+    for item in iter_elements(path, "item"):
+        attrs = get_attrs(item)
+        item_id = eval(attrs["id"])
+        item_name = attrs["name"]
+        item_type = attrs["type"]
+        try:
+            crystal_count = int(find_set(item, "crystal_count")["val"])
+            crystal_type = find_set(item, "crystal_type")["val"]
+        except:
+            crystal_count = crystal_type = None
+
+        crystal = Crystal(crystal_count, crystal_type)
+        item_data[item_id] = Item(item_name, item_type, crystal)
+    return item_data
+
+
+def parse_npc_file(path, stat_names):
+    """Parses a single NPC XML file
+    Note: Drop and spoil rows are returned as [id, min, max, chance, category], and
+          the category is replaced with the item name by NpcParser.parse_npc_xml once
+          all files are merged
+
+    Parameters
+    ----------
+    path : string
+        Path of NPC XML file
+    stat_names : set
+        Names (lower case) of the stats to extract
+
+    Returns
+    -------
+    dict
+        Dict mapping NPC id to the information of that NPC
+
+    """
+    file = os.path.basename(path)
+    npc_data = {}
+    for npc in iter_elements(path, "npc"):
+        attrs = get_attrs(npc)
+        npc_id = eval(attrs["id"])
+        npc_name = attrs["name"]
+        npc_title = attrs["title"]
+
+        npc_data[npc_id] = {
+            "name": npc_name,
+            "title": npc_title,
+            "file": file,
+            "stats": [],
+            "drop": [],
+            "spoil": [],
+        }
+
+        stats = {}
+        for stat in npc.iter("set"):
+            stat = get_attrs(stat)
+            stat_name = stat["name"].lower()
+            if stat_name in stat_names:  # If it's a stat we're interested in:
+                try:  # If stat is numerical, then round:
+                    stats[stat_name] = str(round(eval(stat["val"])))
+                except NameError:  # Otherwise:
+                    stats[stat_name] = stat["val"]
+            elif stat_name == "dropherbgroup":
+                if stat["val"] != "0":
+                    stats["herbs"] = "Yes"
+                else:
+                    stats["herbs"] = "No"
+
+        ai = get_attrs(npc.find(".//ai"))
+        if "aggro" in ai and ai["aggro"] != "0":
+            stats["agro"] = "Yes"
+        else:
+            stats["agro"] = "No"
+
+        skills = []
+        skill_list = npc.find(".//skills")
+        for skill in skill_list.iter("skill"):
+            skill = get_attrs(skill)
+            skills.append(Skill(int(skill["id"]), int(skill["level"])))
+        npc_data[npc_id]["skills"] = skills
+
+        npc_data[npc_id]["stats"] = stats
+
+        drop_list = npc.find(".//drops")
+
+        if drop_list is None:
+            continue
+
+        for category in drop_list.iter("category"):
+            cat = eval(get_attrs(category)["id"])
+            for drop in category.iter("drop"):
+                drop = get_attrs(drop)
+
+                id = eval(drop["itemid"])
+                min_amt = eval(drop["min"])
+                max_amt = eval(drop["max"])
+                chance = eval(drop["chance"]) / 1e6
+
+                if cat != -1:
+                    npc_data[npc_id]["drop"].append([id, min_amt, max_amt, chance, cat])
+                else:
+                    # id == -1 means spoil
+                    npc_data[npc_id]["spoil"].append([id, min_amt, max_amt, chance, cat])
+
+    return npc_data
+
+
+def iter_elements(path, tag):
+    """Streams the top-level elements with the given tag from an XML file
+    Each element is yielded once fully parsed, and is cleared (along with the
+    document root) as soon as the caller is done with it, so memory use is
+    bounded by the size of a single element rather than the whole document
+
+    Parameters
+    ----------
+    path : string
+        Path of XML file to be parsed
+    tag : string
+        Tag of the elements to be yielded (e.g. "npc" or "item")
+
+    Yields
+    ------
+    xml.etree.ElementTree.Element
+        Fully parsed element with the requested tag
+
+    """
+    root = None
+    depth = 0
+    for event, elem in ET.iterparse(path, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = elem
+            depth += 1
+            continue
+
+        depth -= 1
+        if depth == 1 and elem.tag == tag:
+            yield elem
+            root.clear()  # Drop the processed element (and any preceding siblings)
+
+
+def get_attrs(elem):
+    """Returns the attributes of an element with lower case keys, matching the
+    attribute names seen when the XMLs were parsed with html.parser
+
+    Parameters
+    ----------
+    elem : xml.etree.ElementTree.Element
+        Element whose attributes are to be returned
+
+    Returns
+    -------
+    dict
+        Dict mapping lower case attribute name to attribute value
+
+    """
+    return {key.lower(): val for key, val in elem.attrib.items()}
+
+
+def find_set(elem, name):
+    """Finds the first <set> element below elem with the given name attribute
+
+    Parameters
+    ----------
+    elem : xml.etree.ElementTree.Element
+        Element to search below
+    name : string
+        Value of the name attribute to match
+
+    Returns
+    -------
+    dict
+        Attributes of the matching <set> element (see get_attrs)
+
+    Raises
+    ------
+    KeyError
+        If no matching <set> element exists
+
+    """
+    for child in elem.iter("set"):
+        attrs = get_attrs(child)
+        if attrs.get("name") == name:
+            return attrs
+    raise KeyError(name)
+
 
 if __name__ == "__main__":
     parser = NpcParser()
@@ -5,21 +5,39 @@ from bs4 import BeautifulSoup
 from collections import namedtuple
 import utils
 
+SkillData = namedtuple("SkillData", ["name", "desc", "icon"])
+Skill = namedtuple("Skill", ["id", "level"])
+
 
 class SkillParser:
-    def __init__(self, skill_dir=None):
+    VERSION = 1  # Bump whenever the parsed output changes, to invalidate cached results
+
+    def __init__(self, skill_dir=None, cache=None):
         self.util_dir = os.path.dirname(os.path.realpath(__file__))
-        self.SkillData = namedtuple("SkillData", ["name", "desc", "icon"])
+        self.SkillData = SkillData
         self.dat_path = os.path.join(self.util_dir, "..", "server_data", "dat_files")
-        self.Skill = namedtuple("Skill", ["id", "level"])
+        self.Skill = Skill
+        self.cache = cache  # Optional ParseCache storing the parsed contents of each file
 
     def parse(self):
         self.skill_data = self.create_skill_db()
         self.skill_order = self.get_skill_order()
         return self.skill_data, self.skill_order
 
+    def load(self, fname, parse_func):
+        """Parses the .dat file fname with parse_func, using the cache if available"""
+        if self.cache is None:
+            return parse_func(fname)
+        path = os.path.join(self.dat_path, fname)
+        return self.cache.load(
+            "skill_dat", path, self.VERSION, lambda path: parse_func(os.path.basename(path))
+        )
+
     def get_skill_order(self):
-        lines = utils.read_encrypted(self.dat_path, "npcgrp.dat")
+        return self.load("npcgrp.dat", self.parse_skill_order)
+
+    def parse_skill_order(self, fname):
+        lines = utils.read_encrypted(self.dat_path, fname, cache=self.cache)
 
         header = lines[0].split("\t")
         skill_cols = []
@@ -49,7 +67,19 @@ class SkillParser:
         return skill_order
 
     def create_skill_db(self):
-        lines = utils.read_encrypted(self.dat_path, "skillgrp.dat")
+        skill_icons = self.load("skillgrp.dat", self.parse_skill_icons)
+        skill_names = self.load("skillname-e.dat", self.parse_skill_names)
+
+        skill_data = {}
+        for id, levels in skill_names.items():
+            skill_data[id] = {}
+            for level, (name, desc) in levels.items():
+                skill_data[id][level] = self.SkillData(name, desc, skill_icons[id][level])
+
+        return skill_data
+
+    def parse_skill_icons(self, fname):
+        lines = utils.read_encrypted(self.dat_path, fname, cache=self.cache)
 
         skill_icons = {}
         for line in lines[1:]:
@@ -59,10 +89,12 @@ class SkillParser:
             if id not in skill_icons:
                 skill_icons[id] = {}
             skill_icons[id][level] = icon
+        return skill_icons
 
-        lines = utils.read_encrypted(self.dat_path, "skillname-e.dat")
+    def parse_skill_names(self, fname):
+        lines = utils.read_encrypted(self.dat_path, fname, cache=self.cache)
 
-        skill_data = {}
+        skill_names = {}
         for line in lines[1:]:
             line = line.split("\t")
             id, level = int(line[0]), int(line[1])
@@ -71,11 +103,11 @@ class SkillParser:
             if desc == "none":
                 desc = ""
 
-            if id not in skill_data:
-                skill_data[id] = {}
-            skill_data[id][level] = self.SkillData(name, desc, skill_icons[id][level])
+            if id not in skill_names:
+                skill_names[id] = {}
+            skill_names[id][level] = (name, desc)
 
-        return skill_data
+        return skill_names
 
 
 if __name__ == "__main__":
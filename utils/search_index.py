@@ -0,0 +1,118 @@
+import os
+import re
+import json
+
+
+class SearchIndex:
+    def __init__(self, prefix_len=2, id_bucket=1000):
+        """Search index of names, split into small JSON shards loaded on demand
+        Names are split into normalized tokens (see tokenize), and each token is stored
+        in the shard named after its first prefix_len characters, along with the metadata
+        of every entry containing it. Tokens are also stored in the shards of their
+        shorter prefixes (e.g. "adena" in "a.json"), for query tokens shorter than
+        prefix_len. A client only needs the shard of one query token (up to its first
+        prefix_len characters) to find every entry whose tokens start with the query's
+        tokens. Entries are also stored by id, in shards of id_bucket consecutive ids,
+        for direct id lookups
+
+        Parameters
+        ----------
+        prefix_len : int
+            Number of leading token characters used to pick a token's shard
+        id_bucket : int
+            Number of consecutive ids stored in each id shard
+
+        """
+        self.prefix_len = prefix_len
+        self.id_bucket = id_bucket
+        self.entries = {}  # Maps family (e.g. "npc") to a dict mapping id to (name, meta)
+
+    def add(self, family, id, name, meta=()):
+        """Adds an entry to the index
+
+        Parameters
+        ----------
+        family : string
+            Type of the entry (e.g. "npc" or "item"), indexed separately
+        id : int
+            Id of the entry
+        name : string
+            Name of the entry, which is tokenized for search
+        meta : tuple
+            Extra JSON-serializable values shown in search results (e.g. NPC level)
+
+        """
+        if family not in self.entries:
+            self.entries[family] = {}
+        self.entries[family][id] = (name, *meta)
+
+    def shards(self):
+        """Splits the index into shards
+
+        Returns
+        -------
+        dict
+            Dict mapping shard path (e.g. "an.json" or "id/20.json") to a dict mapping
+            each family to {"tokens": {token: [ids]}, "data": {id: [name, *meta]}}
+            (id shards have no "tokens")
+
+        """
+        shards = {}
+        for family, entries in self.entries.items():
+            for id, entry in entries.items():
+                id_path = f"id/{id // self.id_bucket}.json"
+                self.shard_family(shards, id_path, family, tokens=False)["data"][id] = entry
+
+                for token in sorted(set(tokenize(entry[0]))):
+                    # Tokens are stored in the shard of each of their prefixes, up to
+                    # prefix_len characters, so query tokens shorter than that also work:
+                    for n in range(1, min(len(token), self.prefix_len) + 1):
+                        shard = self.shard_family(shards, f"{token[:n]}.json", family)
+                        shard["tokens"].setdefault(token, []).append(id)
+                        shard["data"][id] = entry
+        return shards
+
+    def shard_family(self, shards, path, family, tokens=True):
+        """Returns the part of the shard at path holding family, creating it if needed"""
+        if path not in shards:
+            shards[path] = {}
+        if family not in shards[path]:
+            shards[path][family] = {"tokens": {}, "data": {}} if tokens else {"data": {}}
+        return shards[path][family]
+
+    def write(self, path):
+        """Writes every shard to the directory path, and removes shards left from old builds
+
+        Parameters
+        ----------
+        path : string
+            Path of directory to write the index to
+
+        Returns
+        -------
+        int
+            Number of shards written
+
+        """
+        shards = self.shards()
+        for shard_path, shard in shards.items():
+            fname = os.path.join(path, shard_path)
+            if not os.path.exists(os.path.dirname(fname)):
+                os.makedirs(os.path.dirname(fname), exist_ok=True)
+            with open(fname, "w", encoding="utf-8") as f:
+                json.dump(shard, f, separators=(",", ":"), ensure_ascii=False)
+
+        for dir_path, _, fnames in os.walk(path):
+            for fname in fnames:
+                shard_path = os.path.relpath(os.path.join(dir_path, fname), path)
+                if fname.endswith(".json") and shard_path.replace(os.sep, "/") not in shards:
+                    os.remove(os.path.join(dir_path, fname))
+        return len(shards)
+
+
+def tokenize(name):
+    """Splits a name into lowercase tokens of letters and digits (in any script), e.g.
+    "Queen's Ant" -> queen, s, ant. The search page's JavaScript tokenizes queries the
+    same way
+    """
+    return re.findall(r"[^\W_]+", name.lower())
@@ -0,0 +1,193 @@
+import os
+import re
+import gzip
+import json
+import hashlib
+import posixpath
+
+try:
+    import brotli  # Optional, only needed for .br files
+except ImportError:
+    brotli = None
+
+# References to other files in HTML attributes and CSS url()s:
+REFERENCE_REGEX = re.compile(
+    r"""(?P<attr>\b(?:src|href|background)\s*=\s*)(?P<quote>["'])(?P<url>[^"'<>]*)(?P=quote)"""
+    r"""|(?P<css>url\(\s*)(?P<css_quote>["']?)(?P<css_url>[^"')]*)(?P=css_quote)\s*\)""",
+    re.IGNORECASE,
+)
+# Hashed asset names, e.g. flag.0123456789.gif:
+HASHED_REGEX = re.compile(r"\.[0-9a-f]{10}(\.[^./]+)$")
+
+
+class SiteFinalizer:
+    # Text files that are rewritten and compressed:
+    TEXT_EXTENSIONS = [".html", ".css", ".js", ".json"]
+
+    def __init__(self, site_path, dist_path, asset_dirs=("img", "css", "js")):
+        """Builds a deployable copy of a generated site, for serving with long-lived caching
+        Every file under asset_dirs is also stored under a name containing a hash of its
+        contents (e.g. js/recipe.0123456789.js), and references to assets in HTML and CSS
+        are rewritten to the hashed names, so the hashed files never change and can be
+        served with immutable cache headers. Unhashed copies are kept for references
+        built at run time by scripts. Every HTML, CSS, JS, and JSON file gets .gz (and
+        .br, if the brotli module is installed) siblings for serving precompressed
+
+        A manifest in dist_path records the asset names and the hash of each file, so
+        only files that changed since the last run are rewritten and recompressed
+
+        Parameters
+        ----------
+        site_path : string
+            Path of the generated site
+        dist_path : string
+            Path to write the finalized site to
+        asset_dirs : tuple
+            Directories of the site (relative to site_path) containing static assets
+
+        """
+        self.site_path = site_path
+        self.dist_path = dist_path
+        self.asset_dirs = asset_dirs
+        self.manifest_path = os.path.join(dist_path, "asset-manifest.json")
+
+        try:
+            with open(self.manifest_path, "r") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = {"assets": {}, "files": {}}
+        self.old_files = manifest["files"]  # Maps file path to the hash of its contents
+        self.assets = {}  # Maps asset path to hashed asset path
+        self.files = {}
+        self.written = 0
+
+    def run(self):
+        """Finalizes the site
+
+        Returns
+        -------
+        tuple
+            (n_files, n_written) numbers of files in the site, and files written
+
+        """
+        paths = []
+        for dir_path, _, fnames in os.walk(self.site_path):
+            for fname in fnames:
+                if fname.startswith("."):
+                    continue  # Build manifests and temporary files aren't part of the site
+                path = os.path.relpath(os.path.join(dir_path, fname), self.site_path)
+                paths.append(path.replace(os.sep, "/"))
+
+        # Assets are finalized first, with style sheets after the images they refer to:
+        assets = [path for path in paths if path.split("/")[0] in self.asset_dirs]
+        pages = [path for path in paths if path.split("/")[0] not in self.asset_dirs]
+        assets.sort(key=lambda path: (path.endswith(".css"), path))
+
+        for path in assets:
+            raw = self.finalize_file(path)
+            name, ext = posixpath.splitext(path)
+            hashed_path = f"{name}.{hashlib.sha1(raw).hexdigest()[:10]}{ext}"
+            self.write(hashed_path, raw)
+            self.assets[path] = hashed_path
+        for path in pages:
+            self.finalize_file(path)
+
+        self.remove_stale()
+        manifest = {"assets": self.assets, "files": self.files}
+        with open(self.manifest_path, "w") as f:
+            json.dump(manifest, f, indent=0, sort_keys=True)
+
+        return len(paths), self.written
+
+    def finalize_file(self, path):
+        """Copies a file to dist_path, rewriting the references in text files
+
+        Parameters
+        ----------
+        path : string
+            Path of the file relative to site_path, with "/" separators
+
+        Returns
+        -------
+        bytes
+            Finalized contents of the file
+
+        """
+        with open(os.path.join(self.site_path, path), "rb") as f:
+            raw = f.read()
+        if posixpath.splitext(path)[1] in [".html", ".css"]:
+            raw = self.rewrite(raw.decode("utf8"), posixpath.dirname(path)).encode("utf8")
+        self.write(path, raw)
+        return raw
+
+    def rewrite(self, text, base):
+        """Replaces the references to assets in text with references to the hashed assets
+
+        Parameters
+        ----------
+        text : string
+            Contents of an HTML or CSS file
+        base : string
+            Directory of the file, relative to site_path
+
+        Returns
+        -------
+        string
+            Contents with rewritten references
+
+        """
+
+        def replace(match):
+            url_group = "url" if match.group("url") is not None else "css_url"
+            url = match.group(url_group)
+            if re.match(r"^([a-z][a-z0-9+.-]*:|//|#)", url, re.IGNORECASE):
+                return match.group()  # Absolute URLs and fragments are left as they are
+
+            # Asset URLs may have a version, which the hash replaces:
+            path = url.split("#")[0].split("?")[0]
+            asset = posixpath.normpath(posixpath.join(base, path))
+            if asset not in self.assets:
+                return match.group()
+            hashed = posixpath.basename(self.assets[asset])
+            new_url = f"{posixpath.dirname(path)}/{hashed}" if "/" in path else hashed
+
+            start, end = (i - match.start() for i in match.span(url_group))
+            return match.group()[:start] + new_url + match.group()[end:]
+
+        return REFERENCE_REGEX.sub(replace, text)
+
+    def write(self, path, raw):
+        """Writes a file to dist_path (with compressed siblings), unless it's unchanged"""
+        file_hash = hashlib.sha1(raw).hexdigest()
+        self.files[path] = file_hash
+        dist_file = os.path.join(self.dist_path, *path.split("/"))
+        compress = posixpath.splitext(path)[1] in self.TEXT_EXTENSIONS
+        unchanged = self.old_files.get(path) == file_hash and os.path.isfile(dist_file)
+        missing_br = compress and brotli is not None and not os.path.isfile(f"{dist_file}.br")
+        if unchanged and not missing_br:
+            return
+
+        if not os.path.exists(os.path.dirname(dist_file)):
+            os.makedirs(os.path.dirname(dist_file), exist_ok=True)
+        with open(dist_file, "wb") as f:
+            f.write(raw)
+        if compress:
+            # Compressed without a timestamp, so unchanged files compress identically:
+            with open(f"{dist_file}.gz", "wb") as f:
+                f.write(gzip.compress(raw, compresslevel=9, mtime=0))
+            if brotli is not None:
+                with open(f"{dist_file}.br", "wb") as f:
+                    f.write(brotli.compress(raw))
+        self.written += 1
+
+    def remove_stale(self):
+        """Removes files of old builds from dist_path, except hashed assets
+        Hashed assets are kept, since pages cached by browsers may still refer to them
+        """
+        for path in self.old_files:
+            if path in self.files or HASHED_REGEX.search(path):
+                continue
+            dist_file = os.path.join(self.dist_path, *path.split("/"))
+            for fname in [dist_file, f"{dist_file}.gz", f"{dist_file}.br"]:
+                if os.path.isfile(fname):
+                    os.remove(fname)
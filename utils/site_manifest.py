@@ -0,0 +1,96 @@
+import os
+import json
+import hashlib
+
+from .utils import write_atomic
+
+
+class SiteManifest:
+    def __init__(self, path, version):
+        """Record of the inputs each generated page was last built from
+        Each page is stored with a fingerprint of the data it was rendered from, so a
+        rebuild only needs to render pages whose fingerprint changed. The whole record
+        is discarded when version changes (e.g. when the page templates are edited).
+        Any other generated files (e.g. map tiles) can be tracked the same way
+
+        Parameters
+        ----------
+        path : string
+            Path of the JSON file the manifest is stored in
+        version : string
+            Version of the page generator, compared with the version of the stored manifest
+
+        """
+        self.path = path
+        self.version = version
+        self.pages = {}  # Maps page path (relative to the site) to its fingerprint
+
+        try:
+            with open(path, "r") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return
+        if manifest.get("version") == version:
+            self.pages = manifest["pages"]
+
+    def changes(self, pages, site_path=None):
+        """Compares the fingerprints of the current pages with the stored ones
+
+        Parameters
+        ----------
+        pages : dict
+            Dict mapping page path to the fingerprint of its current inputs
+        site_path : string
+            If given, pages whose file is missing from site_path are also out of date
+
+        Returns
+        -------
+        tuple
+            (dirty, removed) where dirty is the set of pages that need rendering, and
+            removed is the list of stored pages that no longer exist
+
+        """
+        dirty = set()
+        for page, fingerprint in pages.items():
+            if self.pages.get(page) != fingerprint:
+                dirty.add(page)
+            elif site_path is not None and not os.path.isfile(os.path.join(site_path, page)):
+                dirty.add(page)
+        removed = [page for page in self.pages if page not in pages]
+        return dirty, removed
+
+    def remove(self, pages, site_path, prune=False):
+        """Deletes the files of pages (e.g. the removed pages returned by changes)
+
+        Parameters
+        ----------
+        pages : list
+            List of page paths, relative to site_path
+        site_path : string
+            Directory the pages are in
+        prune : bool
+            If enabled, directories left empty below site_path are also deleted
+
+        """
+        for page in pages:
+            fname = os.path.join(site_path, page)
+            if os.path.isfile(fname):
+                os.remove(fname)
+            dir_path = os.path.dirname(fname)
+            while prune and os.path.realpath(dir_path) != os.path.realpath(site_path):
+                if not os.path.isdir(dir_path) or os.listdir(dir_path):
+                    break
+                os.rmdir(dir_path)
+                dir_path = os.path.dirname(dir_path)
+
+    def save(self, pages):
+        """Replaces the stored fingerprints with pages and writes the manifest to disk"""
+        self.pages = dict(pages)
+        manifest = {"version": self.version, "pages": self.pages}
+        path, fname = os.path.split(self.path)
+        write_atomic(path, fname, json.dumps(manifest, sort_keys=True).encode("utf8"))
+
+
+def fingerprint(*inputs):
+    """Returns a SHA-1 hex digest identifying inputs, which are compared by their repr"""
+    return hashlib.sha1(repr(inputs).encode("utf8")).hexdigest()
@@ -0,0 +1,113 @@
+import os
+import hashlib
+import numpy as np
+import cv2
+
+from .utils import write_atomic
+from .site_manifest import SiteManifest
+from .world_grid import WorldGrid
+
+
+class SpawnHeatmaps:
+    VERSION = 1  # Bump whenever the way overlays are drawn changes, to rewrite them all
+
+    def __init__(self, spawn_table, bounds, heatmap_path, cell_size=2048, scale=2):
+        """Density heatmaps of the spawn points of a SpawnTable, as translucent overlays
+        Every spawn point is assigned to a cell of a grid over the world once, and the
+        heatmap of any subset of the points is a 2D histogram of their cells. Overlays
+        are written as {key}.png, where key names the subset, and a manifest records a
+        hash of each overlay's histogram so unchanged overlays aren't rendered again
+
+        Parameters
+        ----------
+        spawn_table : SpawnTable
+            Spawn points to draw
+        bounds : tuple
+            (x_min, x_max, y_min, y_max) of the world, covered by the overlays. The
+            overlays' top left corner is (x_min, y_min)
+        heatmap_path : string
+            Directory to write the overlays to
+        cell_size : int
+            Width and height of each cell of the grid, in world units
+        scale : int
+            Number of overlay pixels along each side of a cell
+
+        """
+        self.heatmap_path = heatmap_path
+        self.manifest_path = os.path.join(heatmap_path, "heatmaps.json")
+        self.scale = scale
+        self.grid = WorldGrid(bounds, cell_size)
+        rows = spawn_table.rows
+        self.cells = self.grid.cells(rows["x"], rows["y"])  # Cell of each row of the table
+        self.written = 0  # Number of overlays written by build
+
+    def density(self, mask):
+        """Counts the spawn points selected by mask in each cell
+
+        Parameters
+        ----------
+        mask : numpy.ndarray
+            Boolean array selecting rows of spawn_table.rows
+
+        Returns
+        -------
+        numpy.ndarray
+            Array of shape (ny, nx) with the number of points in each cell, where row 0
+            is the top of the overlay
+
+        """
+        counts = np.bincount(self.cells[mask], minlength=self.grid.n_cells)
+        return counts.reshape(self.grid.ny, self.grid.nx)
+
+    def render(self, density):
+        """Renders a density histogram as a translucent BGRA image
+        Densities are shown on a log scale (so a few dense camps don't hide everything
+        else), with cells without spawns left fully transparent
+        """
+        density = cv2.GaussianBlur(density.astype(np.float32), (0, 0), 0.8)
+        peak = density.max()
+        level = np.log1p(density) / np.log1p(peak) if peak > 0 else density
+        size = (self.grid.nx * self.scale, self.grid.ny * self.scale)
+        level = np.clip(cv2.resize(level, size, interpolation=cv2.INTER_LINEAR), 0, 1)
+
+        image = cv2.applyColorMap((level * 255).astype(np.uint8), cv2.COLORMAP_JET)
+        alpha = np.where(level > 0.02, 80 + 150 * level, 0).astype(np.uint8)
+        return np.dstack([image, alpha])
+
+    def build(self, masks):
+        """Writes the overlay of each subset of the spawn points, if its density changed
+
+        Parameters
+        ----------
+        masks : dict
+            Dict mapping the key of each overlay to a boolean array selecting its rows
+            of spawn_table.rows
+
+        Returns
+        -------
+        dict
+            Dict mapping the key of each overlay to (n_spawns, hash) with the number of
+            spawn points in it and a hash of its contents
+
+        """
+        heatmaps = {}
+        overlays = {}  # Maps file name to the hash of the overlay's density
+        densities = {}
+        for key, mask in masks.items():
+            fname = f"{key}.png"
+            densities[fname] = self.density(mask)
+            heatmap_hash = hashlib.sha1(densities[fname].tobytes())
+            heatmap_hash.update(repr((densities[fname].shape, self.scale)).encode())
+            overlays[fname] = heatmap_hash.hexdigest()
+            heatmaps[key] = (int(mask.sum()), overlays[fname])
+
+        manifest = SiteManifest(self.manifest_path, self.VERSION)
+        dirty, removed = manifest.changes(overlays, self.heatmap_path)
+        for fname in sorted(dirty):
+            image = self.render(densities[fname])
+            _, png = cv2.imencode(".png", image, [cv2.IMWRITE_PNG_COMPRESSION, 9])
+            write_atomic(self.heatmap_path, fname, png.tobytes())
+        self.written += len(dirty)
+        manifest.remove(removed, self.heatmap_path)
+        manifest.save(overlays)
+        return heatmaps
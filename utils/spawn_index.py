@@ -0,0 +1,145 @@
+import numpy as np
+
+from .world_grid import WorldGrid
+
+
+class SpawnIndex(WorldGrid):
+    def __init__(self, spawn_table, bounds=None, cell_size=2048):
+        """Grid index over the spawn points of a SpawnTable, for spatial queries
+        The world is split into square cells, and the spawn points are sorted by cell
+        (row by row), so the points in a horizontal run of cells are a contiguous slice.
+        A query only tests the points in the cells overlapping its area
+
+        Parameters
+        ----------
+        spawn_table : SpawnTable
+            Spawn points to index
+        bounds : tuple
+            (x_min, x_max, y_min, y_max) of the world (defaults to the extent of the
+            spawn points, if any). Points outside are kept in the cells along the edges
+        cell_size : int
+            Width and height of each cell, in world units
+
+        """
+        self.spawn_table = spawn_table
+        rows = spawn_table.rows
+        if bounds is None and len(rows) == 0:
+            bounds = (0, 0, 0, 0)  # A single cell, as an empty table has no extent
+        elif bounds is None:
+            bounds = (rows["x"].min(), rows["x"].max(), rows["y"].min(), rows["y"].max())
+        super().__init__(bounds, cell_size)
+
+        cells = self.cells(rows["x"], rows["y"])
+        self.order = np.argsort(cells, kind="stable")  # Row of the table for each point
+        self.x = rows["x"][self.order].astype(np.int64)
+        self.y = rows["y"][self.order].astype(np.int64)
+        # Points in cell i are at self.order[self.starts[i] : self.starts[i + 1]]:
+        self.starts = np.r_[0, np.cumsum(np.bincount(cells, minlength=self.n_cells))]
+
+    def candidates(self, x_min, y_min, x_max, y_max):
+        """Returns the indices of the sorted points in every cell overlapping a box"""
+        cx_min, cx_max = int(self.cell_x(x_min)), int(self.cell_x(x_max))
+        cy_min, cy_max = int(self.cell_y(y_min)), int(self.cell_y(y_max))
+        if x_max < x_min or y_max < y_min:
+            return np.zeros(0, dtype=np.int64)
+
+        # Each row of cells in the box is one contiguous slice of the sorted points:
+        rows = np.arange(cy_min, cy_max + 1) * self.nx
+        starts = self.starts[rows + cx_min]
+        ends = self.starts[rows + cx_max + 1]
+        if len(rows) == 1:
+            return np.arange(starts[0], ends[0])
+        return np.concatenate([np.arange(s, e) for s, e in zip(starts, ends)])
+
+    def box(self, x_min, y_min, x_max, y_max):
+        """Finds the spawn points inside a box (including its edges)
+
+        Parameters
+        ----------
+        x_min, y_min, x_max, y_max : int
+            World coordinates of the corners of the box
+
+        Returns
+        -------
+        numpy.ndarray
+            Indices of the points in spawn_table.rows
+
+        """
+        i = self.candidates(x_min, y_min, x_max, y_max)
+        x, y = self.x[i], self.y[i]
+        inside = (x >= x_min) & (x <= x_max) & (y >= y_min) & (y <= y_max)
+        return self.order[i[inside]]
+
+    def radius(self, x, y, r):
+        """Finds the spawn points within distance r of (x, y)
+
+        Parameters
+        ----------
+        x, y : int
+            World coordinates of the center of the circle
+        r : float
+            Radius of the circle, in world units
+
+        Returns
+        -------
+        numpy.ndarray
+            Indices of the points in spawn_table.rows, in no particular order
+
+        """
+        i = self.candidates(x - r, y - r, x + r, y + r)
+        dist2 = (self.x[i] - x) ** 2 + (self.y[i] - y) ** 2
+        return self.order[i[dist2 <= r * r]]
+
+    def nearest(self, x, y, n=1):
+        """Finds the n spawn points closest to (x, y)
+
+        Parameters
+        ----------
+        x, y : int
+            World coordinates of the point to search around
+        n : int
+            Number of spawn points to return
+
+        Returns
+        -------
+        tuple
+            (rows, distances) where rows are the indices of the points in
+            spawn_table.rows, in order of increasing distance
+
+        """
+        n = min(n, len(self.order))
+        r = self.cell_size
+        # Search within a growing radius, until it contains at least n points or the
+        # search box covers the whole grid (when every point is a candidate):
+        while True:
+            i = self.candidates(x - r, y - r, x + r, y + r)
+            dist2 = (self.x[i] - x) ** 2 + (self.y[i] - y) ** 2
+            if len(i) == len(self.order):
+                break
+            within = dist2 <= r * r
+            if within.sum() >= n:
+                i, dist2 = i[within], dist2[within]
+                break
+            r *= 2
+
+        if len(i) > n:
+            nearest = np.argpartition(dist2, n - 1)[:n]
+            i, dist2 = i[nearest], dist2[nearest]
+        order = np.argsort(dist2, kind="stable")
+        return self.order[i[order]], np.sqrt(dist2[order])
+
+    def npc_counts(self, rows):
+        """Counts the spawn points of each NPC among the given rows of spawn_table
+
+        Parameters
+        ----------
+        rows : numpy.ndarray
+            Indices of points in spawn_table.rows, e.g. as returned by a query
+
+        Returns
+        -------
+        tuple
+            (npc_ids, counts) arrays, in order of NPC id
+
+        """
+        return np.unique(self.spawn_table.rows["npc_id"][rows], return_counts=True)
@@ -0,0 +1,63 @@
+import numpy as np
+
+SPAWN_DTYPE = np.dtype(
+    [
+        ("npc_id", "<i4"),
+        ("x", "<i4"),
+        ("y", "<i4"),
+        ("z", "<i4"),
+        ("heading", "<i4"),
+        ("respawn_delay", "<i4"),  # Seconds
+        ("respawn_rand", "<i4"),  # Seconds
+        ("period_of_day", "<i1"),  # 0 = always, 1 = day only, 2 = night only
+        ("source", "<i1"),  # Index of the spawn file in SpawnParser.SOURCES
+    ]
+)
+
+
+class SpawnTable:
+    def __init__(self, rows=None):
+        """Columnar table of NPC spawn points, with the rows of each NPC stored together
+        Rows are sorted by NPC id (keeping the order they were parsed in for each NPC),
+        so the spawns of an NPC are a contiguous slice of the columns
+
+        Parameters
+        ----------
+        rows : numpy.ndarray
+            Structured array with dtype SPAWN_DTYPE
+
+        """
+        rows = np.zeros(0, dtype=SPAWN_DTYPE) if rows is None else rows
+        self.rows = rows[np.argsort(rows["npc_id"], kind="stable")]
+
+        # Index mapping each NPC id to the (start, end) range of its rows:
+        npc_ids, starts = np.unique(self.rows["npc_id"], return_index=True)
+        ends = np.r_[starts[1:], len(self.rows)]
+        self.index = dict(zip(npc_ids.tolist(), zip(starts.tolist(), ends.tolist())))
+
+    def __len__(self):
+        """Returns the number of NPCs with spawns (use len(self.rows) for spawn points)"""
+        return len(self.index)
+
+    def __contains__(self, npc_id):
+        return npc_id in self.index
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __getitem__(self, key):
+        """Returns the rows of an NPC by id, or a single column by name"""
+        if isinstance(key, str):
+            return self.rows[key]
+        start, end = self.index[key]
+        return self.rows[start:end]
+
+    def get(self, npc_id, default=None):
+        return self[npc_id] if npc_id in self.index else default
+
+    def keys(self):
+        return self.index.keys()
+
+    def items(self):
+        for npc_id in self.index:
+            yield npc_id, self[npc_id]
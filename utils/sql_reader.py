@@ -0,0 +1,200 @@
+import re
+
+# Literal values in a MySQL dump:
+STRING = r"'(?:[^'\\]|\\.|'')*'"
+NUMBER = r"-?[0-9]+(?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?"
+WORD = r"[A-Za-z_][A-Za-z0-9_$]*"
+LITERAL = rf"(?:{STRING}|{NUMBER}|(?i:NULL|TRUE|FALSE))"
+# Values in the text of a row, capturing the contents of a string, a number, or a word:
+VALUE_REGEX = re.compile(rf"'((?:[^'\\]|\\.|'')*)'|({NUMBER})|({WORD})", re.DOTALL)
+
+# Tokens of a MySQL dump, each preceded by any whitespace. A parenthesized list of
+# literals is a single "row" token, so the rows of an INSERT don't need splitting into
+# separate tokens, and anything unrecognised becomes a single character "other" token:
+TOKEN_REGEX = re.compile(
+    rf"""\s*(?:
+    (?P<comment>--[^\n]*\n|\#[^\n]*\n|/\*.*?\*/)
+    |(?P<row>\(\s*(?:{LITERAL}\s*,\s*)*{LITERAL}\s*\))
+    |(?P<string>{STRING})
+    |(?P<number>{NUMBER})
+    |(?P<word>{WORD})
+    |(?P<name>`[^`]*`)
+    |(?P<other>.)
+    )""",
+    re.VERBOSE | re.DOTALL,
+)
+ESCAPE_REGEX = re.compile(r"\\(.)|''", re.DOTALL)
+ESCAPES = {"0": "\0", "b": "\b", "n": "\n", "r": "\r", "t": "\t", "Z": "\x1a"}
+
+
+def iter_tokens(f, chunk_size=1 << 20):
+    """Splits the SQL read from the file object f into tokens, reading it in chunks
+
+    Parameters
+    ----------
+    f : file
+        Text file object to read SQL from
+    chunk_size : int
+        Number of characters read at a time
+
+    Yields
+    ------
+    tuple
+        (kind, text) for each token, where kind is "row", "string", "name", "number",
+        "word", or "other"
+
+    """
+    buffer = ""
+    eof = False
+    while not eof:
+        chunk = f.read(chunk_size)
+        eof = len(chunk) == 0
+        # Ensure comments ending the file are terminated:
+        buffer = buffer + chunk if not eof else buffer + "\n"
+
+        pos = 0
+        for match in TOKEN_REGEX.finditer(buffer):
+            kind = match.lastgroup
+            if not eof:
+                # The token may continue in the next chunk if it touches the end of the
+                # buffer, and unterminated strings and comments match as "other":
+                if match.end() == len(buffer):
+                    break
+                if kind == "other" and (
+                    match.group(kind) in "'`#" or buffer.startswith(("--", "/*"), match.start(kind))
+                ):
+                    break
+                # A string followed by a quote may end in the first half of a doubled
+                # quote, whose second half (and the rest of the string) is in the next chunk:
+                if kind == "string" and buffer.startswith("'", match.end()):
+                    break
+                # A number may continue with a fraction or exponent, e.g. "1." or "1e-",
+                # whose digits are in the next chunk:
+                if kind == "number" and match.end() + 2 >= len(buffer):
+                    break
+            pos = match.end()
+            # Trailing whitespace at the end of the file matches as an "other" token:
+            if kind != "comment" and not match.group(kind).isspace():
+                yield kind, match.group(kind)
+        buffer = buffer[pos:]
+
+
+def iter_inserts(f):
+    """Reads the rows of every INSERT ... VALUES statement in the SQL read from f
+    Statements may span any number of lines and contain any number of rows, and all
+    other statements are skipped
+
+    Parameters
+    ----------
+    f : file
+        Text file object to read SQL from
+
+    Yields
+    ------
+    tuple
+        (table, columns, values) for each row, where columns is the list of column
+        names given by the statement (or None), and values is a tuple of ints, floats,
+        strings, and None (for NULL)
+
+    """
+    tokens = iter_tokens(f)
+    for kind, text in tokens:
+        if kind != "word" or text.upper() not in ["INSERT", "REPLACE"]:
+            # Skip to the end of any other statement:
+            while not (kind == "other" and text == ";"):
+                kind, text = next(tokens, ("other", ";"))
+            continue
+
+        # INSERT [IGNORE] [INTO] table [(columns)] VALUES (row), (row), ...;
+        kind, text = next_token(tokens)
+        while kind == "word" and text.upper() in ["IGNORE", "INTO", "LOW_PRIORITY", "DELAYED"]:
+            kind, text = next_token(tokens)
+        table = unquote(kind, text)
+
+        columns = None
+        kind, text = next_token(tokens)
+        if text == "(":
+            columns = []
+            for kind, text in tokens:
+                if text == ")":
+                    break
+                if text != ",":
+                    columns.append(unquote(kind, text))
+            else:
+                raise ValueError(f"Unterminated column list in INSERT into {table}")
+            kind, text = next_token(tokens)
+        if kind != "word" or text.upper() not in ["VALUES", "VALUE"]:
+            raise ValueError(f"Expected VALUES in INSERT into {table}, got {text!r}")
+
+        for kind, text in tokens:
+            if text == ";":
+                break
+            if text == ",":
+                continue
+            if kind == "row":
+                yield table, columns, parse_row(text)
+            elif text == "(":
+                yield table, columns, read_row(tokens)
+            else:
+                raise ValueError(f"Expected a row in INSERT into {table}, got {text!r}")
+
+
+def next_token(tokens):
+    """Returns the next token of an INSERT statement, which must not end before it"""
+    token = next(tokens, None)
+    if token is None:
+        raise ValueError("SQL ends in the middle of an INSERT statement")
+    return token
+
+
+def parse_row(text):
+    """Converts the text of a row token, e.g. "(1, 'a', NULL)", to a tuple of values"""
+    values = []
+    for string, number, word in VALUE_REGEX.findall(text):
+        if number:
+            values.append(float(number) if number.strip("-0123456789") else int(number))
+        elif word:
+            values.append(parse_value("word", word))
+        else:
+            values.append(unescape(string))
+    return tuple(values)
+
+
+def read_row(tokens):
+    """Reads the values of a row from tokens, up to and including its closing parenthesis
+    Only needed for rows not matched as a single token, e.g. rows split across chunks
+    """
+    values = []
+    for kind, text in tokens:
+        if kind == "other" and text == ")":
+            return tuple(values)
+        if kind == "other" and text == ",":
+            continue
+        values.append(parse_value(kind, text))
+    raise ValueError("Unterminated row in INSERT")
+
+
+def parse_value(kind, text):
+    """Converts a value token to int, float, string, or None"""
+    if kind == "number":
+        return float(text) if "." in text or "e" in text.lower() else int(text)
+    if kind == "string":
+        return unescape(text[1:-1])
+    if kind == "word" and text.upper() == "NULL":
+        return None
+    if kind == "word" and text.upper() in ["TRUE", "FALSE"]:
+        return int(text.upper() == "TRUE")
+    if kind == "other" and text == "'":
+        raise ValueError("Unterminated string in INSERT")
+    raise ValueError(f"Unexpected value in INSERT: {text!r}")
+
+
+def unescape(text):
+    """Replaces the backslash escapes and doubled quotes in the contents of a string"""
+    if "\\" not in text and "''" not in text:
+        return text
+    return ESCAPE_REGEX.sub(lambda m: ESCAPES.get(m.group(1), m.group(1) or "'"), text)
+
+
+def unquote(kind, text):
+    return text[1:-1] if kind == "name" else text
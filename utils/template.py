@@ -0,0 +1,42 @@
+from functools import lru_cache
+
+
+class Template:
+    def __init__(self, source, env=None):
+        """HTML template whose fields are Python expressions in braces, as in an f-string
+        The source is compiled once per process (however many Template objects are made
+        from it), so rendering a row only evaluates the compiled expression
+
+        Parameters
+        ----------
+        source : string
+            Template text, which must not contain three consecutive double quotes
+        env : dict
+            Global namespace the fields are evaluated in (normally the caller's globals())
+
+        """
+        self.source = source
+        self.code = compile_template(source)
+        self.env = {} if env is None else env
+
+    def render(self, namespace):
+        """Renders the template, giving the same result as eval(f'f\"\"\"{source}\"\"\"')
+
+        Parameters
+        ----------
+        namespace : dict
+            Local variables available to the fields (normally the caller's locals())
+
+        Returns
+        -------
+        string
+            Rendered template
+
+        """
+        return eval(self.code, self.env, namespace)
+
+
+@lru_cache(maxsize=None)
+def compile_template(source):
+    """Compiles template source as an f-string expression"""
+    return compile(f'f"""{source}"""', "<template>", "eval")
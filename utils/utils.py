@@ -1,23 +1,34 @@
 import os
+import hashlib
+import uuid
 import numpy as np
+from . import dat_codec
 
 util_path = os.path.dirname(os.path.realpath(__file__))
-tmp_path = os.path.join(util_path, "..", "tmp")
 asm_path = os.path.join(util_path, "l2asm-disasm_1.4.1")
-l2encdec_path = os.path.join(util_path, "l2encdec")
+ddf_path = os.path.join(asm_path, "DAT_defs", "Interlude")
 
+DAT_VERSION = 2  # Bump whenever the decoded output changes, to invalidate cached results
+# Lines of each .dat file decoded during this run, keyed by (.dat hash, .ddf hash):
+decoded_dats = {}
 
-def read_encrypted(path, fname):
+
+def read_encrypted(path, fname, cache=None):
     """Reads encrypted .dat file
     Note: The input .dat file name must use the original name, otherwise
           it'll fail to find the correct .ddf file for l2asmdism
 
+    Each file is only decoded once per run: the decoded lines are kept in memory
+    (and optionally on disk) keyed by the hashes of the .dat and .ddf files
+
     Parameters
     ----------
     path : string
         Path of directory containing .dat file
     fname : string
         File name of .dat file
+    cache : ParseCache
+        Optional on-disk cache to also store the decoded lines in across runs
 
     Returns
     -------
@@ -28,25 +39,26 @@ def read_encrypted(path, fname):
     if fname[-4:] != ".dat":
         raise ValueError("Input to reader must be a .dat file")
 
-    fname_txt = fname.replace(".dat", ".txt")
     fname_ddf = fname.replace(".dat", ".ddf")
-    if not os.path.exists(tmp_path):
-        # If temporary directory doesn't exist, then make it
-        # NOTE: When converted to class based method, this should be in __init__
-        os.makedirs(tmp_path)
+    dat_file = os.path.join(path, fname)
 
-    os.system(f"{l2encdec_path}/l2encdec.exe -s {path}/{fname} {tmp_path}/dec-{fname}")
-    os.system(
-        f"{asm_path}/l2disasm -d {asm_path}/DAT_defs/Interlude/{fname_ddf} "
-        f"{tmp_path}/dec-{fname} {tmp_path}/{fname_txt}"
-    )
+    with open(dat_file, "rb") as f:
+        raw = f.read()
+    ddf = read_ddf(fname_ddf)
+    key = (hashlib.sha1(raw).hexdigest(), hashlib.sha1(ddf.encode("utf8")).hexdigest())
 
-    lines = open(f"{tmp_path}/{fname_txt}", "r", encoding="utf8").read().split("\n")
-    del lines[-1]
+    if key not in decoded_dats:
+        lines = None
+        version = (DAT_VERSION, key[1])  # Decoded lines also depend on the .ddf used
+        if cache is not None:
+            lines = cache.get("dat_lines", dat_file, version)
+        if lines is None:
+            lines = dat_codec.disassemble(dat_codec.decrypt(raw), ddf)
+            if cache is not None:
+                cache.put("dat_lines", dat_file, version, lines)
+        decoded_dats[key] = tuple(lines)
 
-    os.remove(f"{tmp_path}/dec-{fname}")  # Clean up decoded .dat file
-    os.remove(f"{tmp_path}/{fname_txt}")  # Clean up readable .txt file
-    return lines
+    return list(decoded_dats[key])  # Callers modify the lines in place, so return a copy
 
 
 def write_encrypted(path, fname, lines, ddf=None):
@@ -67,25 +79,88 @@ def write_encrypted(path, fname, lines, ddf=None):
     if fname[-4:] != ".dat":
         raise ValueError("Output of writer must be a .dat file")
 
-    fname_txt = fname.replace(".dat", ".txt")
     fname_ddf = fname.replace(".dat", ".ddf") if ddf is None else ddf
 
-    with open(f"{tmp_path}/{fname_txt}", "w", encoding="utf8") as f:
-        for line in lines:
-            f.write(f"{line}\n")
+    write_atomic(path, fname, encode_dat(lines, fname_ddf))
+
 
-    os.system(
-        f"{asm_path}/l2asm -d {asm_path}/DAT_defs/Interlude/{fname_ddf} "
-        f"{tmp_path}/{fname_txt} {tmp_path}/unenc-{fname}"
-    )
+def write_atomic(path, fname, raw):
+    """Writes raw to the file fname in path, creating path if needed
+    The contents are written to a private temporary file first and then moved into
+    place, so concurrent builds writing the same output never leave a partial file.
+    The file gets the usual permissions of a new file (0666 minus the umask)
 
+    Parameters
+    ----------
+    path : string
+        Path of directory to write the file to
+    fname : string
+        File name to write to
+    raw : bytes
+        Contents of the file
+
+    """
     if not os.path.exists(path):
         # If output directory doesn't exist, then make it
-        os.makedirs(path)
+        os.makedirs(path, exist_ok=True)
+
+    # Created as open() would create it, so the file gets 0666 minus the umask:
+    tmp_fname = os.path.join(path, f".{fname}.{uuid.uuid4().hex}.tmp")
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+    fd = os.open(tmp_fname, flags, 0o666)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(raw)
+        os.replace(tmp_fname, os.path.join(path, fname))
+    except BaseException:
+        os.remove(tmp_fname)
+        raise
+
+
+def decode_dat(raw, fname_ddf):
+    """Decrypts and disassembles the contents of a .dat file in memory
+    Equivalent to running l2encdec -s followed by l2disasm
+
+    Parameters
+    ----------
+    raw : bytes
+        Contents of the encrypted .dat file
+    fname_ddf : string
+        File name of the .ddf file (in ddf_path) describing the .dat file
+
+    Returns
+    -------
+    list
+        List containing the lines of the .dat file, starting with the header
+
+    """
+    return dat_codec.disassemble(dat_codec.decrypt(raw), read_ddf(fname_ddf))
+
+
+def encode_dat(lines, fname_ddf):
+    """Assembles and encrypts lines into the contents of a .dat file in memory
+    Equivalent to running l2asm followed by l2encdec -h 413
+
+    Parameters
+    ----------
+    lines : list
+        List of strings containing information to be written, starting with the header
+    fname_ddf : string
+        File name of the .ddf file (in ddf_path) describing the .dat file
+
+    Returns
+    -------
+    bytes
+        Contents of the encrypted .dat file
+
+    """
+    return dat_codec.encrypt(dat_codec.assemble(lines, read_ddf(fname_ddf)))
+
 
-    os.system(f"{l2encdec_path}/l2encdec.exe -h 413 {tmp_path}/unenc-{fname} {path}/{fname}")
-    os.remove(f"{tmp_path}/unenc-{fname}")
-    # os.remove(f"{tmp_path}/{fname_txt}")  # Remove readable .txt file
+def read_ddf(fname_ddf):
+    """Returns the contents of the .ddf file fname_ddf in ddf_path"""
+    with open(os.path.join(ddf_path, fname_ddf), "r") as f:
+        return f.read()
 
 
 def round_sf(X, n=5):
@@ -0,0 +1,39 @@
+import numpy as np
+
+
+class WorldGrid:
+    def __init__(self, bounds, cell_size):
+        """Grid of square cells over the world, numbered row by row from (x_min, y_min)
+        Points outside the bounds belong to the cells along the edges
+
+        Parameters
+        ----------
+        bounds : tuple
+            (x_min, x_max, y_min, y_max) of the world
+        cell_size : int
+            Width and height of each cell, in world units
+
+        """
+        self.x_min, self.x_max, self.y_min, self.y_max = (int(b) for b in bounds)
+        self.cell_size = cell_size
+        self.nx = max(1, -(-(self.x_max - self.x_min) // cell_size))  # Ceiling division
+        self.ny = max(1, -(-(self.y_max - self.y_min) // cell_size))
+        self.n_cells = self.nx * self.ny
+
+    def cell_x(self, x):
+        return np.clip((np.asarray(x) - self.x_min) // self.cell_size, 0, self.nx - 1)
+
+    def cell_y(self, y):
+        return np.clip((np.asarray(y) - self.y_min) // self.cell_size, 0, self.ny - 1)
+
+    def cells(self, x, y):
+        """Returns the number of the cell of each point (x, y), as an int64 array"""
+        x, y = np.asarray(x, dtype=np.int64), np.asarray(y, dtype=np.int64)
+        return self.cell_y(y) * self.nx + self.cell_x(x)
+
+    def cell_bounds(self, cell):
+        """Returns the (x_min, y_min, x_max, y_max) world coordinates of a cell"""
+        cell_y, cell_x = divmod(int(cell), self.nx)
+        x_min = self.x_min + cell_x * self.cell_size
+        y_min = self.y_min + cell_y * self.cell_size
+        return x_min, y_min, x_min + self.cell_size, y_min + self.cell_size